@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Measures how coloring scales with the number of leaves.
+
+Trees are generated directly as compact trees, so building millions of
+anytree nodes does not dominate the measurement. Time per leaf should stay
+roughly constant as the tree grows.
+
+    python -m benchmarks.coloring --max-leaves 4000000
+"""
+import random
+import time
+from array import array
+
+import fire
+
+from tree_labeller.tree.coloring import color_compact_tree
+from tree_labeller.tree.compact import CompactTree, NO_NODE
+
+
+def random_tree(n_leaves: int, fanout: int = 10, seed: int = 0) -> CompactTree:
+    """Generates a tree with n_leaves leaves, internal nodes have ~fanout children."""
+    rng = random.Random(seed)
+    n_internals = max(1, n_leaves // fanout)
+    # Each internal node is attached to one of previous internal nodes, then
+    # leaves are distributed among internal nodes. Numbering follows pre-order
+    # because every subtree is emitted right after its root.
+    internal_parent = [NO_NODE] + [rng.randrange(i) for i in range(1, n_internals)]
+    n_leaves_of = [0] * n_internals
+    for _ in range(n_leaves):
+        n_leaves_of[rng.randrange(n_internals)] += 1
+    internal_children = [[] for _ in range(n_internals)]
+    for i in range(1, n_internals):
+        internal_children[internal_parent[i]].append(i)
+
+    stack = [(0, NO_NODE)]
+    parent = array("l")
+    while stack:
+        internal, p = stack.pop()
+        index = len(parent)
+        parent.append(p)
+        parent.extend([index] * n_leaves_of[internal])
+        stack.extend((child, index) for child in reversed(internal_children[internal]))
+    return CompactTree([None] * len(parent), parent)
+
+
+def run(n_leaves: int, labelled_fraction: float, n_labels: int):
+    tree = random_tree(n_leaves)
+    rng = random.Random(1)
+    masks = [
+        1 << rng.randrange(n_labels)
+        if tree.is_leaf(i) and rng.random() < labelled_fraction
+        else 0
+        for i in range(len(tree))
+    ]
+    start = time.perf_counter()
+    color_compact_tree(tree, masks)
+    return time.perf_counter() - start
+
+
+def main(
+    min_leaves: int = 10_000,
+    max_leaves: int = 2_000_000,
+    labelled_fraction: float = 0.01,
+    n_labels: int = 20,
+):
+    print(f"{'leaves':>10} {'seconds':>10} {'ns/leaf':>10}")
+    n_leaves = min_leaves
+    while n_leaves <= max_leaves:
+        seconds = run(n_leaves, labelled_fraction, n_labels)
+        print(f"{n_leaves:>10} {seconds:>10.3f} {seconds / n_leaves * 1e9:>10.0f}")
+        n_leaves *= 4
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
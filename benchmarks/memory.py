@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Measures memory taken by tree nodes.
+
+Builds a synthetic tree of labelable categories and products, with labels
+and a brand attribute on every product, and reports bytes per node as traced
+by tracemalloc. Node names and ids are shared strings, so mostly the nodes
+themselves are measured. Run it on different revisions to compare.
+
+    python -m benchmarks.memory --n-products 1000000
+"""
+import gc
+import time
+import tracemalloc
+
+import fire
+
+from benchmarks.coloring import random_tree
+from tree_labeller.core.types import LabelableCategory, LabelableProduct
+
+
+def build_tree(n_products: int):
+    shape = random_tree(n_products)
+    nodes = []
+    for i in range(len(shape)):
+        parent = shape.parent[i]
+        if i == 0:
+            node = LabelableCategory("category", id="1")
+        elif shape.is_leaf(i):
+            node = LabelableProduct(
+                "product", id="1", category=nodes[parent], brand="brand"
+            )
+        else:
+            node = LabelableCategory("category", id="1", parent=nodes[parent])
+        node.labels
+        nodes.append(node)
+    return nodes
+
+
+def measure(build, n_products: int):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    nodes = build(n_products)
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(nodes), seconds
+
+
+def main(n_products: int = 1_000_000):
+    bytes_per_node, seconds = measure(build_tree, n_products)
+    print(f"{'bytes/node':>10} {'seconds':>8}")
+    print(f"{bytes_per_node:>10.0f} {seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
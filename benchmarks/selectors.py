@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Compares the approximate k-center selector with the exact distant leaves selector.
+
+For each tree size and sample size, reports how the k-center selection scores on the
+objective maximized by the exact selector and on the distance between the closest two
+selected leaves, relative to the exact selection, as well as how long each selector took.
+Trees need to be small for the exact selector to finish.
+
+    python -m benchmarks.selectors --leaves 200,1000,5000 --samples 5,20,50
+"""
+import time
+from itertools import combinations
+
+import fire
+
+from benchmarks.coloring import random_tree
+from tree_labeller.tree.compact import CompactTree
+from tree_labeller.tree.index import TreeIndex
+from tree_labeller.tree.selectors import select_distant_leaves, select_k_center
+from tree_labeller.tree.selectors.distant_leaves import ImplicitBinaryTree
+from tree_labeller.tree.selectors.k_center import _root_distances
+
+
+def objective(tree: CompactTree, leaves) -> float:
+    """Objective of the exact selector, see _select_distant_leaves_binary_tree."""
+    binary_tree = ImplicitBinaryTree(tree)
+    n = len(leaves)
+    selected = [0] * len(binary_tree)
+    total = 0.0
+    for b in binary_tree.postorder():
+        children = binary_tree.children(b)
+        if not children:
+            selected[b] = int(b in leaves)
+            continue
+        selected[b] = sum(selected[c] for c in children)
+        if len(children) == 2:
+            left, right = children
+            total += (
+                selected[left]
+                * selected[right]
+                * (binary_tree.weight(left) + binary_tree.weight(right))
+            )
+        total += selected[b] * (n - selected[b]) * binary_tree.weight(b)
+    return total
+
+
+def min_distance(tree: CompactTree, leaves) -> float:
+    root_distance = _root_distances(tree)
+    index = TreeIndex(tree)
+    return min(
+        (
+            root_distance[u] + root_distance[v] - 2 * root_distance[index.lca(u, v)]
+            for u, v in combinations(leaves, 2)
+        ),
+        default=0.0,
+    )
+
+
+def run(n_leaves: int, k: int):
+    tree = random_tree(n_leaves)
+    # Nodes need to be distinct to tell selected leaves apart
+    tree = CompactTree(list(range(len(tree))), tree.parent)
+    results = []
+    for select in (select_distant_leaves, select_k_center):
+        start = time.perf_counter()
+        leaves = select(tree, k)
+        seconds = time.perf_counter() - start
+        results.append((objective(tree, leaves), min_distance(tree, leaves), seconds))
+    return results
+
+
+def main(leaves=(200, 1000, 5000), samples=(5, 20, 50)):
+    leaves = leaves if isinstance(leaves, (list, tuple)) else [leaves]
+    samples = samples if isinstance(samples, (list, tuple)) else [samples]
+    print(
+        f"{'leaves':>8} {'k':>4} {'objective':>10} {'closest':>10} "
+        f"{'exact s':>8} {'greedy s':>8}"
+    )
+    for n_leaves in leaves:
+        for k in samples:
+            exact, greedy = run(n_leaves, k)
+            objective_ratio = greedy[0] / exact[0] if exact[0] else 1.0
+            closest_ratio = greedy[1] / exact[1] if exact[1] else 1.0
+            print(
+                f"{n_leaves:>8} {k:>4} {objective_ratio:>10.3f} {closest_ratio:>10.3g} "
+                f"{exact[2]:>8.2f} {greedy[2]:>8.3f}"
+            )
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,88 @@
+import pytest
+
+from tree_labeller.core.attributes import AttributeStore
+from tree_labeller.core.types import Category, Product
+
+
+def test_attribute_store():
+    store = AttributeStore()
+    rows = [
+        store.add_row({"brand": "Acme"}),
+        store.add_row({}),
+        store.add_row({"brand": "Acme", "size": 1, "tags": ["a"]}),
+        store.add_row({"size": True}),
+    ]
+
+    assert store.names == ["brand", "size", "tags"]
+    assert [dict(store.row(row)) for row in rows] == [
+        {"brand": "Acme"},
+        {},
+        {"brand": "Acme", "size": 1, "tags": ["a"]},
+        {"size": True},
+    ]
+    assert store.row(rows[3])["size"] is True
+    assert store.row(rows[0])["brand"] is store.row(rows[2])["brand"]
+    with pytest.raises(KeyError):
+        store.row(rows[1])["brand"]
+
+
+def test_product_attrs_are_stored_on_tree():
+    tree = Category("root", id=1)
+    category = Category("category", id=2, parent=tree)
+    p1 = Product("p1", id=3, category=category, brand="".join(["Ac", "me"]))
+    p2 = Product("p2", id=4, category=tree, brand="".join(["Ac", "me"]))
+
+    assert p1.attrs == {"brand": "Acme"}
+    assert p1.attrs["brand"] is p2.attrs["brand"]
+    assert tree.attribute_store is category.attribute_store
+    assert tree.attribute_store.names == ["brand"]
+    with pytest.raises(TypeError):
+        p1.attrs["brand"] = "Other"
+
+
+def test_product_attrs_move_to_tree_when_attached():
+    tree = Category("root", id=1)
+    category = Category("category", id=2)
+    p1 = Product("p1", id=3, category=category, brand="Acme")
+    p2 = Product("p2", id=4, category=None, volume=1.5)
+    p2.parent = category
+
+    category.parent = tree
+
+    assert p1._attrs_store is tree.attribute_store
+    assert p2._attrs_store is tree.attribute_store
+    assert p1.attrs == {"brand": "Acme"}
+    assert p2.attrs == {"volume": 1.5}
+    assert tree.attribute_store.names == ["brand", "volume"]
+
+
+def test_attribute_store_reuses_removed_rows():
+    store = AttributeStore()
+    acme = store.add_row({"brand": "Acme"})
+    sized = store.add_row({"brand": "Acme", "size": 1})
+
+    store.remove_row(sized)
+
+    assert store.names == ["brand"]
+    assert store.add_row({"volume": 2}) == sized
+    assert dict(store.row(sized)) == {"volume": 2}
+    assert dict(store.row(acme)) == {"brand": "Acme"}
+
+
+def test_product_attrs_leave_tree_when_detached():
+    tree = Category("root", id=1)
+    category = Category("category", id=2, parent=tree)
+    p1 = Product("p1", id=3, category=category, brand="Acme")
+    p2 = Product("p2", id=4, category=tree, volume=1.5)
+
+    category.parent = None
+    p2.parent = None
+
+    assert tree.attribute_store.names == []
+    assert p1._attrs_store is category.attribute_store
+    assert p1.attrs == {"brand": "Acme"}
+    assert p2.attrs == {"volume": 1.5}
+
+    category.parent = tree
+    assert tree.attribute_store.names == ["brand"]
+    assert tree.attribute_store.n_rows == 2
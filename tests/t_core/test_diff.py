@@ -0,0 +1,57 @@
+from tree_labeller.core.diff import apply_diff, diff_trees
+from tree_labeller.core.types import (
+    Category,
+    LabelableCategory,
+    LabelableProduct,
+    Product,
+)
+from tree_labeller.tree.utils import preorder
+
+
+def _edges(tree):
+    return {
+        (
+            isinstance(node, Product),
+            str(node.id),
+            node.name,
+            str(node.parent.id) if node.parent is not tree else None,
+        )
+        for node in preorder(tree)
+        if node is not tree
+    }
+
+
+def test_diff_and_apply():
+    old = LabelableCategory("categories", id=0)
+    a = LabelableCategory("a", id=1, parent=old)
+    b = LabelableCategory("b", id=2, parent=a)
+    c = LabelableCategory("c", id=3, parent=old)
+    p1 = LabelableProduct("p1", id=1, category=b)
+    p2 = LabelableProduct("p2", id=2, category=b)
+    p3 = LabelableProduct("p3", id=3, category=c)
+    p1.labels.manual = "A"
+    p3.labels.manual = "B"
+
+    # a and b swap places, c is removed, d is added, p1 is renamed
+    new = Category("root", id=0)
+    new_b = Category("b", id=2, parent=new)
+    new_a = Category("a", id=1, parent=new_b)
+    d = Category("d", id=4, parent=new_a)
+    Product("p1 renamed", id=1, category=new_a)
+    Product("p2", id=2, category=new_b)
+    Product("p4", id=4, category=d, brand="x")
+
+    diff = diff_trees(old, new)
+
+    assert diff.summary() == {"added": 2, "removed": 2, "moved": 3, "renamed": 2}
+    assert [node.id for node in diff.added] == [4, 4]
+    assert set(diff.removed) == {c, p3}
+
+    affected = apply_diff(old, diff)
+
+    assert _edges(old) == _edges(new)
+    assert old.name == "root"
+    assert old.get_product(1) is p1 and p1.labels.manual == "A"
+    assert old.get_product(4).attrs == {"brand": "x"}
+    assert {category.id for category in affected} == {0, 1, 2, 4}
+    assert not diff_trees(old, new)
@@ -0,0 +1,180 @@
+import random
+
+import pytest
+
+from tree_labeller.core import predictor
+from tree_labeller.core.types import LabelableCategory, LabelableProduct
+from tree_labeller.tree.selectors import select_k_center
+from tree_labeller.tree.utils import preorder
+
+
+def _build_tree():
+    tree = LabelableCategory("categories", id=0)
+    c1 = LabelableCategory("c1", id=1, parent=tree)
+    c2 = LabelableCategory("c2", id=2, parent=tree)
+    c3 = LabelableCategory("c3", id=3, parent=tree)
+    products = {
+        "p11": LabelableProduct("p11", id=11, category=c1),
+        "p12": LabelableProduct("p12", id=12, category=c1),
+        "p21": LabelableProduct("p21", id=21, category=c2),
+        "p22": LabelableProduct("p22", id=22, category=c2),
+        "p31": LabelableProduct("p31", id=31, category=c3),
+    }
+    return tree, products
+
+
+def test_predict():
+    tree, products = _build_tree()
+    products["p11"].labels.manual = "A"
+    products["p21"].labels.manual = "B"
+    products["p22"].labels.manual = "?"
+
+    predictor.predict(tree, n_sample=10)
+
+    predicted = {name: p.labels.predicted for name, p in products.items()}
+    assert predicted == {
+        "p11": {"A"},
+        "p12": {"A"},
+        "p21": {"B"},
+        "p22": None,
+        "p31": {"A", "B"},
+    }
+    assert tree.labels.predicted == {"A", "B"}
+    selected = {name for name, p in products.items() if p.labels.selected}
+    assert selected == {"p31"}
+
+
+def test_predict_without_manual_labels():
+    tree, products = _build_tree()
+
+    predictor.predict(tree, n_sample=2)
+
+    assert all(p.labels.predicted is None for p in products.values())
+    assert sum(p.labels.selected for p in products.values()) == 2
+
+
+def test_predict_with_k_center_sampler():
+    tree, products = _build_tree()
+
+    predictor.predict(tree, n_sample=3, sampler=select_k_center)
+
+    selected = {name[:2] for name, p in products.items() if p.labels.selected}
+    assert selected == {"p1", "p2", "p3"}
+
+
+def _random_tree(rng: random.Random, n_categories: int = 30, n_products: int = 80):
+    tree = LabelableCategory("categories", id=0)
+    categories = [tree]
+    for i in range(1, n_categories):
+        categories.append(
+            LabelableCategory(f"c{i}", id=i, parent=rng.choice(categories))
+        )
+    # Every category gets a product so that all leaves are products
+    products = [
+        LabelableProduct(
+            f"p{i}",
+            id=1000 + i,
+            category=categories[i] if i < n_categories else rng.choice(categories),
+        )
+        for i in range(n_products)
+    ]
+    return tree, products
+
+
+def _full_prediction(manual, seed):
+    rng = random.Random(0)
+    tree, products = _random_tree(rng)
+    for product, label in zip(products, manual):
+        product.labels.manual = label
+    random.seed(seed)
+    predictor.predict(tree, n_sample=5)
+    return [(node.labels.predicted, node.labels.selected) for node in preorder(tree)]
+
+
+@pytest.mark.parametrize("pass_changed", [False, True])
+def test_incremental_predictor_same_as_full_run(pass_changed):
+    rng = random.Random(0)
+    manual = [None] * 80
+    steps = []
+    for seed in range(40):
+        for _ in range(rng.choice([0, 1, 5])):
+            manual[rng.randrange(len(manual))] = rng.choice(
+                [None, "A", "B", "C", "?", "!"]
+            )
+        if seed == 20:
+            manual = [None] * len(manual)
+        steps.append(list(manual))
+    # Full runs build new trees, which would make the incremental predictor
+    # start over, so expected results are computed upfront
+    expected = [_full_prediction(manual, seed) for seed, manual in enumerate(steps)]
+
+    tree, products = _random_tree(random.Random(0))
+    incremental = predictor.IncrementalPredictor()
+    for seed, manual in enumerate(steps):
+        changed = set()
+        for product, label in zip(products, manual):
+            if product.labels.manual != label:
+                product.labels.manual = label
+                changed.add(product.id)
+        random.seed(seed)
+        incremental(tree, n_sample=5, changed=changed if pass_changed else None)
+
+        actual = [
+            (node.labels.predicted, node.labels.selected) for node in preorder(tree)
+        ]
+        assert actual == expected[seed]
+
+
+def test_incremental_predictor_restores_saved_state(tmp_path, monkeypatch):
+    rng = random.Random(1)
+    manual = [rng.choice([None, None, "A", "B", "?"]) for _ in range(80)]
+    path = str(tmp_path / predictor.PREDICTOR_STATE_FILE)
+
+    tree, products = _random_tree(random.Random(0))
+    for product, label in zip(products, manual):
+        product.labels.manual = label
+    saved = predictor.IncrementalPredictor()
+    saved(tree, n_sample=5)
+    saved.save_state(path, digest="abc")
+
+    # Labels are loaded into a fresh tree by the next run
+    manual[3], manual[40] = "C", None
+    tree, products = _random_tree(random.Random(0))
+    for product, label in zip(products, manual):
+        product.labels.manual = label
+    restored = predictor.IncrementalPredictor()
+    assert not restored.load_state(tree, path, digest="other")
+    assert restored.load_state(tree, path, digest="abc")
+
+    def fail(*args):
+        raise AssertionError("The restored tree should not be colored again")
+
+    monkeypatch.setattr(predictor, "color_compact_tree", fail)
+    random.seed(7)
+    restored(tree, n_sample=5)
+
+    actual = [(node.labels.predicted, node.labels.selected) for node in preorder(tree)]
+    monkeypatch.undo()
+    assert actual == _full_prediction(manual, seed=7)
+
+
+def test_incremental_predictor_selects_within_categories():
+    tree, products = _build_tree()
+    c1, c2, c3 = tree.children
+    c4 = LabelableCategory("c4", id=4, parent=c3)
+    products["p41"] = LabelableProduct("p41", id=41, category=c4)
+    products["p11"].labels.manual = "A"
+    products["p21"].labels.manual = "B"
+    incremental = predictor.IncrementalPredictor()
+
+    def select_all(tree, n_sample):
+        return [tree.nodes[i] for i in tree.leaves()]
+
+    incremental(tree, n_sample=10, sampler=select_all)
+    selected = {name for name, p in products.items() if p.labels.selected}
+    assert selected == {"p31", "p41"}
+
+    incremental(tree, n_sample=10, sampler=select_all, within=[c1, c4])
+    selected = {name for name, p in products.items() if p.labels.selected}
+    assert selected == {"p41"}
+    assert products["p31"].labels.predicted == {"A", "B"}
@@ -0,0 +1,102 @@
+import os
+
+from anytree import PreOrderIter
+
+from tree_labeller.core import snapshot
+from tree_labeller.core.snapshot import (
+    SNAPSHOT_FILE,
+    file_digest,
+    load_snapshot,
+    load_tree,
+    save_snapshot,
+)
+from tree_labeller.core.task import LabellingTask
+from tree_labeller.core.types import LabelableCategory, LabelableProduct
+
+YAML_DOC = """
+name: categories
+id: 1
+children:
+- name: Alcoholic Drinks
+  id: 11
+  children:
+  - name: Whiskies
+    id: 111
+    children:
+    - name: Jack Daniel's
+      id: 1111
+      brand: Jack Daniel's
+    - name: Johnnie Walker's
+      id: 1112
+- name: Empty
+  id: 12
+  children:
+  - name: Empty subcategory
+"""
+
+
+def _write_tree(tmp_path):
+    path = tmp_path / "tree.yaml"
+    with open(path, "w") as f:
+        f.write(YAML_DOC)
+    return str(path)
+
+
+def _describe(tree):
+    return [
+        (type(node), node.name, node.id, getattr(node, "attrs", None))
+        for node in PreOrderIter(tree)
+    ]
+
+
+def test_save_and_load_snapshot(tmp_path):
+    tree = LabelableCategory("categories", id=1)
+    c11 = LabelableCategory("Alcoholic Drinks", id=11, parent=tree)
+    LabelableProduct("Jack Daniel's", id=1111, category=c11, brand="JD")
+    LabelableProduct("Guinness", id=1112, category=tree)
+    path = str(tmp_path / SNAPSHOT_FILE)
+
+    save_snapshot(tree, path, digest="abc")
+
+    assert _describe(load_snapshot(path, digest="abc")) == _describe(tree)
+    assert load_snapshot(path, digest="other") is None
+
+
+def test_load_tree_prunes_and_caches(tmp_path, monkeypatch):
+    tree_path = _write_tree(tmp_path)
+    snapshot_path = str(tmp_path / SNAPSHOT_FILE)
+
+    tree = load_tree(tree_path, snapshot_path)
+    assert [node.id for node in PreOrderIter(tree)] == [1, 11, 111, 1111, 1112]
+    assert os.path.exists(snapshot_path)
+
+    def fail(tree_path):
+        raise AssertionError("Tree should be loaded from snapshot")
+
+    monkeypatch.setattr(snapshot, "parse_tree", fail)
+    assert _describe(load_tree(tree_path, snapshot_path)) == _describe(tree)
+
+
+def test_load_tree_source_changed(tmp_path):
+    tree_path = _write_tree(tmp_path)
+    snapshot_path = str(tmp_path / SNAPSHOT_FILE)
+    load_tree(tree_path, snapshot_path)
+
+    with open(tree_path, "a") as f:
+        f.write(
+            "- name: Beers\n  id: 13\n  children:\n  - name: Guinness\n    id: 1131\n"
+        )
+
+    tree = load_tree(tree_path, snapshot_path)
+    assert 1131 in [node.id for node in PreOrderIter(tree)]
+    assert load_snapshot(snapshot_path, file_digest(tree_path)) is not None
+
+
+def test_initialize_task_writes_snapshot(tmp_path):
+    tree_path = _write_tree(tmp_path)
+    task_dir = tmp_path / "task"
+
+    task = LabellingTask.initialize(str(task_dir), tree_path, {"A", "B"})
+
+    assert os.path.exists(task_dir / SNAPSHOT_FILE)
+    assert task.n_products == 2
@@ -116,3 +116,92 @@ def test_to_mapping():
 def test_from_dir():
     # TODO: Test
     pass
+
+
+def test_update_labels_of_removed_products(tmp_path):
+    tree = LabelableCategory("categories", id=1)
+    product = LabelableProduct("p1", id=11, category=tree)
+    path = tmp_path / "1-to-verify.tsv"
+    with open(path, "w") as f:
+        f.write("id\tlabel\n11\tA\n12\tB\n")
+
+    state = LabelingState(tree, 0)
+    state.update_labels(str(path), {"A", "B"})
+
+    assert product.labels.manual == "A"
+    assert state.iteration == 1
+
+
+def test_save_and_load_columnar_labels(tmp_path):
+    pytest.importorskip("pyarrow")
+    from tree_labeller.core.columnar import read_columns
+
+    tree = LabelableCategory(id=0, name="categories")
+    category1 = LabelableCategory(id=1, name="category1", parent=tree)
+    product1 = LabelableProduct(id=1, name="p1", brand="b1", category=category1)
+    product1.labels.selected = True
+    product1.labels.predicted = ["Y", "X"]
+    product2 = LabelableProduct(id=2, name="p2", weight=0.5, category=category1)
+    product2.labels.selected = True
+    product2.labels.manual = "Y"
+    state = LabelingState(tree, iteration=1)
+
+    path = str(tmp_path / "1-to-verify.parquet")
+    state.save_to_verify(path)
+
+    assert read_columns(path) == {
+        "id": [1, 2],
+        "name": ["p1", "p2"],
+        "brand": ["b1", None],
+        "weight": [None, 0.5],
+        "category": ["categories>category1"] * 2,
+        "label": ["X|Y", "Y"],
+    }
+
+    loaded = LabelingState(tree, iteration=0)
+    product1.labels.manual = None
+    product2.labels.manual = None
+    loaded.update_labels(path, {"X", "Y"})
+    assert product2.labels.manual == "Y"
+    assert product1.labels.manual is None
+    assert loaded.iteration == 1
+
+
+def test_save_products_of_attached_subtree(tmp_path):
+    tree = LabelableCategory("categories", id=0)
+    category = LabelableCategory("category1", id=1)
+    product = LabelableProduct("p1", id=1, category=category, volume=1.5)
+    product.labels.predicted = ["A"]
+    category.parent = tree
+    removed = LabelableProduct("p2", id=2, category=tree, brand="b1")
+    removed.parent = None
+    state = LabelingState(tree, iteration=1)
+
+    path = tmp_path / "state.tsv"
+    state.save_good_predicted_labels(path)
+
+    with open(path) as f:
+        rows = list(csv.DictReader(f, delimiter="\t"))
+    assert rows == [
+        {
+            "id": "1",
+            "name": "p1",
+            "volume": "1.5",
+            "category": "categories>category1",
+            "label": "A",
+        }
+    ]
+
+
+def test_update_labels_records_changed_products(tmp_path):
+    tree = LabelableCategory("categories", id=1)
+    LabelableProduct("p1", id=11, category=tree).labels.manual = "A"
+    LabelableProduct("p2", id=12, category=tree)
+    path = tmp_path / "1-to-verify.tsv"
+    with open(path, "w") as f:
+        f.write("id\tlabel\n11\tA\n12\tB\n")
+
+    state = LabelingState(tree, 0)
+    state.update_labels(str(path), {"A", "B"})
+
+    assert state.changed_products == {12}
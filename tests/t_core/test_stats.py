@@ -0,0 +1,91 @@
+from tree_labeller.core.stats import LabelStats
+from tree_labeller.core.types import LabelableCategory, LabelableProduct
+from tree_labeller.tree.compact import CompactTree
+
+
+def _build_tree():
+    tree = LabelableCategory("categories", id=0)
+    c1 = LabelableCategory("c1", id=1, parent=tree)
+    c11 = LabelableCategory("c11", id=11, parent=c1)
+    c2 = LabelableCategory("c2", id=2, parent=tree)
+    p1 = LabelableProduct("p1", id=101, category=c11)
+    p1.labels.manual = "A"
+    p1.labels.predicted = {"A"}
+    p2 = LabelableProduct("p2", id=102, category=c11)
+    p2.labels.predicted = {"A"}
+    p3 = LabelableProduct("p3", id=103, category=c1)
+    p3.labels.predicted = {"A", "B"}
+    p3.labels.selected = True
+    p4 = LabelableProduct("p4", id=104, category=c2)
+    p4.labels.manual = "?"
+    p5 = LabelableProduct("p5", id=105, category=c2)
+    p5.labels.selected = True
+    return tree, [p1, p2, p3, p4, p5]
+
+
+def test_stats():
+    tree, _ = _build_tree()
+
+    stats = LabelStats(
+        CompactTree.from_root(tree), {"A", "B", "C", "!", "?"}, {"A", "B", "C"}
+    )
+
+    assert stats.tree_stats == {
+        "n_products": 5,
+        "n_categories": 4,
+        "n_categories_per_depth": {1: 2, 0: 1, 2: 1},
+    }
+    assert stats.manual_labels_stats == {
+        "n_manual_labels": 2,
+        "n_allowed_labels_used": 2,
+        "allowed_labels_not_used": {"B", "C", "!"},
+        "n_allowed_labels": 5,
+        "n_products_per_manual_label": {"A": 1, "?": 1, "B": 0, "C": 0, "!": 0},
+    }
+    assert stats.predicted_labels_stats == {
+        "n_good_labels": 2,
+        "n_unique_good_labels": 1,
+        "n_missing_labels": 2,
+        "n_to_reject_labels": 0,
+        "n_to_skip_labels": 1,
+        "n_ambiguous_labels": 1,
+        "n_requires_verification_labels": 3,
+        "n_requires_verification_missing_labels": 2,
+        "n_requires_verification_ambiguous_labels": 1,
+        "n_selected_for_verification_labels": 2,
+        "n_selected_for_verification_missing_labels": 1,
+        "n_selected_for_verification_ambiguous_labels": 1,
+    }
+    assert stats.n_products_per_good_label["A"] == 2
+    assert stats.n_products_per_ambiguous_label["A"] == 1
+    assert stats.n_products_per_ambiguous_label["B"] == 1
+    assert stats.progress == {
+        "manual": 2,
+        "univocal": 2 / 5,
+        "ambiguous": 1 / 5,
+        "missing": 2 / 5,
+        "allowed_labels": 1 / 3,
+    }
+
+
+def test_stats_outdated_after_labels_change():
+    tree, products = _build_tree()
+    compact_tree = CompactTree.from_root(tree)
+    stats = LabelStats(compact_tree, {"A", "B"}, {"A", "B"})
+    assert stats.is_current(compact_tree)
+
+    products[1].labels.manual = "B"
+
+    assert not stats.is_current(compact_tree)
+    assert LabelStats(compact_tree, {"A", "B"}, {"A", "B"}).n_manual_labels == 3
+
+
+def test_stats_current_after_labels_of_other_tree_change():
+    tree, _ = _build_tree()
+    _, other_products = _build_tree()
+    compact_tree = CompactTree.from_root(tree)
+    stats = LabelStats(compact_tree, {"A", "B"}, {"A", "B"})
+
+    other_products[1].labels.manual = "B"
+
+    assert stats.is_current(compact_tree)
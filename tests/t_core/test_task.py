@@ -0,0 +1,124 @@
+import csv
+import json
+import os
+
+import pytest
+
+from tree_labeller.core import predictor
+from tree_labeller.core.task import LabellingTask
+from tree_labeller.update_task import update_task
+
+YAML_DOC = """
+name: categories
+id: 1
+children:
+- name: Drinks
+  id: 11
+  children:
+  - name: Juice
+    id: 111
+  - name: Water
+    id: 112
+- name: Food
+  id: 12
+  children:
+  - name: Bread
+    id: 121
+"""
+
+
+def _initialize(tmp_path) -> LabellingTask:
+    tree_path = tmp_path / "tree.yaml"
+    tree_path.write_text(YAML_DOC)
+    return LabellingTask.initialize(str(tmp_path / "task"), str(tree_path), {"A", "B"})
+
+
+def test_predict_labels_with_unknown_sampler(tmp_path):
+    task = _initialize(tmp_path)
+
+    with pytest.raises(ValueError, match="top_down"):
+        task.predict_labels(n_sample=1, sampler="typo")
+    assert task.state.iteration == 0
+
+
+def test_predict_labels_restores_predictor_state(tmp_path, monkeypatch):
+    task = _initialize(tmp_path)
+    with open(os.path.join(task.dir, "1-to-verify.tsv"), "w") as f:
+        f.write("id\tlabel\n111\tA\n121\tB\n")
+    task = LabellingTask.from_dir(task.dir)
+    task.predict_labels(n_sample=1)
+    assert os.path.exists(os.path.join(task.dir, predictor.PREDICTOR_STATE_FILE))
+
+    with open(os.path.join(task.dir, "2-to-verify.tsv"), "w") as f:
+        f.write("id\tlabel\n111\tA\n112\tB\n121\tB\n")
+    task = LabellingTask.from_dir(task.dir)
+
+    def fail(*args):
+        raise AssertionError("The saved tree should not be colored again")
+
+    monkeypatch.setattr(predictor, "color_compact_tree", fail)
+    task.predict_labels(n_sample=1)
+
+    assert task.state.get_product(112).labels.predicted == {"B"}
+    assert task.state.get_category(11).labels.predicted == {"A", "B"}
+    assert task.state.get_category(12).labels.predicted == {"B"}
+
+
+def test_update_task_selects_products_in_affected_categories(tmp_path):
+    tree_path = tmp_path / "tree.yaml"
+    tree_path.write_text(
+        YAML_DOC + "- {name: Other, id: 13, children: [{name: Soap, id: 131}]}\n"
+        "- {name: Misc, id: 14, children: [{name: Pen, id: 141}]}\n"
+    )
+    task = LabellingTask.initialize(str(tmp_path / "task"), str(tree_path), {"A", "B"})
+    with open(os.path.join(task.dir, "1-to-verify.tsv"), "w") as f:
+        f.write("id\tlabel\n111\tA\n121\tB\n")
+    new_tree_path = tmp_path / "new.jsonl"
+    nodes = [
+        (1, None, "category", "categories"),
+        (11, 1, "category", "Drinks"),
+        (111, 11, "product", "Juice"),
+        (12, 1, "category", "Food"),
+        (121, 12, "product", "Bread"),
+        (13, 1, "category", "Other"),
+        (131, 13, "product", "Soap"),
+        (132, 13, "product", "Brush"),
+        (14, 1, "category", "Misc"),
+        (141, 14, "product", "Pen"),
+    ]
+    new_tree_path.write_text(
+        "".join(
+            json.dumps({"id": id, "parent": parent, "kind": kind, "name": name}) + "\n"
+            for id, parent, kind, name in nodes
+        )
+    )
+
+    update_task(task.dir, str(new_tree_path), sample=10)
+
+    task = LabellingTask.from_dir(task.dir)
+    assert task.state.iteration == 2
+    with pytest.raises(KeyError):
+        task.state.get_product(112)
+    # Manual labels carry over, products to verify come from Other only
+    with open(os.path.join(task.dir, "2-to-verify.tsv")) as f:
+        rows = {row["id"]: row["label"] for row in csv.DictReader(f, delimiter="\t")}
+    assert rows.pop("111") == "A" and rows.pop("121") == "B"
+    assert rows and set(rows) <= {"131", "132"}
+
+
+def test_from_dir_loads_columnar_labels(tmp_path):
+    pytest.importorskip("pyarrow")
+    from tree_labeller.core.columnar import write_columns
+
+    task = _initialize(tmp_path)
+    with open(os.path.join(task.dir, "1-to-verify.tsv"), "w") as f:
+        f.write("id\tlabel\n111\tA\n")
+    write_columns(
+        {"id": [111, 121], "label": ["A", "B"]},
+        os.path.join(task.dir, "2-to-verify.parquet"),
+    )
+
+    task = LabellingTask.from_dir(task.dir)
+
+    assert task.state.iteration == 2
+    assert task.state.get_product(121).labels.manual == "B"
@@ -0,0 +1,207 @@
+import pytest
+
+from tree_labeller.core.types import (
+    Category,
+    LabelableCategory,
+    LabelableProduct,
+    Labels,
+    LabelRegistry,
+    Product,
+    is_multi_label,
+    is_single_label,
+)
+
+
+def _build_tree():
+    tree = Category("categories", id=0)
+    c1 = Category("c1", id=1, parent=tree)
+    c11 = Category("c11", id=11, parent=c1)
+    c2 = Category("c2", id=2, parent=tree)
+    p1 = Product("p1", id=101, category=c11)
+    p2 = Product("p2", id=102, category=c11)
+    p3 = Product("p3", id=103, category=c2)
+    return tree, (c1, c11, c2), (p1, p2, p3)
+
+
+def test_structural_views():
+    tree, (c1, c11, c2), (p1, p2, p3) = _build_tree()
+
+    assert tree.products == [p1, p2, p3]
+    assert c1.products == [p1, p2]
+    assert tree.categories == [tree, c1, c11, c2]
+    assert c2.categories == [tree, c1, c11, c2]
+    assert (tree.n_products, c1.n_products, c11.n_products, c2.n_products) == (
+        3,
+        2,
+        2,
+        1,
+    )
+    assert tree.n_categories == 4
+    assert tree.get_product(102) is p2
+    assert tree.get_product("102") is p2
+    assert c11.get_category("2") is c2
+    with pytest.raises(KeyError):
+        tree.get_product(1)
+
+    index = c11.tree_index
+    nodes = tree.compact_tree.nodes
+    assert index is tree.tree_index
+    assert nodes[index.lca(nodes.index(p1), nodes.index(p3))] is tree
+    assert nodes[index.lca(nodes.index(p1), nodes.index(p2))] is c11
+    assert nodes[index.ancestor_at_depth(nodes.index(p2), 1)] is c1
+
+
+def test_structural_views_invalidated_on_mutation():
+    tree, (c1, c11, c2), (p1, p2, p3) = _build_tree()
+    assert tree.products == [p1, p2, p3]
+    assert c1.n_products == 2
+
+    p2.parent = c2
+    p4 = Product("p4", id=104, category=c1)
+    c3 = Category("c3", id=3, parent=tree)
+
+    assert tree.products == [p1, p4, p3, p2]
+    assert c1.products == [p1, p4]
+    assert tree.categories == [tree, c1, c11, c2, c3]
+    assert (c1.n_products, c2.n_products) == (2, 2)
+    assert tree.get_product(104) is p4
+    assert tree.get_category(3) is c3
+
+    p1.parent = None
+
+    assert c11.products == []
+    assert c1.n_products == 1
+    with pytest.raises(KeyError):
+        tree.get_product(101)
+
+
+def test_long_name():
+    tree, (c1, c11, c2), (p1, p2, p3) = _build_tree()
+
+    assert c11.long_name == "categories>c1>c11"
+    assert p1.category_name == "categories>c1>c11"
+    assert p1.category_name is p2.category_name
+
+    c11.parent = c2
+    assert p1.category_name == "categories>c2>c11"
+
+    c2.name = "d2"
+    assert p1.category_name == "categories>d2>c11"
+    assert p3.category_name == "categories>d2"
+
+
+def test_long_names_of_deep_tree():
+    categories = [LabelableCategory("c0", id=0)]
+    for i in range(1, 3000):
+        categories.append(LabelableCategory(f"c{i}", id=i, parent=categories[-1]))
+
+    long_names = [category.long_name for category in categories]
+
+    assert long_names[-1] == ">".join(f"c{i}" for i in range(3000))
+    assert all(
+        name == f"{parent}>c{i}"
+        for i, (parent, name) in enumerate(zip(long_names, long_names[1:]), 1)
+    )
+
+
+def test_label_registry():
+    registry = LabelRegistry({"b", "a"})
+    assert registry.bit("a") == 1
+    assert registry.bit("b") == 2
+    assert registry.bit("c") == 4
+    mask = registry.mask({"a", "c"})
+    assert mask == 5
+    assert registry.labels(mask) == {"a", "c"}
+    assert registry.label(registry.bit("b")) == "b"
+    assert registry.labels(0) == set()
+
+    assert not is_single_label(0) and not is_multi_label(0)
+    assert is_single_label(4) and not is_multi_label(4)
+    assert is_multi_label(5) and not is_single_label(5)
+
+
+def test_labels_predicted_mask():
+    registry = LabelRegistry(f"l{i}" for i in range(100))
+    labels = Labels()
+    assert labels.predicted is None and labels.is_missing
+
+    labels.set_predicted_mask(registry.bit("l99"), registry)
+    assert labels.is_good and labels.good_label == "l99"
+    assert labels.predicted == {"l99"}
+
+    labels.set_predicted_mask(registry.mask({"l1", "l70"}), registry)
+    assert labels.is_ambiguous and labels.good_label is None
+    assert labels.to_verify == {"l1", "l70"}
+
+    labels.predicted = {"l3"}
+    assert labels.predicted_mask == registry.bit("l3")
+
+
+def test_labels_predicted_is_read_only():
+    labels = Labels()
+    labels.predicted = {"a"}
+    with pytest.raises(AttributeError):
+        labels.predicted.add("b")
+    assert labels.predicted == {"a"}
+
+
+def test_label_registry_is_scoped_to_tree():
+    tree = LabelableCategory("categories", id=1)
+    product = LabelableProduct("p1", id=11, category=tree)
+    other_tree = LabelableCategory("categories", id=1)
+
+    product.labels.predicted = {"new label"}
+    tree.labels.predicted = {"new label"}
+
+    assert product.labels.registry is tree.labels.registry
+    assert other_tree.labels.registry is not tree.labels.registry
+    # Labels of one tree do not grow registries of other trees
+    assert other_tree.label_registry.bit("other label") == 1
+
+
+def test_slotted_nodes():
+    labels = Labels(manual="a")
+    assert not hasattr(labels, "__dict__")
+    assert labels == Labels(manual="a") and labels != Labels(manual="b")
+
+    generation = labels.registry.generation
+    labels.selected = True
+    assert labels.registry.generation > generation
+
+    tree = LabelableCategory("root", id=1)
+    product = LabelableProduct("product", id=2, category=tree, brand="brand")
+    product.labels.manual = "a"
+    tree.compact_tree
+    # Only slots are used, so no instance dict is ever populated
+    assert not tree.__dict__ and not product.__dict__
+    assert product.attrs == {"brand": "brand"} and product.labels.manual == "a"
+
+
+def test_tree_changes_keep_caches_of_other_trees():
+    tree = LabelableCategory("root", id=1)
+    category = LabelableCategory("category", id=2, parent=tree)
+    LabelableProduct("product", id=3, category=category)
+    other_tree = LabelableCategory("other root", id=4)
+    other_product = LabelableProduct("other product", id=5, category=other_tree)
+    compact_tree = other_tree.compact_tree
+    assert other_product.category_name == "other root"
+
+    LabelableProduct("new product", id=6, category=category)
+    category.name = "renamed"
+    category.parent = None
+
+    assert other_tree.compact_tree is compact_tree
+    assert other_tree._is_cached("compact_tree")
+    assert other_tree._is_cached("long_names")
+    assert tree.generation != category.generation
+
+
+def test_moved_category_drops_caches_of_its_old_tree():
+    tree = LabelableCategory("root", id=1)
+    category = LabelableCategory("category", id=2, parent=tree)
+    other_tree = LabelableCategory("other root", id=3)
+    assert category.long_name == "root>category"
+
+    category.parent = other_tree
+
+    assert category.long_name == "other root>category"
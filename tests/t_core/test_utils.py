@@ -0,0 +1,32 @@
+from tree_labeller.core.types import Category, Product
+from tree_labeller.core.utils import remove_leaf_categories_without_product
+from tree_labeller.tree.utils import preorder
+
+
+def test_remove_leaf_categories_without_product():
+    tree = Category("root", id=0)
+    c1 = Category("c1", id=1, parent=tree)
+    Product("p1", id=101, category=c1)
+    empty = Category("empty", id=2, parent=c1)
+    chain = empty
+    for i in range(3, 1000):
+        chain = Category(f"c{i}", id=i, parent=chain)
+    c1000 = Category("c1000", id=1000, parent=tree)
+    c1001 = Category("c1001", id=1001, parent=c1000)
+    Product("p2", id=102, category=c1001)
+
+    report = remove_leaf_categories_without_product(tree)
+
+    assert report.branches == [empty]
+    assert report.n_categories == 998
+    assert [node.id for node in preorder(tree)] == [0, 1, 101, 1000, 1001, 102]
+
+
+def test_remove_leaf_categories_without_product_keeps_root():
+    tree = Category("root", id=0)
+    Category("c1", id=1, parent=tree)
+
+    report = remove_leaf_categories_without_product(tree)
+
+    assert report.n_categories == 1
+    assert tree.is_leaf
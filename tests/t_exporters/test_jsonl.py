@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from tree_labeller.core.formats import get_tree_exporter, get_tree_parser, tree_format
+from tree_labeller.core.types import Category, Product
+from tree_labeller.exporters.jsonl import export_tree
+from tree_labeller.tree.utils import preorder
+
+
+def _tree():
+    tree = Category("categories", id=1)
+    c11 = Category("Napoje", id=11, parent=tree)
+    Product("Sok jabłkowy", id=111, category=c11, brand="Tymbark")
+    Product("Woda", id=112, category=c11)
+    return tree
+
+
+def test_export_tree(tmp_path):
+    path = tmp_path / "tree.jsonl"
+    export_tree(_tree(), str(path))
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records == [
+        {"id": 1, "parent": None, "kind": "category", "name": "categories"},
+        {"id": 11, "parent": 1, "kind": "category", "name": "Napoje"},
+        {
+            "id": 111,
+            "parent": 11,
+            "kind": "product",
+            "name": "Sok jabłkowy",
+            "attrs": {"brand": "Tymbark"},
+        },
+        {"id": 112, "parent": 11, "kind": "product", "name": "Woda"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "src, dest", [("tree.yaml", "tree.jsonl.gz"), ("tree.jsonl", "tree.yaml.gz")]
+)
+def test_convert_between_formats(tmp_path, src, dest):
+    tree = _tree()
+    src, dest = str(tmp_path / src), str(tmp_path / dest)
+    get_tree_exporter(src)(tree, src)
+    get_tree_exporter(dest)(get_tree_parser(src).parse_tree(src), dest)
+    converted = get_tree_parser(dest).parse_tree(dest)
+
+    def describe(tree):
+        return [
+            (type(node).__name__.replace("Labelable", ""), node.name, node.id)
+            for node in preorder(tree)
+        ]
+
+    assert describe(converted) == describe(tree)
+    assert converted.products[0].attrs == {"brand": "Tymbark"}
+
+
+def test_tree_format():
+    assert tree_format("tree.yaml") == ".yaml"
+    assert tree_format("tree.jsonl.zst") == ".jsonl"
+    with pytest.raises(ValueError):
+        tree_format("tree.json")
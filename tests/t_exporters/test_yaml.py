@@ -1,10 +1,14 @@
+import io
 import textwrap
 
 from tree_labeller.core.types import Category, Product
 
 import pytest
+import yaml
 
-from tree_labeller.exporters.yaml import export_tree
+from tree_labeller.exporters.yaml import Dumper, export_tree, write_tree
+from tree_labeller.parsers.yaml import YamlTreeParser
+from tree_labeller.tree.utils import preorder
 
 
 def test_export_tree(tmp_path):
@@ -34,3 +38,82 @@ def test_export_tree(tmp_path):
     with open(path) as f:
         doc = f.read()
     assert textwrap.dedent(doc) == textwrap.dedent(expected_doc)
+
+
+def test_export_tree_with_attrs(tmp_path):
+    expected_doc = """\
+    name: categories
+    id: 1
+    children:
+    - name: Jack Daniel's
+      id: 11
+      brand: Brown-Forman
+        """
+
+    tree = Category("categories", id=1)
+    Product("Jack Daniel's", id=11, category=tree, brand="Brown-Forman")
+    # Cached structural views must not be exported
+    tree.compact_tree
+    path = tmp_path / "tree.yaml"
+    export_tree(tree, str(path))
+    with open(path) as f:
+        doc = f.read()
+    assert textwrap.dedent(doc) == textwrap.dedent(expected_doc)
+
+
+def _tree_with_attrs():
+    tree = Category("categories", id=1)
+    c11 = Category("Napoje", id=11, parent=tree)
+    Product("Sok jabłkowy " * 10, id=111, category=c11, brand="Tymbark")
+    Product("Woda", id=112, category=c11, volume=1.5, tags=["a", "b"])
+    return tree
+
+
+@pytest.mark.parametrize("dumper", [yaml.SafeDumper, Dumper])
+def test_write_tree_as_dump_of_dict(dumper):
+    dct = {
+        "name": "categories",
+        "id": 1,
+        "children": [
+            {
+                "name": "Napoje",
+                "id": 11,
+                "children": [
+                    {"name": "Sok jabłkowy " * 10, "id": 111, "brand": "Tymbark"},
+                    {"name": "Woda", "id": 112, "volume": 1.5, "tags": ["a", "b"]},
+                ],
+            },
+        ],
+    }
+    out = io.StringIO()
+    write_tree(_tree_with_attrs(), out, dumper)
+
+    expected = yaml.dump(dct, Dumper=dumper, default_flow_style=False, sort_keys=False)
+    assert out.getvalue() == expected
+
+
+@pytest.mark.parametrize("suffix", [".yaml", ".yaml.gz"])
+def test_export_tree_round_trip(tmp_path, suffix):
+    tree = _tree_with_attrs()
+    path = str(tmp_path / f"tree{suffix}")
+    export_tree(tree, path)
+    parsed = YamlTreeParser().parse_tree(path)
+
+    assert [(n.name, n.id) for n in preorder(parsed)] == [
+        (n.name, n.id) for n in preorder(tree)
+    ]
+    assert [dict(p.attrs) for p in parsed.products] == [
+        {"brand": "Tymbark"},
+        {"volume": 1.5, "tags": ["a", "b"]},
+    ]
+
+
+def test_export_deep_tree(tmp_path):
+    tree = parent = Category("categories", id=0)
+    for i in range(1, 2000):
+        parent = Category(f"c{i}", id=i, parent=parent)
+    Product("p", id=1, category=parent)
+    path = str(tmp_path / "tree.yaml")
+    export_tree(tree, path)
+    parsed = YamlTreeParser().parse_tree(path)
+    assert parsed.products[0].category.id == 1999
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from tree_labeller.parsers.feedcache import FeedCache
+from tree_labeller.parsers.frisco import FriscoTreeParser
+from tree_labeller.tree.utils import preorder
+
+
+class FeedServer(HTTPServer):
+    """Serves a single feed, supporting ETag and Last-Modified revalidation."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FeedHandler)
+        self.body = b""
+        self.use_etag = True
+        self.requests = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/feed.json"
+
+    @property
+    def etag(self):
+        return '"' + hashlib.md5(self.body).hexdigest() + '"'
+
+    @property
+    def last_modified(self):
+        return f"Mon, 01 Jan 2024 00:00:{len(self.body):02d} GMT"
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.use_etag:
+            not_modified = self.headers.get("If-None-Match") == server.etag
+        else:
+            not_modified = self.headers.get("If-Modified-Since") == server.last_modified
+        if not_modified:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        if server.use_etag:
+            self.send_header("ETag", server.etag)
+        else:
+            self.send_header("Last-Modified", server.last_modified)
+        self.send_header("Content-Length", str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FeedServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("use_etag", [True, False])
+def test_fetch_revalidates(tmp_path, server, use_etag):
+    server.use_etag = use_etag
+    server.body = b"first"
+    cache = FeedCache(str(tmp_path))
+
+    path, digest = cache.fetch(server.url)
+    assert digest == hashlib.sha256(b"first").hexdigest()
+    with open(path, "rb") as f:
+        assert f.read() == b"first"
+
+    assert cache.fetch(server.url) == (path, digest)
+    header = "If-None-Match" if use_etag else "If-Modified-Since"
+    assert header in server.requests[-1]
+
+    server.body = b"second"
+    new_path, new_digest = cache.fetch(server.url)
+    assert new_digest == hashlib.sha256(b"second").hexdigest()
+    assert not os.path.exists(path)
+
+
+def test_fetch_falls_back_to_cached_feed(tmp_path, server):
+    server.body = b"feed"
+    cache = FeedCache(str(tmp_path))
+    cached = cache.fetch(server.url)
+    url = server.url
+    server.shutdown()
+    server.server_close()
+
+    assert cache.fetch(url) == cached
+
+
+def test_parse_tree_reuses_snapshot(tmp_path, server, monkeypatch):
+    server.body = json.dumps(
+        {
+            "categories": [{"name": {"pl": "Soki"}, "parentPath": "1"}],
+            "products": [
+                {
+                    "id": 101,
+                    "name": {"pl": "Sok"},
+                    "brand": "Tymbark",
+                    "primaryCategory": {"parentId": 1},
+                }
+            ],
+        }
+    ).encode("utf-8")
+    parser = FriscoTreeParser(cache=FeedCache(str(tmp_path)))
+    tree = parser.parse_tree(server.url)
+
+    def fail(*args):
+        raise AssertionError("Unchanged feed should not be parsed again")
+
+    monkeypatch.setattr(FriscoTreeParser, "_parse_stream", fail)
+    cached_tree = parser.parse_tree(server.url)
+
+    assert [(type(node), node.id) for node in preorder(cached_tree)] == [
+        (type(node), node.id) for node in preorder(tree)
+    ]
+    assert cached_tree.products[0].attrs == {"brand": "Tymbark"}
+
+    other_parser = FriscoTreeParser(lang="en", cache=FeedCache(str(tmp_path)))
+    assert other_parser._snapshot_variant() != parser._snapshot_variant()
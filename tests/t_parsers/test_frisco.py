@@ -0,0 +1,129 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from tree_labeller.parsers.frisco import FriscoFieldMapping, FriscoTreeParser
+from tree_labeller.tree.utils import preorder
+
+CONTENT = {
+    "categories": [
+        {
+            "name": {"pl": "Napoje"},
+            "parentPath": "1",
+            "children": [
+                {"name": {"pl": "Soki"}, "parentPath": "11,1"},
+                {"name": {"pl": "Puste"}, "parentPath": "12,1"},
+            ],
+        },
+        {"name": {"pl": "Puste"}, "parentPath": "2"},
+    ],
+    "products": [
+        {
+            "id": 101,
+            "name": {"pl": " Sok "},
+            "brand": "Tymbark",
+            "subbrand": "Cool",
+            "primaryCategory": {"parentId": 11},
+        },
+        {"id": 102, "name": {"pl": "Bez kategorii"}, "brand": "X"},
+    ],
+}
+
+
+def test_parse_content_skips_empty_categories():
+    tree = FriscoTreeParser()._parse_content(json.dumps(CONTENT))
+
+    assert [node.id for node in preorder(tree)] == [0, 1, 11, 101]
+    (product,) = tree.products
+    assert product.name == "Sok" and product.attrs == {"brand": "Tymbark Cool"}
+    assert product.category_name == "categories>Napoje>Soki"
+
+
+def test_parse_content_keeps_empty_categories():
+    parser = FriscoTreeParser(skip_empty_categories=False)
+    tree = parser._parse_content(json.dumps(CONTENT))
+
+    assert [node.id for node in preorder(tree)] == [0, 1, 11, 101, 12, 2]
+
+
+@pytest.mark.parametrize("products_first", [False, True])
+@pytest.mark.parametrize("skip_empty_categories", [False, True])
+def test_parse_stream(products_first, skip_empty_categories):
+    content = dict(reversed(CONTENT.items())) if products_first else CONTENT
+    parser = FriscoTreeParser(skip_empty_categories=skip_empty_categories)
+    expected = parser._parse_content(json.dumps(CONTENT))
+
+    data = gzip.compress(json.dumps(content).encode("utf-8"))
+    tree = parser._parse_stream(io.BytesIO(data))
+
+    assert [(type(node), node.id) for node in preorder(tree)] == [
+        (type(node), node.id) for node in preorder(expected)
+    ]
+    assert [dict(product.attrs) for product in tree.products] == [
+        dict(product.attrs) for product in expected.products
+    ]
+
+
+class UpperCaseMapping(FriscoFieldMapping):
+    def __call__(self, product):
+        record = super().__call__(product)
+        if record is None:
+            return None
+        category_id, id, name, attrs = record
+        return category_id, id, name.upper(), {**attrs, "lang": self.lang}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_parse_with_field_mapping(streaming):
+    content = {
+        **CONTENT,
+        "products": [
+            {**product, "id": product["id"] * 10 + i}
+            for product in CONTENT["products"]
+            for i in range(5)
+        ],
+    }
+    data = json.dumps(content)
+    parser = FriscoTreeParser(streaming=streaming, field_mapping=UpperCaseMapping())
+
+    if streaming:
+        tree = parser._parse_stream(io.BytesIO(data.encode("utf-8")))
+    else:
+        tree = parser._parse_content(data)
+
+    assert [product.id for product in tree.products] == [1010, 1011, 1012, 1013, 1014]
+    assert {product.name for product in tree.products} == {"SOK"}
+    assert tree.products[0].attrs == {"brand": "Tymbark Cool", "lang": "pl"}
+
+
+@pytest.mark.parametrize("products_first", [False, True])
+def test_parse_stream_with_workers(products_first):
+    content = {
+        **CONTENT,
+        "products": [
+            {**product, "id": product["id"] * 10 + i}
+            for product in CONTENT["products"]
+            for i in range(5)
+        ],
+    }
+    if products_first:
+        content = dict(reversed(content.items()))
+    data = json.dumps(content).encode("utf-8")
+    serial = FriscoTreeParser(field_mapping=UpperCaseMapping())
+    pooled = FriscoTreeParser(
+        n_workers=2, chunk_size=2, field_mapping=UpperCaseMapping()
+    )
+
+    expected = serial._parse_stream(io.BytesIO(data))
+    tree = pooled._parse_stream(io.BytesIO(data))
+
+    assert [
+        (type(node), node.id, node.name, dict(getattr(node, "attrs", {})))
+        for node in preorder(tree)
+    ] == [
+        (type(node), node.id, node.name, dict(getattr(node, "attrs", {})))
+        for node in preorder(expected)
+    ]
+    assert len(tree.products) == 5
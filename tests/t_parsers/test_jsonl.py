@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from tree_labeller.core.types import LabelableCategory, LabelableProduct
+from tree_labeller.parsers.jsonl import JsonlTreeParser
+
+RECORDS = [
+    {"id": 1, "parent": None, "kind": "category", "name": "categories"},
+    {"id": 11, "parent": 1, "kind": "category", "name": "Alcoholic Drinks"},
+    {"id": 111, "parent": 11, "kind": "category", "name": "Whiskies"},
+    {
+        "id": 1111,
+        "parent": 111,
+        "kind": "product",
+        "name": "Jack Daniel's",
+        "attrs": {"brand": "Brown-Forman"},
+    },
+    {"id": 1112, "parent": 111, "kind": "product", "name": "Johnnie Walker's"},
+    {"id": 12, "parent": 1, "kind": "category", "name": "Empty"},
+]
+
+
+def _lines(records):
+    return [json.dumps(record) + "\n" for record in records]
+
+
+def _check_tree(tree):
+    assert isinstance(tree, LabelableCategory)
+    assert [c.name for c in tree.categories] == [
+        "categories",
+        "Alcoholic Drinks",
+        "Whiskies",
+        "Empty",
+    ]
+    assert [(p.id, p.category.id) for p in tree.products] == [
+        (1111, 111),
+        (1112, 111),
+    ]
+    assert all(isinstance(p, LabelableProduct) for p in tree.products)
+    assert tree.products[0].attrs == {"brand": "Brown-Forman"}
+    assert tree.products[1].attrs == {}
+
+
+def test_parse(tmp_path):
+    path = tmp_path / "tree.jsonl"
+    path.write_text("".join(_lines(RECORDS)) + "\n")
+
+    _check_tree(JsonlTreeParser().parse_tree(str(path)))
+
+
+def test_load_in_any_order():
+    tree = JsonlTreeParser().load(_lines(reversed(RECORDS)))
+
+    assert {c.name for c in tree.categories} == {
+        "categories",
+        "Alcoholic Drinks",
+        "Whiskies",
+        "Empty",
+    }
+    assert {p.id for p in tree.products} == {1111, 1112}
+    # Products share the attribute store of the tree
+    assert all(p._attrs_store is tree.attribute_store for p in tree.products)
+
+
+def test_load_skipping_empty_categories():
+    tree = JsonlTreeParser(skip_empty_categories=True).load(_lines(RECORDS))
+
+    assert [c.name for c in tree.categories] == [
+        "categories",
+        "Alcoholic Drinks",
+        "Whiskies",
+    ]
+
+
+def test_load_unknown_parent():
+    records = RECORDS + [{"id": 2, "parent": 99, "kind": "product", "name": "x"}]
+    with pytest.raises(ValueError, match="99"):
+        JsonlTreeParser().load(_lines(records))
+
+
+def test_load_duplicate_category():
+    records = RECORDS + [{"id": 11, "parent": 1, "kind": "category", "name": "x"}]
+    with pytest.raises(AssertionError, match="Second category"):
+        JsonlTreeParser().load(_lines(records))
@@ -0,0 +1,81 @@
+import gzip
+import io
+import json
+
+import pytest
+
+from tree_labeller.parsers.jsonstream import _Reader, iter_array_items, open_text
+
+DOC = {
+    "version": {"major": 1, "tags": ["a", "b"]},
+    "skipped": [{"text": 'quoted " and escaped \\ [ { chars'}, "]}", [[], {}]],
+    "categories": [{"id": 1, "name": "ą" * 50}, {"id": 2, "children": []}],
+    "empty": [],
+    "products": [12345678, -1.5e3, "x, y]", None, True, [1, [2]]],
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+def test_iter_array_items(chunk_size):
+    text = json.dumps(DOC, indent=2, ensure_ascii=False)
+    reader = _Reader(io.StringIO(text), chunk_size=chunk_size)
+
+    items = list(reader.iter_array_items({"categories", "products", "empty"}))
+
+    assert items == [("categories", c) for c in DOC["categories"]] + [
+        ("products", p) for p in DOC["products"]
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+def test_iter_raw_array_items(chunk_size):
+    text = json.dumps(DOC, indent=2, ensure_ascii=False)
+    reader = _Reader(io.StringIO(text), chunk_size=chunk_size)
+
+    items = list(
+        reader.iter_array_items(
+            {"skipped", "categories", "products"}, raw_keys={"skipped", "products"}
+        )
+    )
+
+    assert [(key, item) for key, item in items if key == "categories"] == [
+        ("categories", c) for c in DOC["categories"]
+    ]
+    raw_items = [(key, item) for key, item in items if key != "categories"]
+    assert all(isinstance(item, str) for _, item in raw_items)
+    assert [(key, json.loads(item)) for key, item in raw_items] == [
+        ("skipped", s) for s in DOC["skipped"]
+    ] + [("products", p) for p in DOC["products"]]
+
+
+def test_iter_array_items_of_gzipped_input():
+    data = gzip.compress(json.dumps(DOC).encode("utf-8"))
+
+    items = list(iter_array_items(open_text(io.BytesIO(data)), ["products"]))
+
+    assert [item for _, item in items] == DOC["products"]
+
+
+@pytest.mark.parametrize("text", ['{"products": [1, 2', '{"products": [1 2]}', "[]"])
+def test_iter_array_items_of_invalid_input(text):
+    with pytest.raises(ValueError):
+        list(iter_array_items(io.StringIO(text), ["products"]))
+
+
+class _CountingReader(io.StringIO):
+    def __init__(self, text):
+        super().__init__(text)
+        self.n_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.n_read += len(chunk)
+        return chunk
+
+
+def test_iter_array_items_fails_early_on_invalid_item():
+    f = _CountingReader('{"products": [{"id": 1 "x": 2}, ' + "1, " * 100000 + "1]}")
+
+    with pytest.raises(ValueError):
+        list(_Reader(f, chunk_size=64).iter_array_items({"products"}))
+    assert f.n_read < 1000
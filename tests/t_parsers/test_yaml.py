@@ -40,3 +40,127 @@ def assert_tree_equality(t1: NodeMixin, t2: NodeMixin):
     for n1, n2 in zip(PreOrderIter(t1), PreOrderIter(t2)):
         assert type(n1) == type(n2)
         assert n1 == n2
+
+
+def test_parse_mixed_nodes(tmp_path):
+    yaml_doc = """
+name: categories
+id: 1
+children:
+- name: Alcoholic Drinks
+  id: 11
+  children:
+  - name: Jack Daniel's
+    id: 1111
+    brand: Jack Daniel's
+    tags: [whiskey, "bourbon"]
+  - name: Empty
+    id: 112
+    children: []
+  - children:
+    - name: Guinness
+      id: 1131
+      volume: 0.5
+    name: Beers
+    id: 113
+- name: Without products
+  id: 2
+  children:
+  - id: 21
+    """
+    path = tmp_path / "doc.yaml"
+    with open(path, "w") as f:
+        f.write(yaml_doc)
+
+    expected_tree = LabelableCategory("categories", id=1)
+    c11 = LabelableCategory("Alcoholic Drinks", id=11, parent=expected_tree)
+    LabelableProduct(
+        "Jack Daniel's",
+        id=1111,
+        category=c11,
+        brand="Jack Daniel's",
+        tags=["whiskey", "bourbon"],
+    )
+    # A leaf with an empty list of children is a product
+    LabelableProduct("Empty", id=112, category=c11)
+    c113 = LabelableCategory("Beers", id=113, parent=c11)
+    LabelableProduct("Guinness", id=1131, category=c113, volume=0.5)
+    # A leaf without a name is not a product and is skipped
+    LabelableCategory("Without products", id=2, parent=expected_tree)
+
+    tree = YamlTreeParser().parse_tree(path)
+    assert_tree_equality(tree, expected_tree)
+    assert [(type(node), node.name) for node in PreOrderIter(tree)] == [
+        (type(node), node.name) for node in PreOrderIter(expected_tree)
+    ]
+    assert [dict(p.attrs) for p in tree.products] == [
+        dict(p.attrs) for p in expected_tree.products
+    ]
+
+
+@pytest.mark.parametrize("children_first", [False, True])
+def test_parse_rejects_unknown_category_attributes(tmp_path, children_first):
+    children = "children:\n- name: product\n  id: 11\n"
+    attrs = "name: categories\nid: 1\ncolor: red\n"
+    path = tmp_path / "doc.yaml"
+    with open(path, "w") as f:
+        f.write(children + attrs if children_first else attrs + children)
+
+    with pytest.raises(TypeError):
+        YamlTreeParser().parse_tree(path)
+
+
+def test_parse_deep_tree(tmp_path):
+    depth = 3000
+    path = tmp_path / "doc.yaml"
+    with open(path, "w") as f:
+        for level in range(depth):
+            indent = "  " * level
+            f.write(f"name: c{level}\n{indent}id: {level}\n")
+            f.write(f"{indent}children:\n{indent}- ")
+        f.write(f"name: product\n{'  ' * depth}id: {depth}\n")
+
+    tree = YamlTreeParser().parse_tree(path)
+
+    node, n_categories = tree, 0
+    while isinstance(node, LabelableCategory):
+        assert node.id == n_categories
+        n_categories += 1
+        (node,) = node.children
+    assert n_categories == depth
+    assert node == LabelableProduct("product", id=depth, category=None)
+
+
+def test_parse_skipping_empty_categories(tmp_path):
+    yaml_doc = """
+name: categories
+id: 1
+children:
+- name: Without products
+  id: 2
+  children:
+  - name: Empty
+    id: 21
+    children:
+    - id: 211
+- name: Alcoholic Drinks
+  id: 11
+  children:
+  - name: Empty
+    id: 111
+    children: [{id: 1111}]
+  - name: Whiskies
+    id: 112
+    children:
+    - name: Jack Daniel's
+      id: 1121
+      brand: Jack Daniel's
+    """
+    path = tmp_path / "doc.yaml"
+    with open(path, "w") as f:
+        f.write(yaml_doc)
+
+    tree = YamlTreeParser(skip_empty_categories=True).parse_tree(path)
+
+    assert [node.id for node in PreOrderIter(tree)] == [1, 11, 112, 1121]
+    assert tree.attribute_store.names == ["brand"]
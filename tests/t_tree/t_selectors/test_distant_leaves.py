@@ -1,28 +1,20 @@
+import random
+
+import pytest
 from anytree import AnyNode, RenderTree, ContRoundStyle
 
+from tree_labeller.tree.compact import CompactTree
 from tree_labeller.tree.selectors.distant_leaves import (
-    _to_binary_tree,
+    ImplicitBinaryTree,
+    depth_weight,
     select_distant_leaves,
     _select_distant_leaves_binary_tree,
+    _select_distant_leaves_binary_tree_vectorized,
 )
 
 
-def test_to_binary_tree():
-    # TODO Turn into a test, add assertions
-
-    v = AnyNode(id="v")
-    v1 = AnyNode(v, id="v1")
-    v2 = AnyNode(v, id="v2")
-    v3 = AnyNode(v, id="v3")
-    v11 = AnyNode(v1, id="v11")
-    v12 = AnyNode(v1, id="v12")
-    v13 = AnyNode(v1, id="v13")
-    v31 = AnyNode(v3, id="v31")
-
-    print(RenderTree(v, style=ContRoundStyle()))
-    print()
-    binary_tree = _to_binary_tree(v)
-    print(RenderTree(binary_tree, style=ContRoundStyle()))
+def _binary_tree(root):
+    return ImplicitBinaryTree(CompactTree.from_root(root))
 
 
 def test_select_distant_leaves():
@@ -72,7 +64,7 @@ def test_select_distant_leaves_binary_tree_1():
     print(RenderTree(v, style=ContRoundStyle()))
     print()
 
-    leaves, _ = _select_distant_leaves_binary_tree(v, 1)
+    leaves, _ = _select_distant_leaves_binary_tree(_binary_tree(v), 1)
     assert leaves == {v2} or leaves == {v11} or leaves == {v12}
 
 
@@ -87,5 +79,77 @@ def test_select_distant_leaves_binary_tree_2():
     print(RenderTree(v, style=ContRoundStyle()))
     print()
 
-    leaves, _ = _select_distant_leaves_binary_tree(v, 2)
+    leaves, _ = _select_distant_leaves_binary_tree(_binary_tree(v), 2)
     assert leaves == {v2, v12} or leaves == {v2, v11}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorized_same_as_reference(seed):
+    pytest.importorskip("numpy")
+    rng = random.Random(seed)
+    nodes = [AnyNode(id=0)]
+    for i in range(1, rng.randint(2, 60)):
+        nodes.append(AnyNode(parent=rng.choice(nodes), id=i))
+    binary_tree = _binary_tree(nodes[0])
+    n = rng.randint(1, len(nodes[0].leaves))
+
+    expected = _select_distant_leaves_binary_tree(binary_tree, n)
+    actual = _select_distant_leaves_binary_tree_vectorized(binary_tree, n)
+
+    assert actual == expected
+
+
+def _render(tree, b):
+    name = "blank" if b >= len(tree.tree) else tree.node(b).id
+    children = [_render(tree, c) for c in tree.children(b)]
+    return name, tree.n_leaves[b], tree.weight(b), children
+
+
+def test_implicit_binary_tree():
+    v = AnyNode(id="v")
+    v1 = AnyNode(v, id="v1")
+    v2 = AnyNode(v, id="v2")
+    v3 = AnyNode(v, id="v3")
+    v11 = AnyNode(v1, id="v11")
+    v12 = AnyNode(v1, id="v12")
+    v13 = AnyNode(v1, id="v13")
+    v31 = AnyNode(v3, id="v31")
+
+    tree = _binary_tree(v)
+
+    w1, w2 = depth_weight(1), depth_weight(2)
+    assert _render(tree, tree.root) == (
+        "v",
+        5,
+        depth_weight(0),
+        [
+            (
+                "v1",
+                3,
+                w1,
+                [
+                    ("v11", 1, w2, []),
+                    (
+                        "blank",
+                        2,
+                        0.0,
+                        [("v12", 1, w2, []), ("blank", 1, 0.0, [("v13", 1, w2, [])])],
+                    ),
+                ],
+            ),
+            (
+                "blank",
+                2,
+                0.0,
+                [
+                    ("v2", 1, w1, []),
+                    ("blank", 1, 0.0, [("v3", 1, w1, [("v31", 1, w2, [])])]),
+                ],
+            ),
+        ],
+    )
+    postorder = list(tree.postorder())
+    n = len(tree.tree)
+    assert sorted(postorder) == list(range(n)) + [n + 3, n + 4, n + 5, n + 6]
+    for b in postorder:
+        assert all(postorder.index(c) < postorder.index(b) for c in tree.children(b))
@@ -0,0 +1,71 @@
+import random
+
+from anytree import Node
+
+from tree_labeller.tree.compact import NO_NODE, CompactTree
+from tree_labeller.tree.selectors import k_center, select_k_center
+
+
+def _build():
+    f = Node("f")
+    b = Node("b", parent=f)
+    a = Node("a", parent=b)
+    c = Node("c", parent=b)
+    g = Node("g", parent=f)
+    h = Node("h", parent=g)
+    i = Node("i", parent=h)
+    j = Node("j", parent=h)
+    k = Node("k", parent=g)
+    return f
+
+
+def _names(nodes):
+    return {node.name for node in nodes}
+
+
+def test_select_k_center():
+    f = _build()
+
+    # Leaves from different top categories are the farthest apart
+    selected = _names(select_k_center(f, k=2))
+    assert len(selected & {"a", "c"}) == 1
+    assert len(selected & {"i", "j", "k"}) == 1
+
+    # Then leaves from different subcategories
+    selected = _names(select_k_center(CompactTree.from_root(f), k=3))
+    assert len(selected & {"a", "c"}) == 1
+    assert "k" in selected
+    assert len(selected & {"i", "j"}) == 1
+
+    assert _names(select_k_center(f, k=10)) == {"a", "c", "i", "j", "k"}
+    assert select_k_center(f, k=0) == set()
+
+
+def test_select_k_center_single_node():
+    f = Node("f")
+    assert select_k_center(f, k=1) == {f}
+
+
+def test_select_k_center_deep_tree_same_with_index(monkeypatch):
+    rng = random.Random(0)
+    parent = [NO_NODE]
+    for i in range(1, 3000):
+        # Mostly a chain of categories, with some products hanging off it
+        parent.append(i - 1 if rng.random() < 0.8 else rng.randrange(i))
+    tree = CompactTree.from_root(_to_nodes(parent))
+
+    random.seed(0)
+    indexed = select_k_center(tree, k=20)
+    monkeypatch.setattr(k_center, "MIN_INDEXED_DEPTH", len(tree))
+    random.seed(0)
+    walked = select_k_center(tree, k=20)
+
+    assert indexed == walked
+
+
+def _to_nodes(parent):
+    nodes = [Node(i) for i in range(len(parent))]
+    for i, p in enumerate(parent):
+        if p != NO_NODE:
+            nodes[i].parent = nodes[p]
+    return nodes[0]
@@ -1,6 +1,11 @@
+import random
+from collections import defaultdict
+from itertools import zip_longest
+
 import pytest
-from anytree import Node, AsciiStyle, RenderTree
+from anytree import Node, AsciiStyle, RenderTree, LevelOrderGroupIter
 
+from tree_labeller.tree.compact import CompactTree
 from tree_labeller.tree.selectors import top_down
 
 
@@ -16,10 +21,37 @@ def test_iterate():
     e = Node("e", parent=h)
 
     print(RenderTree(f, style=AsciiStyle()).by_attr())
-    nodes = [node.name for node in top_down._iterate(f, shuffle=False)]
+    tree = CompactTree.from_root(f)
+    nodes = [tree.nodes[i].name for i in top_down._iterate(tree, shuffle=False)]
     assert nodes == ["f", "b", "g", "a", "i", "d", "h", "c", "e"]
 
 
+def _iterate_levels(root):
+    """Reference: every level is shuffled as a whole and grouped by parents."""
+    for children in LevelOrderGroupIter(root):
+        children = list(children)
+        random.shuffle(children)
+        children_per_parent = defaultdict(list)
+        for child in children:
+            children_per_parent[child.parent].append(child)
+        for selected in zip_longest(*children_per_parent.values()):
+            yield from (node.name for node in selected if node is not None)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_iterate_shuffles_whole_levels(seed):
+    rng = random.Random(seed)
+    nodes = [Node("root")]
+    for i in range(40):
+        nodes.append(Node(str(i), parent=rng.choice(nodes)))
+    tree = CompactTree.from_root(nodes[0])
+
+    random.seed(seed)
+    expected = list(_iterate_levels(nodes[0]))
+    random.seed(seed)
+    assert [tree.nodes[i].name for i in top_down._iterate(tree)] == expected
+
+
 def test_select_categories():
     f = Node("f")
     b = Node("b", parent=f)
@@ -29,16 +61,49 @@ def test_select_categories():
     h = Node("h", parent=g)
     e = Node("e", parent=h)
     print(RenderTree(f, style=AsciiStyle()).by_attr())
+    tree = CompactTree.from_root(f)
 
-    nodes = [node.name for node in top_down._select_categories(f, k=1)]
+    nodes = [tree.nodes[i].name for i in top_down._select_categories(tree, k=1)]
     assert nodes == ["f"]
 
-    nodes = {node.name for node in top_down._select_categories(f, k=2)}
+    nodes = {tree.nodes[i].name for i in top_down._select_categories(tree, k=2)}
     assert nodes == {"b", "g"}
 
-    nodes = {node.name for node in top_down._select_categories(f, k=3)}
+    nodes = {tree.nodes[i].name for i in top_down._select_categories(tree, k=3)}
     assert nodes == {"h", "i", "c"}
 
     with pytest.raises(AssertionError):
         # Too many categories to select
-        top_down._select_categories(f, k=4)
+        top_down._select_categories(tree, k=4)
+
+
+def test_select_top_down():
+    f = Node("f")
+    b = Node("b", parent=f)
+    a = Node("a", parent=b)
+    c = Node("c", parent=b)
+    g = Node("g", parent=f)
+    h = Node("h", parent=g)
+    i = Node("i", parent=h)
+
+    assert top_down.select_top_down(f, k=1) in ({a}, {c}, {i})
+    assert top_down.select_top_down(f, k=2) in ({a, i}, {c, i})
+    assert top_down.select_top_down(CompactTree.from_root(f), k=5) in (
+        {a, i},
+        {c, i},
+    )
+
+
+def test_select_top_down_reuses_tree_structure(monkeypatch):
+    f = Node("f")
+    for name in "abc":
+        Node(name, parent=Node(f"{name}-category", parent=f))
+    tree = CompactTree.from_root(f)
+    assert len(top_down.select_top_down(tree, k=2)) == 2
+
+    def fail(*args):
+        raise AssertionError("Levels should be computed once per tree")
+
+    monkeypatch.setattr(top_down, "_CategoryLevels", fail)
+    monkeypatch.setattr(CompactTree, "leaves", fail)
+    assert len(top_down.select_top_down(tree, k=3)) == 3
@@ -1,33 +1,33 @@
+import random
 from typing import Set
 
 import pytest
-from anytree import PreOrderIter
+from anytree import AnyNode, PreOrderIter
 
-from tree_labeller.tree.coloring import (
-    ColorableNode,
-    select_subtree_requiring_verification,
-    color_tree,
-    Color,
-)
+from tree_labeller.core.types import LabelRegistry
+from tree_labeller.tree.coloring import color_compact_tree
+from tree_labeller.tree.compact import CompactTree
 
 
-class MockedColorableNode(ColorableNode):
-    def __init__(
-        self,
-        parent=None,
-        id: str = None,
-        colors: Set[Color] = None,
-    ):
-        super().__init__(None, parent, colors)
-        self.id = id
+def _node(parent=None, id: str = None, colors: Set[str] = None):
+    return AnyNode(parent, id=id, colors=colors if colors is not None else set())
+
+
+def _color(root: AnyNode):
+    tree = CompactTree.from_root(root)
+    registry = LabelRegistry()
+    masks = [registry.mask(node.colors) for node in tree.nodes]
+    color_compact_tree(tree, masks)
+    for node, mask in zip(tree.nodes, masks):
+        node.colors = registry.labels(mask)
 
 
 def test_coloring_1():
-    v = MockedColorableNode(id="v")
-    v1 = MockedColorableNode(v, id="v1")
-    v2 = MockedColorableNode(v, id="v2", colors={"blue"})
+    v = _node(id="v")
+    v1 = _node(v, id="v1")
+    v2 = _node(v, id="v2", colors={"blue"})
 
-    color_tree(v)
+    _color(v)
 
     assert v.colors == {"blue"}
     assert v1.colors == {"blue"}
@@ -35,11 +35,11 @@ def test_coloring_1():
 
 
 def test_coloring_2():
-    v = MockedColorableNode(id="v")
-    v1 = MockedColorableNode(v, id="v1", colors={"green"})
-    v2 = MockedColorableNode(v, id="v2", colors={"blue"})
+    v = _node(id="v")
+    v1 = _node(v, id="v1", colors={"green"})
+    v2 = _node(v, id="v2", colors={"blue"})
 
-    color_tree(v)
+    _color(v)
 
     assert v.colors == {"blue", "green"}
     assert v1.colors == {"green"}
@@ -47,12 +47,12 @@ def test_coloring_2():
 
 
 def test_coloring_3():
-    v = MockedColorableNode(id="v")
-    v1 = MockedColorableNode(v, id="v1", colors={"green"})
-    v2 = MockedColorableNode(v, id="v2", colors={"blue"})
-    v3 = MockedColorableNode(v, id="v3")
+    v = _node(id="v")
+    v1 = _node(v, id="v1", colors={"green"})
+    v2 = _node(v, id="v2", colors={"blue"})
+    v3 = _node(v, id="v3")
 
-    color_tree(v)
+    _color(v)
 
     assert v.colors == {"blue", "green"}
     assert v1.colors == {"green"}
@@ -61,38 +61,87 @@ def test_coloring_3():
 
 
 def test_coloring_internal_node_colored():
-    v = MockedColorableNode(id="v", colors={"green"})
-    v1 = MockedColorableNode(v, id="v1", colors={"green"})
-    v2 = MockedColorableNode(v, id="v2", colors={"blue"})
+    v = _node(id="v", colors={"green"})
+    v1 = _node(v, id="v1", colors={"green"})
+    v2 = _node(v, id="v2", colors={"blue"})
 
     with pytest.raises(AssertionError) as ex:
-        color_tree(v)
+        _color(v)
 
 
 def test_coloring_no_leaf_colored():
-    v = MockedColorableNode(id="v")
-    v1 = MockedColorableNode(v, id="v1")
-    v2 = MockedColorableNode(v, id="v2")
+    v = _node(id="v")
+    v1 = _node(v, id="v1")
+    v2 = _node(v, id="v2")
 
     with pytest.raises(AssertionError) as ex:
-        color_tree(v)
+        _color(v)
 
 
 def test_coloring_multi_colored_leaf():
-    v = MockedColorableNode(id="v")
-    v1 = MockedColorableNode(v, id="v1", colors={"blue", "green"})
-    v2 = MockedColorableNode(v, id="v2")
+    v = _node(id="v")
+    v1 = _node(v, id="v1", colors={"blue", "green"})
+    v2 = _node(v, id="v2")
 
     with pytest.raises(AssertionError) as ex:
-        color_tree(v)
+        _color(v)
+
+
+def _color_tree_recursively(root: AnyNode):
+    # Reference implementation the coloring engine must agree with
+    def color_from_children(node: AnyNode):
+        if not node.parent:
+            return
+        node.parent.colors.update(node.colors)
+        color_from_children(node.parent)
+
+    def color_from_parent(node: AnyNode):
+        for child in node.children:
+            if not child.colors:
+                child.colors = node.colors
+            color_from_parent(child)
+
+    for leaf in root.leaves:
+        if leaf.colors:
+            color_from_children(leaf)
+    color_from_parent(root)
+
 
+def _random_tree(rng: random.Random, n_nodes: int):
+    nodes = [_node(id="0")]
+    for i in range(1, n_nodes):
+        nodes.append(_node(rng.choice(nodes), id=str(i)))
+    for leaf in nodes[0].leaves:
+        if rng.random() < 0.3:
+            leaf.colors = {rng.choice("RGB")}
+    if not any(leaf.colors for leaf in nodes[0].leaves):
+        nodes[0].leaves[0].colors = {"R"}
+    return nodes[0]
 
-def test_select_subtree_requiring_verification_1():
-    v = MockedColorableNode(id="v", colors={"green", "blue"})
-    v1 = MockedColorableNode(v, id="v1", colors={"green"})
-    v2 = MockedColorableNode(v, id="v2", colors={"blue"})
-    v3 = MockedColorableNode(v, id="v3", colors={"green", "blue"})
 
-    subtree = select_subtree_requiring_verification(v)
-    nodes = [node.target for node in PreOrderIter(subtree)]
-    assert nodes == [v, v3]
+@pytest.mark.parametrize("seed", range(20))
+def test_coloring_same_as_recursive(seed):
+    tree = _random_tree(random.Random(seed), n_nodes=200)
+    expected_tree = _random_tree(random.Random(seed), n_nodes=200)
+
+    _color(tree)
+    _color_tree_recursively(expected_tree)
+
+    colors = [node.colors for node in PreOrderIter(tree)]
+    expected_colors = [node.colors for node in PreOrderIter(expected_tree)]
+    assert colors == expected_colors
+
+
+def test_coloring_deep_tree():
+    depth = 2000
+    v = _node(id="v")
+    node = v
+    for i in range(depth):
+        sibling = _node(node, id=f"s{i}")
+        node = _node(node, id=f"v{i}")
+    node.colors = {"blue"}
+
+    _color(v)
+
+    assert v.colors == {"blue"}
+    assert sibling.colors == {"blue"}
@@ -0,0 +1,66 @@
+from anytree import Node
+
+from tree_labeller.tree.compact import CompactTree, NO_NODE
+
+
+def _build():
+    f = Node("f")
+    b = Node("b", parent=f)
+    a = Node("a", parent=b)
+    d = Node("d", parent=b)
+    c = Node("c", parent=d)
+    e = Node("e", parent=d)
+    g = Node("g", parent=f)
+    i = Node("i", parent=g)
+    h = Node("h", parent=i)
+    return f
+
+
+def _names(tree, indices):
+    return [tree.nodes[i].name for i in indices]
+
+
+def test_from_root():
+    tree = CompactTree.from_root(_build())
+
+    assert _names(tree, range(len(tree))) == list("fbadcegih")
+    assert list(tree.parent) == [NO_NODE, 0, 1, 1, 3, 3, 0, 6, 7]
+    assert list(tree.depth) == [0, 1, 2, 2, 3, 3, 1, 2, 3]
+    assert list(tree.first_child) == [1, 2, NO_NODE, 4, NO_NODE, NO_NODE, 7, 8, NO_NODE]
+    assert list(tree.next_sibling) == [NO_NODE, 6, 3] + [NO_NODE, 5] + [NO_NODE] * 4
+    assert _names(tree, tree.children(0)) == ["b", "g"]
+    assert _names(tree, tree.children(1)) == ["a", "d"]
+    assert list(tree.children(2)) == []
+    assert _names(tree, tree.leaves()) == ["a", "c", "e", "h"]
+    assert _names(tree, tree.subtree_leaves(1)) == ["a", "c", "e"]
+    assert list(tree.leaf_counts()) == [4, 3, 1, 2, 1, 1, 1, 1, 1]
+
+
+def test_leaf_ranges():
+    tree = CompactTree.from_root(_build())
+
+    leaves, start, end = tree.leaf_ranges()
+
+    assert _names(tree, leaves) == ["a", "c", "e", "h"]
+    for i in range(len(tree)):
+        expected = [j for j in tree.descendants(i) if tree.is_leaf(j)]
+        assert list(leaves[start[i] : end[i]]) == expected
+    assert tree.leaf_ranges() is tree.leaf_ranges()
+
+
+def test_from_root_with_excluded_nodes():
+    tree = CompactTree.from_root(_build(), exclude=lambda node: node.name == "d")
+
+    assert _names(tree, range(len(tree))) == list("fbagih")
+    assert list(tree.parent) == [NO_NODE, 0, 1, 0, 3, 4]
+
+
+def test_subset():
+    tree = CompactTree.from_root(_build())
+
+    subset = tree.subset(lambda i: tree.nodes[i].name not in ("b", "h"))
+
+    assert _names(subset, range(len(subset))) == list("fgi")
+    assert list(subset.parent) == [NO_NODE, 0, 1]
+    assert list(subset.origin) == [0, 6, 7]
+    assert not tree.subset(lambda i: i != 0)
@@ -0,0 +1,46 @@
+import random
+
+from anytree import Node
+
+from tree_labeller.tree.compact import CompactTree, NO_NODE
+from tree_labeller.tree.index import TreeIndex
+
+
+def _random_tree(seed: int, n: int = 200) -> CompactTree:
+    rng = random.Random(seed)
+    nodes = [Node(0)]
+    for i in range(1, n):
+        # Attaching mostly to recent nodes makes the tree deep
+        nodes.append(Node(i, parent=nodes[rng.randrange(max(0, i - 5), i)]))
+    return CompactTree.from_root(nodes[0])
+
+
+def _ancestors(tree: CompactTree, i: int):
+    ancestors = []
+    while i != NO_NODE:
+        ancestors.append(i)
+        i = tree.parent[i]
+    return ancestors
+
+
+def test_tree_index():
+    for seed in range(5):
+        tree = _random_tree(seed)
+        index = TreeIndex(tree)
+        rng = random.Random(seed)
+        for _ in range(200):
+            u, v = rng.randrange(len(tree)), rng.randrange(len(tree))
+            u_ancestors, v_ancestors = _ancestors(tree, u), _ancestors(tree, v)
+
+            assert index.lca(u, v) == next(a for a in u_ancestors if a in v_ancestors)
+            assert index.is_ancestor(u, v) == (u in v_ancestors)
+            assert index.path(v) == v_ancestors[::-1]
+            depth = rng.randint(0, tree.depth[v])
+            assert index.ancestor_at_depth(v, depth) == v_ancestors[::-1][depth]
+
+
+def test_tree_index_of_single_node():
+    index = TreeIndex(CompactTree.from_root(Node("f")))
+    assert index.lca(0, 0) == 0
+    assert index.ancestor_at_depth(0, 0) == 0
+    assert index.path(0) == [0]
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+import logging
+
+import fire
+
+from tree_labeller.core.formats import get_tree_exporter, get_tree_parser
+
+logging.basicConfig(level=logging.INFO)
+
+
+def convert_tree(src: str, dest: str):
+    """Converts a tree between formats, e.g. from tree.yaml to tree.jsonl.gz."""
+    tree = get_tree_parser(src).parse_tree(src)
+    get_tree_exporter(dest)(tree, dest)
+
+
+def cli():
+    fire.Fire(convert_tree)
+
+
+if __name__ == "__main__":
+    cli()
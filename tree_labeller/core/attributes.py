@@ -0,0 +1,120 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Mapping
+
+MISSING = -1
+
+
+class _Column:
+    """Values of a single attribute, dictionary-encoded."""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.values: List[Any] = []
+        self._index: Dict[Any, int] = {}
+        # Rows with a value, an empty column is dropped from the store
+        self.n_rows = 0
+
+    def set(self, row: int, value: Any):
+        # Type is a part of the key, so that e.g. 1 and True are kept apart
+        key = (type(value), value)
+        try:
+            code = self._index.get(key)
+        except TypeError:
+            # Unhashable values, like lists, are stored as they are
+            key, code = None, None
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._index[key] = code
+        if len(self.codes) <= row:
+            self.codes.extend([MISSING] * (row + 1 - len(self.codes)))
+        self.n_rows += self.codes[row] == MISSING
+        self.codes[row] = code
+
+    def get(self, row: int) -> int:
+        return self.codes[row] if row < len(self.codes) else MISSING
+
+    def clear(self, row: int):
+        if self.get(row) != MISSING:
+            self.codes[row] = MISSING
+            self.n_rows -= 1
+
+
+class AttributeStore:
+    """
+    Extra attributes of products kept in columns, one per attribute name.
+
+    Values are dictionary-encoded, so a value repeated by many products,
+    like a brand, is stored once. Every product is a row of the store.
+    Rows of removed products are reused, and columns without values are
+    dropped, so names are the attributes of current products only.
+    """
+
+    def __init__(self):
+        self._columns: Dict[str, _Column] = {}
+        self.n_rows = 0
+        self._free_rows: List[int] = []
+
+    @property
+    def names(self) -> List[str]:
+        """Attribute names in order of appearance."""
+        return list(self._columns)
+
+    def add_row(self, attrs: Mapping[str, Any]) -> int:
+        if self._free_rows:
+            row = self._free_rows.pop()
+        else:
+            row = self.n_rows
+            self.n_rows += 1
+        for name, value in attrs.items():
+            column = self._columns.get(name)
+            if column is None:
+                column = self._columns[name] = _Column()
+            column.set(row, value)
+        return row
+
+    def remove_row(self, row: int):
+        for name, column in list(self._columns.items()):
+            column.clear(row)
+            if not column.n_rows:
+                del self._columns[name]
+        self._free_rows.append(row)
+
+    def row(self, row: int) -> "AttributesView":
+        return AttributesView(self, row)
+
+    def _items(self, row: int) -> Iterator:
+        for name, column in self._columns.items():
+            code = column.get(row)
+            if code != MISSING:
+                yield name, column.values[code]
+
+
+class AttributesView(Mapping):
+    """Read-only view of attributes of a single product."""
+
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: AttributeStore, row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, name: str) -> Any:
+        column = self._store._columns.get(name)
+        code = column.get(self._row) if column is not None else MISSING
+        if code == MISSING:
+            raise KeyError(name)
+        return column.values[code]
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name, _ in self._store._items(self._row))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._store._items(self._row))
+
+    def items(self):
+        return list(self._store._items(self._row))
+
+    def __repr__(self):
+        return repr(dict(self._store._items(self._row)))
@@ -17,7 +17,7 @@ class Charts:
 
     def print_manual_labels_coverage(self):
         coverage = sorted(
-            self.task.n_products_per_manual_label.items(),
+            self.task.stats.n_products_per_manual_label.items(),
             key=lambda label_count: (label_count[1], label_count[0]),
         )
         labels = [_get_label_name(label_count[0]) for label_count in coverage]
@@ -36,8 +36,9 @@ class Charts:
         chart([AVAILABLE_COLORS["blue"]], data, args, labels)
 
     def print_predicted_labels_coverage(self):
-        good = self.task.n_products_per_good_label
-        ambiguous = self.task.n_products_per_ambiguous_label
+        stats = self.task.stats
+        good = stats.n_products_per_good_label
+        ambiguous = stats.n_products_per_ambiguous_label
         coverage = {
             label: (good[label], ambiguous[label])
             for label in self.task.config.allowed_provided_labels | {TO_REJECT_LABEL}
@@ -0,0 +1,59 @@
+"""
+Columnar (Parquet) files of labelled products and category mappings.
+
+TSV files are written row by row and have to be parsed again by every reader,
+Parquet files are written in one batch, as typed columns. Columns of repeated
+strings, like categories, labels and brands, are dictionary-encoded, so they are
+loaded back as categoricals. Needs the optional pyarrow package.
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PARQUET_SUFFIX = ".parquet"
+
+Columns = Dict[str, List[Any]]
+
+
+def is_columnar(path: str) -> bool:
+    return os.fspath(path).endswith(PARQUET_SUFFIX)
+
+
+def write_columns(columns: Columns, path: str):
+    _check_pyarrow()
+    assert is_columnar(path), f"Expected a path ending with {PARQUET_SUFFIX}"
+    table = pa.table({name: _to_array(values) for name, values in columns.items()})
+    pq.write_table(table, path)
+
+
+def read_columns(path: str, names: Optional[List[str]] = None) -> Columns:
+    _check_pyarrow()
+    table = pq.read_table(path, columns=names)
+    return {name: table.column(name).to_pylist() for name in table.column_names}
+
+
+def _to_array(values: List[Any]):
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Values of mixed types, e.g. of an attribute, are kept as strings
+        array = pa.array([None if v is None else str(v) for v in values])
+    if pa.types.is_string(array.type):
+        encoded = array.dictionary_encode()
+        # Unique values like ids and names would only get bigger
+        if len(encoded.dictionary) <= len(encoded) // 2:
+            array = encoded
+    return array
+
+
+def _check_pyarrow():
+    if pa is None:
+        raise ImportError(
+            f"Install pyarrow (pip install pyarrow) to use {PARQUET_SUFFIX} files"
+        )
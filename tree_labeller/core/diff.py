@@ -0,0 +1,128 @@
+"""
+Differences between two versions of a tree, matched by category and product ids.
+
+A refetched feed changes only a small part of the tree, so instead of replacing
+the tree of a task, differences are applied to it. Nodes present in both versions
+are kept, together with their labels, and only added, removed, moved and renamed
+nodes are touched.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from tree_labeller.core.types import (
+    Category,
+    LabelableCategory,
+    LabelableProduct,
+    Product,
+)
+from tree_labeller.tree.utils import preorder
+
+Node = Union[Category, Product]
+# Categories and products are numbered independently
+NodeKey = Tuple[bool, str]
+
+
+def _key(node: Node) -> NodeKey:
+    return isinstance(node, Product), str(node.id)
+
+
+@dataclass
+class TreeDiff:
+    """
+    Added nodes come from the new tree, in pre-order. Other nodes come from the
+    old tree, moved and renamed ones are paired with their new versions.
+    """
+
+    new_root: Optional[Category] = None
+    added: List[Node] = field(default_factory=list)
+    removed: List[Node] = field(default_factory=list)
+    moved: List[Tuple[Node, Node]] = field(default_factory=list)
+    renamed: List[Tuple[Node, Node]] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.moved or self.renamed)
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "moved": len(self.moved),
+            "renamed": len(self.renamed),
+        }
+
+
+def diff_trees(old: Category, new: Category) -> TreeDiff:
+    """Roots are matched with each other regardless of their ids."""
+    old_nodes = {_key(node): node for node in preorder(old)}
+    new_nodes = {_key(node): node for node in preorder(new)}
+    old_nodes[_key(new)] = old
+
+    diff = TreeDiff(new_root=new)
+    for node in preorder(new):
+        if node is new:
+            if node.name != old.name:
+                diff.renamed.append((old, node))
+            continue
+        old_node = old_nodes.get(_key(node))
+        if old_node is None:
+            diff.added.append(node)
+            continue
+        if _parent_key(old_node, old, new) != _key(node.parent):
+            diff.moved.append((old_node, node))
+        if old_node.name != node.name:
+            diff.renamed.append((old_node, node))
+    diff.removed = [
+        node
+        for key, node in old_nodes.items()
+        if node is not old and key not in new_nodes
+    ]
+    return diff
+
+
+def _parent_key(node: Node, old_root: Category, new_root: Category) -> NodeKey:
+    return _key(new_root) if node.parent is old_root else _key(node.parent)
+
+
+def apply_diff(tree: LabelableCategory, diff: TreeDiff) -> Set[Category]:
+    """
+    Applies differences to the old tree they were computed from.
+
+    Returns categories whose subtrees changed: parents of added, removed and moved
+    nodes, both old and new ones, and renamed categories.
+    """
+    nodes = {_key(node): node for node in preorder(tree)}
+    nodes[_key(diff.new_root)] = tree
+    affected = set()
+
+    for node in diff.added:
+        parent = nodes[_key(node.parent)]
+        if isinstance(node, Product):
+            added = LabelableProduct(
+                node.name, id=node.id, category=parent, **node.attrs
+            )
+        else:
+            added = LabelableCategory(node.name, id=node.id, parent=parent)
+        nodes[_key(node)] = added
+        affected.add(parent)
+
+    # Detach all moved nodes first, so that no node is attached under its own
+    # descendant, e.g. when two categories swap places
+    for node, _ in diff.moved:
+        affected.add(node.parent)
+        node.parent = None
+    for node, new_node in diff.moved:
+        node.parent = nodes[_key(new_node.parent)]
+        affected.add(node.parent)
+
+    for node in diff.removed:
+        if node.parent is not None:
+            affected.add(node.parent)
+            node.parent = None
+
+    for node, new_node in diff.renamed:
+        node.name = new_node.name
+        if isinstance(node, Category):
+            affected.add(node)
+
+    # Some of them might have been removed
+    return {category for category in affected if category.root is tree}
@@ -0,0 +1,34 @@
+import gzip
+import io
+import os
+from typing import IO, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_SUFFIX = ".gz"
+ZSTD_SUFFIX = ".zst"
+
+
+def open_compressed(path: Union[str, os.PathLike], mode: str = "rt") -> IO[str]:
+    """
+    Opens a text file, compressed with gzip or zstd if its name ends with
+    .gz or .zst. Zstd needs the optional zstandard package.
+    """
+    assert mode in ("rt", "wt")
+    path = os.fspath(path)
+    if path.endswith(GZIP_SUFFIX):
+        return gzip.open(path, mode, encoding="utf-8")
+    if path.endswith(ZSTD_SUFFIX):
+        if zstandard is None:
+            raise ImportError(
+                f"Install zstandard (pip install zstandard) to use {ZSTD_SUFFIX} files"
+            )
+        if mode == "rt":
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"))
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(open(path, "wb"))
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode[0], encoding="utf-8")
@@ -0,0 +1,48 @@
+"""
+On-disk tree formats, recognized by file suffixes.
+
+A tree is either one nested YAML document (.yaml) or JSON Lines with a node per
+line (.jsonl). Either may be compressed with gzip (.gz) or zstd (.zst).
+"""
+from typing import Callable, Optional
+
+from tree_labeller.core.files import GZIP_SUFFIX, ZSTD_SUFFIX
+from tree_labeller.core.types import Category
+from tree_labeller.exporters import jsonl as jsonl_exporter
+from tree_labeller.exporters import yaml as yaml_exporter
+from tree_labeller.parsers.jsonl import JsonlTreeParser
+from tree_labeller.parsers.treeparser import TreeParser
+from tree_labeller.parsers.yaml import YamlTreeParser
+
+YAML_FORMAT = ".yaml"
+JSONL_FORMAT = ".jsonl"
+
+TREE_PARSERS = {
+    YAML_FORMAT: YamlTreeParser,
+    JSONL_FORMAT: JsonlTreeParser,
+}
+TREE_EXPORTERS = {
+    YAML_FORMAT: yaml_exporter.export_tree,
+    JSONL_FORMAT: jsonl_exporter.export_tree,
+}
+
+
+def tree_format(path: str) -> str:
+    """Returns the suffix of a format, ignoring a compression suffix."""
+    for suffix in (GZIP_SUFFIX, ZSTD_SUFFIX):
+        if path.endswith(suffix):
+            path = path[: -len(suffix)]
+    for format in TREE_PARSERS:
+        if path.endswith(format):
+            return format
+    raise ValueError(
+        f"Unknown tree format of {path}, expected one of {list(TREE_PARSERS)}"
+    )
+
+
+def get_tree_parser(path: str, skip_empty_categories: bool = False) -> TreeParser:
+    return TREE_PARSERS[tree_format(path)](skip_empty_categories=skip_empty_categories)
+
+
+def get_tree_exporter(path: str) -> Callable[[Category, Optional[str]], None]:
+    return TREE_EXPORTERS[tree_format(path)]
@@ -1,54 +1,337 @@
-from anytree import PreOrderIter
+import logging
+import os
+import pickle
+from typing import Callable, Dict, Iterable, List, Optional, Set
 
-from tree_labeller.core.types import LabelableCategory, LabelableProduct
-from tree_labeller.tree.coloring import (
-    ColorableNode,
-    color_tree,
-    select_subtree_requiring_verification,
+from tree_labeller.core.types import (
+    Label,
+    LabelableCategory,
+    LabelableProduct,
+    LabelRegistry,
+    ProductId,
+    is_single_label,
 )
+from tree_labeller.tree.coloring import color_compact_tree
+from tree_labeller.tree.compact import NO_NODE, CompactTree
 from tree_labeller.tree.selectors import select_top_down
-from tree_labeller.tree.utils import internals
-
-
-def _to_colorable_tree(tree):
-    mapping = {}
-    for node in PreOrderIter(tree):
-        if node.labels.to_skip:
-            continue
-        new_parent = mapping.get(node.parent)
-        new_node = ColorableNode(
-            node,
-            parent=new_parent,
-            colors={node.labels.manual} if node.labels.manual else set(),
-        )
-        mapping[node] = new_node
-    return mapping[tree]
+from tree_labeller.tree.utils import internals, preorder
+
+PREDICTOR_STATE_FILE = "predictor.state"
+PREDICTOR_STATE_VERSION = 1
+
+
+def _to_compact_tree(tree: LabelableCategory) -> CompactTree:
+    return CompactTree.from_root(tree, exclude=lambda node: node.labels.to_skip)
+
 
+Sampler = Callable[[CompactTree, int], Set[LabelableProduct]]
 
-sampler = select_top_down  # select_distant_leaves
+# See SAMPLERS for other options
+default_sampler: Sampler = select_top_down
 
 
-def predict(tree: LabelableCategory, n_sample: int):
+def predict(
+    tree: LabelableCategory,
+    n_sample: int,
+    registry: Optional[LabelRegistry] = None,
+    sampler: Optional[Sampler] = None,
+):
+    """
+    Colors the whole tree and selects a sample of products to verify.
+    """
     assert all(isinstance(leaf, LabelableProduct) for leaf in tree.leaves)
     assert all(isinstance(internal, LabelableCategory) for internal in internals(tree))
-    assert all(node.labels.predicted is None for node in PreOrderIter(tree))
+    assert all(node.labels.predicted_mask is None for node in preorder(tree))
     assert all(category.labels.manual is None for category in internals(tree))
 
-    colorable_tree = _to_colorable_tree(tree)
-    if any(leaf.labels.manual for leaf in tree.leaves):
-        color_tree(colorable_tree)
-        for node in PreOrderIter(colorable_tree):
-            node.target.labels.predicted = node.colors
+    if registry is None:
+        registry = LabelRegistry()
+    compact_tree = _to_compact_tree(tree)
+    masks = [
+        registry.bit(node.labels.manual) if node.labels.manual else 0
+        for node in compact_tree.nodes
+    ]
+    if any(masks[leaf] for leaf in compact_tree.leaves()):
+        color_compact_tree(compact_tree, masks)
+        for node, mask in zip(compact_tree.nodes, masks):
+            node.labels.set_predicted_mask(mask, registry)
 
-        good_leaves = [leaf for leaf in colorable_tree.leaves if len(leaf.colors) == 1]
-        for leaf in good_leaves:
-            leaf.target.labels.predicted = leaf.colors
-
-    requires_verification = select_subtree_requiring_verification(colorable_tree)
+    requires_verification = compact_tree.subset(lambda i: not is_single_label(masks[i]))
     if requires_verification:
-        sampled_requires_verification = sampler(requires_verification, n_sample)
-        sampled_requires_verification = [
-            node.target.target for node in sampled_requires_verification
-        ]
-        for leaf in sampled_requires_verification:
+        for leaf in (sampler or default_sampler)(requires_verification, n_sample):
+            leaf.labels.selected = True
+
+
+class IncrementalPredictor:
+    """
+    Predicts labels keeping the colored tree between calls.
+
+    The first call colors the whole tree like predict(). On the following calls
+    only leaves whose manual label changed are recolored: masks are updated on
+    their ancestors and pushed down to subtrees inheriting colors from them.
+    Results are the same as of predict() run on a freshly loaded tree.
+
+    Recoloring depends on the number of changed labels when their products are
+    passed as changed, otherwise all leaves are compared with their previous
+    labels. Selecting a sample still goes over the whole tree on every call.
+
+    Skipping a product removes it from the colored tree, so a change of skipped
+    products, as well as any change of the tree structure, recolors the tree
+    from scratch.
+
+    Every run of the label command is a new process, so the colored tree is
+    saved with save_state() and restored with load_state() for the same tree
+    file. Labels changed since then are found by comparing all leaves, which
+    is cheaper than coloring them.
+    """
+
+    def __init__(self, registry: Optional[LabelRegistry] = None):
+        self.registry = registry if registry is not None else LabelRegistry()
+        self.tree: Optional[LabelableCategory] = None
+        self.compact_tree: Optional[CompactTree] = None
+        self.generation = None
+        self._manual: List[Optional[Label]] = []
+        # Numbers of colored leaves by ids of their products
+        self._leaf_index: Dict[int, int] = {}
+        self._up: List[int] = []
+        self._masks: List[int] = []
+        self._n_colored = 0
+        self._skipped: List[LabelableProduct] = []
+        self._selected: List[LabelableProduct] = []
+
+    def __call__(
+        self,
+        tree: LabelableCategory,
+        n_sample: int,
+        sampler: Optional[Sampler] = None,
+        changed: Optional[Iterable[ProductId]] = None,
+        within: Optional[Iterable[LabelableCategory]] = None,
+    ):
+        """
+        :param changed: ids of products whose manual labels changed since the last
+                        call, by default all leaves are checked for changes
+        :param within: categories whose subtrees the sample is selected from, by
+                       default the whole tree
+        """
+        changed = self._changed_leaves(tree, changed)
+        if changed is None:
+            self._color(tree)
+        elif changed:
+            self._recolor(changed)
+
+        for leaf in self._selected:
+            leaf.labels.selected = False
+        in_scope = self._scope(within) if within is not None else None
+        requires_verification = self.compact_tree.subset(
+            lambda i: not is_single_label(self._masks[i])
+            and (in_scope is None or in_scope[i])
+        )
+        self._selected = (
+            (sampler or default_sampler)(requires_verification, n_sample)
+            if requires_verification
+            else []
+        )
+        for leaf in self._selected:
             leaf.labels.selected = True
+
+    def save_state(self, path: str, digest: str):
+        """Saves the colored tree, digest identifies the file the tree was loaded from."""
+        state = {
+            "version": PREDICTOR_STATE_VERSION,
+            "digest": digest,
+            "labels": [self.registry.label(1 << i) for i in range(len(self.registry))],
+            "skipped": [node.id for node in self._skipped],
+            "manual": self._manual,
+            "up": self._up,
+            "masks": self._masks,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load_state(self, tree: LabelableCategory, path: str, digest: str) -> bool:
+        """
+        Restores the colored tree saved for the same tree file, returns False if
+        there is none. Manual labels of the tree may differ from the saved ones,
+        changed leaves are recolored by the next call.
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as ex:
+            logging.warning(f"Ignoring unreadable predictor state {path}: {ex}")
+            return False
+        if (
+            state.get("version") != PREDICTOR_STATE_VERSION
+            or state.get("digest") != digest
+        ):
+            return False
+        # Masks are only valid with the same bits of labels
+        if any(
+            self.registry.bit(label) != 1 << i
+            for i, label in enumerate(state["labels"])
+        ):
+            return False
+        try:
+            skipped = [tree.get_product(product_id) for product_id in state["skipped"]]
+        except KeyError:
+            return False
+        skipped_ids = {id(node) for node in skipped}
+        compact_tree = CompactTree.from_root(
+            tree, exclude=lambda node: id(node) in skipped_ids
+        )
+        if len(compact_tree) != len(state["masks"]):
+            return False
+
+        self._skipped = skipped
+        self._manual = state["manual"]
+        self._up = state["up"]
+        self._masks = state["masks"]
+        self._n_colored = sum(1 for manual in self._manual if manual)
+        self._leaf_index = {id(compact_tree.nodes[i]): i for i in compact_tree.leaves()}
+        if self._n_colored:
+            for node, mask in zip(compact_tree.nodes, self._masks):
+                node.labels.set_predicted_mask(mask, self.registry)
+        self.tree = tree
+        self.compact_tree = compact_tree
+        self.generation = tree.generation
+        self._selected = []
+        logging.info(f"Loaded predictor state from {path}.")
+        return True
+
+    def _changed_leaves(
+        self, tree: LabelableCategory, product_ids: Optional[Iterable[ProductId]]
+    ) -> Optional[List[int]]:
+        """Returns leaves with changed manual labels or None if a full run is needed."""
+        if tree is not self.tree or tree.generation != self.generation:
+            return None
+        if product_ids is None:
+            if any(not node.labels.to_skip for node in self._skipped):
+                return None
+            leaves = self.compact_tree.leaves()
+        else:
+            leaves = []
+            for product_id in product_ids:
+                i = self._leaf_index.get(id(tree.get_product(product_id)))
+                if i is None:
+                    # A skipped product
+                    return None
+                leaves.append(i)
+        changed = []
+        for i in leaves:
+            labels = self.compact_tree.nodes[i].labels
+            if labels.manual != self._manual[i]:
+                if labels.to_skip:
+                    return None
+                changed.append(i)
+        return changed
+
+    def _color(self, tree: LabelableCategory):
+        self._skipped = []
+        for node in preorder(tree):
+            node.labels.predicted_mask = None
+            node.labels.selected = False
+            if node.labels.to_skip:
+                self._skipped.append(node)
+
+        compact_tree = _to_compact_tree(tree)
+        self._manual = [node.labels.manual for node in compact_tree.nodes]
+        self._leaf_index = {id(compact_tree.nodes[i]): i for i in compact_tree.leaves()}
+        self._masks = self._leaf_masks()
+        self._n_colored = sum(1 for mask in self._masks if mask)
+        if self._n_colored:
+            color_compact_tree(compact_tree, self._masks)
+            for node, mask in zip(compact_tree.nodes, self._masks):
+                node.labels.set_predicted_mask(mask, self.registry)
+
+        self._up = self._leaf_masks()
+        parent = compact_tree.parent
+        for i in range(len(compact_tree) - 1, 0, -1):
+            if self._up[i]:
+                self._up[parent[i]] |= self._up[i]
+
+        self.tree = tree
+        self.compact_tree = compact_tree
+        self.generation = tree.generation
+        self._selected = []
+
+    def _recolor(self, changed: List[int]):
+        tree, up, masks = self.compact_tree, self._up, self._masks
+        was_colored = self._n_colored > 0
+
+        # Update colors merged from leaves up to the first unchanged ancestor
+        dirty = set()
+        for leaf in changed:
+            manual = tree.nodes[leaf].labels.manual
+            mask = self._to_mask(manual)
+            self._n_colored += bool(mask) - bool(up[leaf])
+            self._manual[leaf] = manual
+            up[leaf] = mask
+            dirty.add(leaf)
+            i = tree.parent[leaf]
+            while i != NO_NODE:
+                mask = 0
+                for child in tree.children(i):
+                    mask |= up[child]
+                if mask == up[i]:
+                    break
+                up[i] = mask
+                dirty.add(i)
+                i = tree.parent[i]
+
+        if not self._n_colored:
+            for node in tree.nodes:
+                node.labels.predicted_mask = None
+            masks[:] = [0] * len(tree)
+            return
+        if not was_colored:
+            masks[:] = self._leaf_masks()
+            color_compact_tree(tree, masks)
+            for node, mask in zip(tree.nodes, masks):
+                node.labels.set_predicted_mask(mask, self.registry)
+            return
+
+        # Parents are numbered before children, so parents are final when
+        # their children are visited
+        for i in sorted(dirty):
+            mask = up[i] or (masks[tree.parent[i]] if i else 0)
+            if mask == masks[i]:
+                continue
+            masks[i] = mask
+            tree.nodes[i].labels.set_predicted_mask(mask, self.registry)
+            # Uncolored subtrees inherit colors from their roots
+            stack = [child for child in tree.children(i) if not up[child]]
+            while stack:
+                j = stack.pop()
+                masks[j] = mask
+                tree.nodes[j].labels.set_predicted_mask(mask, self.registry)
+                stack.extend(tree.children(j))
+
+    def _scope(self, categories: Iterable[LabelableCategory]) -> List[bool]:
+        """Marks subtrees of given categories and their ancestors connecting them to the root."""
+        tree = self.compact_tree
+        index = {id(node): i for i, node in enumerate(tree.nodes)}
+        inside = [False] * len(tree)
+        for category in categories:
+            i = index.get(id(category))
+            if i is not None:
+                inside[i] = True
+        in_scope = list(inside)
+        for i in range(1, len(tree)):
+            if inside[tree.parent[i]]:
+                inside[i] = in_scope[i] = True
+            elif inside[i]:
+                j = tree.parent[i]
+                while j != NO_NODE and not in_scope[j]:
+                    in_scope[j] = True
+                    j = tree.parent[j]
+        return in_scope
+
+    def _leaf_masks(self) -> List[int]:
+        return [self._to_mask(manual) for manual in self._manual]
+
+    def _to_mask(self, manual: Optional[Label]) -> int:
+        return self.registry.bit(manual) if manual else 0
@@ -27,14 +27,14 @@ class ProgressTracker:
 
     def _save_iteration_stats(self, path: str):
         with open(path, "w") as f:
-            json.dump(self.task.iteration_stats, f, indent=2, cls=_CustomEncoder)
+            json.dump(self.task.stats.iteration_stats, f, indent=2, cls=_CustomEncoder)
         logging.info(f"Saved stats to {path}.")
 
     def _add_iteration_stats(self, path: str):
         iteration_stats = {
             "start_time": self.task.config.start_time.isoformat(),
             "iteration": self.task.state.iteration,
-            "stats": self.task.iteration_stats,
+            "stats": self.task.stats.iteration_stats,
         }
         encoder = _CustomEncoder()
         with jsonlines.open(path, "a", dumps=encoder.encode) as writer:
@@ -0,0 +1,120 @@
+"""
+Binary snapshots of a parsed and pruned tree.
+
+Parsing a large tree is slow, so the first parse is dumped to a compact
+snapshot in the task directory and later runs load it instead. A snapshot
+stores nodes in pre-order as flat columns (parent index, name, id, attributes)
+and remembers the digest of the source file, so it is ignored once the
+source file changes.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from array import array
+from typing import Optional, Type
+
+from tree_labeller.core.formats import get_tree_parser
+from tree_labeller.core.types import (
+    Category,
+    LabelableCategory,
+    LabelableProduct,
+    Product,
+)
+from tree_labeller.tree.utils import preorder
+
+SNAPSHOT_FILE = "tree.snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_tree(tree_path: str) -> LabelableCategory:
+    # Categories without products are not even attached to the tree
+    parser = get_tree_parser(tree_path, skip_empty_categories=True)
+    return parser.parse_tree(tree_path)
+
+
+def save_snapshot(tree: LabelableCategory, path: str, digest: str):
+    index = {}
+    parents = array("l")
+    names = []
+    ids = []
+    attrs = []
+    for i, node in enumerate(preorder(tree)):
+        index[id(node)] = i
+        parents.append(index[id(node.parent)] if node.parent is not None else -1)
+        names.append(node.name)
+        ids.append(node.id)
+        attrs.append(dict(node.attrs) if isinstance(node, Product) else None)
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "digest": digest,
+        "parents": parents,
+        "names": names,
+        "ids": ids,
+        "attrs": attrs,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    logging.info(f"Saved tree snapshot to {path}.")
+
+
+def load_snapshot(
+    path: str,
+    digest: str,
+    category_type: Type[Category] = LabelableCategory,
+    product_type: Type[Product] = LabelableProduct,
+) -> Optional[Category]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ValueError) as ex:
+        logging.warning(f"Ignoring unreadable tree snapshot {path}: {ex}")
+        return None
+    if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("digest") != digest:
+        logging.info(f"Tree snapshot {path} is outdated.")
+        return None
+
+    nodes = []
+    for parent, name, id, attrs in zip(
+        snapshot["parents"], snapshot["names"], snapshot["ids"], snapshot["attrs"]
+    ):
+        parent = nodes[parent] if parent >= 0 else None
+        if attrs is None:
+            node = category_type(name, id=id, parent=parent)
+        else:
+            node = product_type(name, id=id, category=parent, **attrs)
+        nodes.append(node)
+    logging.info(f"Loaded tree snapshot from {path}.")
+    return nodes[0] if nodes else None
+
+
+def build_snapshot(tree_path: str, path: str) -> LabelableCategory:
+    tree = parse_tree(tree_path)
+    save_snapshot(tree, path, file_digest(tree_path))
+    return tree
+
+
+def load_tree(
+    tree_path: str, snapshot_path: str, digest: Optional[str] = None
+) -> LabelableCategory:
+    """Loads a pruned tree from a snapshot, falling back to parsing tree_path."""
+    if digest is None:
+        digest = file_digest(tree_path)
+    tree = load_snapshot(snapshot_path, digest)
+    if tree is None:
+        tree = parse_tree(tree_path)
+        save_snapshot(tree, snapshot_path, digest)
+    return tree
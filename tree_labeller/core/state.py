@@ -3,54 +3,69 @@ import glob
 import logging
 import os
 import re
-from typing import Set, Dict, Iterable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 
 from tree_labeller.core.types import (
     Label,
     ProductId,
     LabelableCategory,
+    Category,
     Product,
-    LabelableMixin,
 )
-from tree_labeller.core.utils import remove_leaf_categories_without_product
-from tree_labeller.parsers.yaml import YamlTreeParser
+from tree_labeller.core.columnar import (
+    is_columnar,
+    read_columns,
+    write_columns,
+)
+from tree_labeller.core.snapshot import SNAPSHOT_FILE, file_digest, load_tree
+from tree_labeller.tree.compact import CompactTree
+
+
+# Files with labels, in either format
+LABELS_FILE_PATTERN = re.compile(r"(?P<iteration>\d+)-(to-verify|good)\.(tsv|parquet)$")
 
 
 def _parse_path(path: str) -> int:
     fname = os.path.basename(path)
-    m = re.match(
-        r"(?P<iteration>\d+)-(to-verify|good).tsv",
-        fname,
-    )
+    m = LABELS_FILE_PATTERN.match(fname)
     assert m is not None
     path_parts = m.groupdict()
     iteration = int(path_parts["iteration"])
     return iteration
 
 
+def _read_rows(path: str) -> Iterable[Dict[str, Any]]:
+    if is_columnar(path):
+        columns = read_columns(path, ["id", "label"])
+        for product_id, label in zip(columns["id"], columns["label"]):
+            yield {"id": product_id, "label": label or ""}
+        return
+    with open(path) as f:
+        yield from csv.DictReader(f, delimiter="\t")
+
+
 def _load_labels(tsv_path: str, allowed_labels: Set[Label]) -> Dict[ProductId, Label]:
+    """Loads labels from a TSV file, or a columnar one ending with .parquet."""
     missing = 0
     selected = 0
     ambiguous = 0
-    with open(tsv_path) as f:
-        rows = csv.DictReader(f, delimiter="\t")
-        labels = {}
-        for row in rows:
-            selected += 1
-            product_id = row["id"]
-            label = row["label"].strip()
-            if not label:
-                missing += 1
-                continue
-            label_candidates = set(label.split("|"))
-            unknown_labels = label_candidates - allowed_labels
-            assert (
-                not unknown_labels
-            ), f"Unknown label(s) {unknown_labels}, expected one of: {allowed_labels}"
-            if len(label_candidates) > 1:
-                ambiguous += 1
-                continue
-            labels[product_id] = next(iter(label_candidates))
+    labels = {}
+    for row in _read_rows(tsv_path):
+        selected += 1
+        product_id = row["id"]
+        label = row["label"].strip()
+        if not label:
+            missing += 1
+            continue
+        label_candidates = set(label.split("|"))
+        unknown_labels = label_candidates - allowed_labels
+        assert (
+            not unknown_labels
+        ), f"Unknown label(s) {unknown_labels}, expected one of: {allowed_labels}"
+        if len(label_candidates) > 1:
+            ambiguous += 1
+            continue
+        labels[product_id] = next(iter(label_candidates))
 
     logging.info(f"Loaded manual labels from {tsv_path}.")
 
@@ -69,46 +84,85 @@ def _load_labels(tsv_path: str, allowed_labels: Set[Label]) -> Dict[ProductId, L
     return labels
 
 
-def _update_tree(tree: LabelableCategory, labels: Set[Label]):
-    products_by_id = {product.id: product for product in tree.leaves}
+def _update_tree(
+    tree: LabelableCategory, labels: Dict[ProductId, Label]
+) -> Set[ProductId]:
+    """Sets manual labels, returns ids of products whose labels changed."""
+    changed = set()
+    missing = 0
     for product_id, label in labels.items():
-        product = products_by_id[product_id]
-        product.labels.manual = label
+        try:
+            product = tree.get_product(product_id)
+        except KeyError:
+            # The product might have been removed from the tree by an update
+            missing += 1
+            continue
+        if product.labels.manual != label:
+            product.labels.manual = label
+            changed.add(product.id)
+    if missing:
+        logging.warning(f"Ignored labels of {missing} products missing in the tree.")
+    return changed
 
 
 class LabelingState:
     tree: LabelableCategory
     iteration: int
 
-    def __init__(self, tree: LabelableCategory, iteration: int):
+    def __init__(
+        self, tree: LabelableCategory, iteration: int, digest: Optional[str] = None
+    ):
         self.tree = tree
         self.iteration = iteration
-        self._categories_by_id = {
-            int(category.id): category for category in self.tree.categories
-        }
-        self._products_by_id = {
-            int(product.id): product for product in self.tree.products
-        }
+        # Digest of the file the tree was loaded from
+        self.digest = digest
+        # Products with manual labels changed since the last prediction, None
+        # if not known, e.g. labels were loaded into a fresh tree
+        self.changed_products: Optional[Set[ProductId]] = set()
+
+    @property
+    def compact_tree(self) -> CompactTree:
+        return self.tree.compact_tree
+
+    @property
+    def products(self) -> List[Product]:
+        return self.tree.products
+
+    @property
+    def categories(self) -> List[Category]:
+        return self.tree.categories
 
     @classmethod
     def from_dir(cls, dir: str, tree_path: str, allowed_labels: Set[str]):
-        tree = YamlTreeParser().parse_tree(tree_path)
-        remove_leaf_categories_without_product(tree)
+        digest = file_digest(tree_path)
+        tree = load_tree(tree_path, os.path.join(dir, SNAPSHOT_FILE), digest)
 
-        iteration = 0
-        paths = glob.glob(os.path.join(dir, "*.tsv"))
+        state = LabelingState(tree, 0, digest)
+        paths = [
+            path
+            for path in glob.glob(os.path.join(dir, "*"))
+            if LABELS_FILE_PATTERN.match(os.path.basename(path))
+        ]
         if paths:
             path = max(paths, key=os.path.getctime)
-            labels = _load_labels(path, allowed_labels)
-            _update_tree(tree, labels)
-            iteration = _parse_path(path)
+            state.update_labels(path, allowed_labels)
+        # Labels of the last prediction are not known in a fresh tree
+        state.changed_products = None
+
+        return state
 
-        return LabelingState(tree, iteration)
+    def update_labels(self, tsv_path: str, allowed_labels: Set[str]):
+        """Applies manual labels from a file, predictions can be then updated incrementally."""
+        labels = _load_labels(tsv_path, allowed_labels)
+        changed = _update_tree(self.tree, labels)
+        if self.changed_products is not None:
+            self.changed_products |= changed
+        self.iteration = _parse_path(tsv_path)
 
     def save_to_verify(self, path: str):
         to_verify = [
             product
-            for product in self.tree.products
+            for product in self.products
             if product.labels.selected or product.labels.manual
         ]
         to_verify = sorted(
@@ -119,97 +173,123 @@ class LabelingState:
             ),
         )
 
-        with open(path, "w") as f:
-            writer = csv.DictWriter(
-                f,
-                delimiter="\t",
-                fieldnames=self._get_fieldnames(to_verify),
-            )
-            writer.writeheader()
-
-            for product in to_verify:
-                writer.writerow(
-                    {
-                        "id": product.id,
-                        "name": product.name,
-                        "category": product.category_name,
-                        "label": "|".join(sorted(product.labels.to_verify)),
-                        **product.attrs,
-                    }
-                )
+        self._save_products(
+            to_verify, lambda product: "|".join(sorted(product.labels.to_verify)), path
+        )
 
     def save_mapping(self, path: str):
+        """Saves the mapping to a TSV file, or a columnar one ending with .parquet."""
+        fieldnames = ["label", "category", "id"]
+        mapping = self.to_mapping()
+        if is_columnar(path):
+            columns = {name: [row[name] for row in mapping] for name in fieldnames}
+            write_columns(columns, path)
+            return
 
         with open(path, "w") as f:
             writer = csv.DictWriter(
                 f,
                 delimiter="\t",
-                fieldnames=["label", "category", "id"],
+                fieldnames=fieldnames,
             )
             writer.writeheader()
 
-            for category_mapping in self.to_mapping():
+            for category_mapping in mapping:
                 writer.writerow(category_mapping)
 
     def to_mapping(self):
-        def check_children(node: LabelableMixin):
-            if isinstance(node, Product):
-                return
-            if node.labels.is_good:
-                yield node
-                return
-            for child in node.children:
-                yield from check_children(child)
-
-        root_categories = check_children(self.tree)
+        tree = self.compact_tree
+        index = self.tree.tree_index
+        # Topmost categories with good labels, a category is skipped when its
+        # ancestor is already mapped. Pre-order keeps ancestors first.
+        root_categories = []
+        for i, node in enumerate(tree.nodes):
+            if not isinstance(node, Category) or not node.labels.is_good:
+                continue
+            if root_categories and index.is_ancestor(root_categories[-1], i):
+                continue
+            root_categories.append(i)
+
         root_categories = sorted(
             root_categories,
-            key=lambda category: (
-                category.labels.good_label,
-                category.depth,
-                category.id,
+            key=lambda i: (
+                tree.nodes[i].labels.good_label,
+                index.depth[i],
+                tree.nodes[i].id,
             ),
         )
         mapping = [
             {
-                "id": category.id,
-                "category": category.long_name,
-                "label": category.labels.good_label,
+                "id": tree.nodes[i].id,
+                "category": tree.nodes[i].long_name,
+                "label": tree.nodes[i].labels.good_label,
             }
-            for category in root_categories
+            for i in root_categories
         ]
         return mapping
 
     def save_good_predicted_labels(self, path: str):
         products_with_good_labels = [
-            product for product in self.tree.products if product.labels.is_good
+            product for product in self.products if product.labels.is_good
         ]
+        self._save_products(
+            products_with_good_labels, lambda product: product.labels.good_label, path
+        )
+
+    def _save_products(
+        self,
+        products: List[Product],
+        get_label: Callable[[Product], str],
+        path: str,
+    ):
+        """Saves products to a TSV file, or a columnar one ending with .parquet."""
+        if is_columnar(path):
+            write_columns(self._product_columns(products, get_label), path)
+            return
+
         with open(path, "w") as f:
             writer = csv.DictWriter(
                 f,
                 delimiter="\t",
-                fieldnames=self._get_fieldnames(products_with_good_labels),
+                fieldnames=self._get_fieldnames(),
             )
             writer.writeheader()
-            for product in products_with_good_labels:
+            for product in products:
                 writer.writerow(
                     {
                         "id": product.id,
                         "name": product.name,
                         "category": product.category_name,
-                        "label": product.labels.good_label,
+                        "label": get_label(product),
                         **product.attrs,
                     }
                 )
 
-    def _get_fieldnames(self, products: Iterable[Product]):
-        attr_names = set(
-            attr_name for product in products for attr_name in product.attrs.keys()
-        )
+    def _product_columns(
+        self, products: List[Product], get_label: Callable[[Product], str]
+    ) -> Dict[str, List[Any]]:
+        columns = {}
+        for name in self._get_fieldnames():
+            if name == "id":
+                column = [product.id for product in products]
+            elif name == "name":
+                column = [product.name for product in products]
+            elif name == "category":
+                column = [product.category_name for product in products]
+            elif name == "label":
+                column = [get_label(product) for product in products]
+            else:
+                column = [product.attrs.get(name) for product in products]
+            columns[name] = column
+        return columns
+
+    def _get_fieldnames(self):
+        # Attribute names of all products are known to the tree's attribute store
+        attr_names = self.tree.attribute_store.names
         return ["id", "name", *sorted(attr_names), "category", "label"]
 
     def get_category(self, category_id: int):
-        return self._categories_by_id[int(category_id)]
+        return self.tree.get_category(category_id)
 
     def get_product(self, product_id: int):
-        return self._products_by_id[int(product_id)]
+        return self.tree.get_product(product_id)
@@ -0,0 +1,190 @@
+from collections import Counter
+from typing import Dict, Set
+
+from tree_labeller.core.types import Category, Label, Product
+from tree_labeller.tree.compact import CompactTree
+
+
+def _histogram(counter: Counter, labels: Set[Label]) -> Dict[Label, int]:
+    for label in labels:
+        if label not in counter:
+            counter[label] = 0
+    return {label: n_products for label, n_products in counter.most_common()}
+
+
+class LabelStats:
+    """
+    Labelling statistics computed in a single pass over a tree.
+
+    Statistics are a snapshot, use is_current() to check if labels or
+    the tree changed since they were computed.
+    """
+
+    def __init__(
+        self,
+        tree: CompactTree,
+        allowed_labels: Set[Label],
+        allowed_provided_labels: Set[Label],
+    ):
+        self.tree = tree
+        self.allowed_labels = allowed_labels
+        self.allowed_provided_labels = allowed_provided_labels
+
+        self.n_products = 0
+        self.n_categories = 0
+        self.n_manual_labels = 0
+        self.n_good_labels = 0
+        self.n_ambiguous_labels = 0
+        self.n_missing_labels = 0
+        self.n_to_reject_labels = 0
+        self.n_to_skip_labels = 0
+        self.n_requires_verification_labels = 0
+        self.n_requires_verification_missing_labels = 0
+        self.n_requires_verification_ambiguous_labels = 0
+        self.n_selected_for_verification_labels = 0
+        self.n_selected_for_verification_missing_labels = 0
+        self.n_selected_for_verification_ambiguous_labels = 0
+        n_categories_per_depth = Counter()
+        manual_labels = Counter()
+        # Predicted labels are counted as masks and decoded once per distinct mask
+        good_masks = Counter()
+        ambiguous_masks = Counter()
+        registries = set()
+
+        for i, node in enumerate(tree.nodes):
+            if isinstance(node, Category):
+                self.n_categories += 1
+                n_categories_per_depth[tree.depth[i]] += 1
+            if not isinstance(node, Product) or not tree.is_leaf(i):
+                continue
+
+            self.n_products += 1
+            labels = node.labels
+            registries.add(labels.registry)
+            if labels.manual is not None:
+                manual_labels[labels.manual] += 1
+                if labels.manual:
+                    self.n_manual_labels += 1
+                self.n_to_reject_labels += labels.to_reject
+                self.n_to_skip_labels += labels.to_skip
+
+            if labels.is_good:
+                self.n_good_labels += 1
+                good_masks[labels.registry, labels.predicted_mask] += 1
+                requires_verification = False
+            elif labels.is_ambiguous:
+                self.n_ambiguous_labels += 1
+                ambiguous_masks[labels.registry, labels.predicted_mask] += 1
+                self.n_requires_verification_ambiguous_labels += 1
+                self.n_selected_for_verification_ambiguous_labels += labels.selected
+                requires_verification = True
+            else:
+                self.n_missing_labels += 1
+                self.n_requires_verification_missing_labels += 1
+                self.n_selected_for_verification_missing_labels += labels.selected
+                requires_verification = True
+
+            self.n_requires_verification_labels += requires_verification
+            self.n_selected_for_verification_labels += labels.selected
+
+        good_labels = Counter()
+        for (registry, mask), n_products in good_masks.items():
+            good_labels[registry.label(mask)] += n_products
+        ambiguous_labels = Counter()
+        for (registry, mask), n_products in ambiguous_masks.items():
+            for label in registry.labels(mask):
+                ambiguous_labels[label] += n_products
+
+        self.n_categories_per_depth = {
+            depth: n_categories
+            for depth, n_categories in n_categories_per_depth.most_common()
+        }
+        self.n_unique_good_labels = len(good_labels)
+        self.allowed_labels_used = set(manual_labels) & allowed_labels
+        self.allowed_provided_labels_used = set(manual_labels) & allowed_provided_labels
+        self.n_products_per_manual_label = _histogram(manual_labels, allowed_labels)
+        self.n_products_per_good_label = _histogram(good_labels, allowed_labels)
+        self.n_products_per_ambiguous_label = _histogram(
+            ambiguous_labels, allowed_labels
+        )
+        # Labels changes are tracked by registries they use
+        self.generations = [(registry, registry.generation) for registry in registries]
+
+    def is_current(self, tree: CompactTree) -> bool:
+        return self.tree is tree and all(
+            registry.generation == generation
+            for registry, generation in self.generations
+        )
+
+    @property
+    def n_allowed_labels(self):
+        return len(self.allowed_labels) if self.allowed_labels else None
+
+    @property
+    def n_allowed_provided_labels(self):
+        return (
+            len(self.allowed_provided_labels) if self.allowed_provided_labels else None
+        )
+
+    @property
+    def allowed_labels_not_used(self) -> Set[Label]:
+        return self.allowed_labels - self.allowed_labels_used
+
+    @property
+    def allowed_provided_labels_not_used(self) -> Set[Label]:
+        return self.allowed_provided_labels - self.allowed_provided_labels_used
+
+    @property
+    def tree_stats(self):
+        return {
+            "n_products": self.n_products,
+            "n_categories": self.n_categories,
+            "n_categories_per_depth": self.n_categories_per_depth,
+        }
+
+    @property
+    def manual_labels_stats(self):
+        return {
+            "n_manual_labels": self.n_manual_labels,
+            "n_allowed_labels_used": len(self.allowed_labels_used),
+            "allowed_labels_not_used": self.allowed_labels_not_used,
+            "n_allowed_labels": self.n_allowed_labels,
+            "n_products_per_manual_label": self.n_products_per_manual_label,
+        }
+
+    @property
+    def predicted_labels_stats(self):
+        return {
+            "n_good_labels": self.n_good_labels,
+            "n_unique_good_labels": self.n_unique_good_labels,
+            "n_missing_labels": self.n_missing_labels,
+            "n_to_reject_labels": self.n_to_reject_labels,
+            "n_to_skip_labels": self.n_to_skip_labels,
+            "n_ambiguous_labels": self.n_ambiguous_labels,
+            "n_requires_verification_labels": self.n_requires_verification_labels,
+            "n_requires_verification_missing_labels": self.n_requires_verification_missing_labels,
+            "n_requires_verification_ambiguous_labels": self.n_requires_verification_ambiguous_labels,
+            "n_selected_for_verification_labels": self.n_selected_for_verification_labels,
+            "n_selected_for_verification_missing_labels": self.n_selected_for_verification_missing_labels,
+            "n_selected_for_verification_ambiguous_labels": self.n_selected_for_verification_ambiguous_labels,
+        }
+
+    @property
+    def progress(self):
+        return {
+            "manual": self.n_manual_labels,
+            "univocal": self.n_good_labels / self.n_products,
+            "ambiguous": self.n_ambiguous_labels / self.n_products,
+            "missing": self.n_missing_labels / self.n_products,
+            "allowed_labels": len(self.allowed_provided_labels_used)
+            / self.n_allowed_provided_labels,
+        }
+
+    @property
+    def iteration_stats(self):
+        return {
+            "tree": self.tree_stats,
+            "manual_labels": self.manual_labels_stats,
+            "predicted_labels": self.predicted_labels_stats,
+            "progress.py": self.progress,
+        }
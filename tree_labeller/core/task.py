@@ -1,23 +1,26 @@
 import csv
-import itertools
 import logging
 import os.path
 import shutil
-from collections import Counter
 from datetime import datetime
 from typing import Iterable, Set, Optional, List, Callable
 
 import yaml
 
-from tree_labeller.core import predictor
+from tree_labeller.core.predictor import PREDICTOR_STATE_FILE, IncrementalPredictor
+from tree_labeller.core.columnar import PARQUET_SUFFIX
+from tree_labeller.core.snapshot import SNAPSHOT_FILE, build_snapshot
 from tree_labeller.core.state import LabelingState
+from tree_labeller.core.stats import LabelStats
 from tree_labeller.core.types import (
     TO_REJECT_LABEL,
     TO_SKIP_LABEL,
+    Category,
     Label,
-    LabelableCategory,
     LabelableProduct,
+    LabelRegistry,
 )
+from tree_labeller.tree.selectors import SAMPLERS
 
 CONFIGURATION_FILE = "config.yaml"
 
@@ -93,6 +96,7 @@ class LabellingTask:
             allowed_labels=allowed_provided_labels,
         )
         config.to_yaml(os.path.join(dir, CONFIGURATION_FILE))
+        build_snapshot(dest_tree_path, os.path.join(dir, SNAPSHOT_FILE))
         logging.info(f"Created task in: {dir}")
 
         return cls.from_dir(dir)
@@ -125,17 +129,22 @@ class LabellingTask:
         self.config = config
         self.state = state
         self.allowed_labels = allowed_labels
-        self.predictor: Callable[[LabelableCategory, int], None] = predictor.predict
+        self.registry = LabelRegistry(allowed_labels)
+        # Keeps predictions between iterations, also across runs in the task directory
+        self.predictor = IncrementalPredictor(self.registry)
+        self._stats: Optional[LabelStats] = None
 
     @property
     def n_products(self):
-        return self.state.tree.n_products
+        return self.stats.n_products
 
     @property
     def n_categories(self):
-        return self.state.tree.n_categories
+        return self.stats.n_categories
 
-    def try_save_labels_to_verify(self, path: Optional[str] = None) -> Optional[str]:
+    def try_save_labels_to_verify(
+        self, path: Optional[str] = None, columnar: bool = False
+    ) -> Optional[str]:
 
         if self.n_selected_for_verification_labels == 0:
             return None
@@ -146,12 +155,12 @@ class LabellingTask:
                 "tsv",
             )
 
-        self.state.save_to_verify(path)
+        self._save(self.state.save_to_verify, path, columnar)
 
         return path
 
     def try_save_good_predicted_labels(
-        self, path: Optional[str] = None
+        self, path: Optional[str] = None, columnar: bool = False
     ) -> Optional[str]:
 
         if self.n_good_labels == 0:
@@ -163,11 +172,13 @@ class LabellingTask:
                 "tsv",
             )
 
-        self.state.save_good_predicted_labels(path)
+        self._save(self.state.save_good_predicted_labels, path, columnar)
 
         return path
 
-    def try_save_mapping(self, path: Optional[str] = None) -> Optional[str]:
+    def try_save_mapping(
+        self, path: Optional[str] = None, columnar: bool = False
+    ) -> Optional[str]:
 
         if self.n_good_labels == 0:
             return None
@@ -178,10 +189,17 @@ class LabellingTask:
                 "tsv",
             )
 
-        self.state.save_mapping(path)
+        self._save(self.state.save_mapping, path, columnar)
 
         return path
 
+    @staticmethod
+    def _save(save: Callable[[str], None], path: str, columnar: bool):
+        """Saves to a file, and with columnar also to a .parquet file next to it."""
+        save(path)
+        if columnar:
+            save(os.path.splitext(path)[0] + PARQUET_SUFFIX)
+
     def to_path(
         self,
         suffix: str,
@@ -191,244 +209,64 @@ class LabellingTask:
         return os.path.join(self.dir, fname)
 
     @property
-    def tree_stats(self):
-        n_categories_per_depth = Counter(
-            category.depth for category in self.state.tree.categories
-        )
-        n_categories_per_depth = {
-            depth: n_categories
-            for depth, n_categories in n_categories_per_depth.most_common()
-        }
-        return {
-            "n_products": self.state.tree.n_products,
-            "n_categories": self.state.tree.n_categories,
-            "n_categories_per_depth": n_categories_per_depth,
-        }
-
-    @property
-    def manual_labels_stats(self):
-        return {
-            "n_manual_labels": self.n_manual_labels,
-            "n_allowed_labels_used": self.n_allowed_labels_used,
-            "allowed_labels_not_used": self.allowed_labels_not_used,
-            "n_allowed_labels": self.n_allowed_labels,
-            "n_products_per_manual_label": self.n_products_per_manual_label,
-        }
-
-    @property
-    def n_allowed_labels_used(self):
-        return len(self.allowed_labels_used)
-
-    @property
-    def n_allowed_provided_labels_used(self):
-        return len(self.allowed_provided_labels_used)
-
-    @property
-    def allowed_labels_used(self):
-        return set(
-            product.labels.manual
-            for product in self.state.tree.products
-            if product.labels.manual and product.labels.manual in self.allowed_labels
-        )
-
-    @property
-    def allowed_provided_labels_used(self):
-        return set(
-            product.labels.manual
-            for product in self.state.tree.products
-            if product.labels.manual
-            and product.labels.manual in self.config.allowed_provided_labels
-        )
-
-    @property
-    def allowed_labels_not_used(self) -> Set[str]:
-        return self.allowed_labels - self.allowed_labels_used
-
-    @property
-    def allowed_provided_labels_not_used(self) -> Set[str]:
-        return self.config.allowed_provided_labels - self.allowed_provided_labels_used
-
-    @property
-    def n_allowed_labels(self):
-        return len(self.allowed_labels) if self.allowed_labels else None
-
-    @property
-    def n_allowed_provided_labels(self):
-        return (
-            len(self.config.allowed_provided_labels)
-            if self.config.allowed_provided_labels
-            else None
-        )
-
-    @property
-    def n_products_per_manual_label(self):
-        n_products_per_manual_label = Counter(
-            product.labels.manual
-            for product in self.state.tree.products
-            if product.labels.manual is not None
-        )
-        if self.allowed_labels:
-            for label in self.allowed_labels:
-                if label not in n_products_per_manual_label:
-                    n_products_per_manual_label[label] = 0
-        return {
-            label: n_products
-            for label, n_products in n_products_per_manual_label.most_common()
-        }
-
-    @property
-    def n_products_per_ambiguous_label(self):
-        ambiguous_labels = itertools.chain.from_iterable(
-            product.labels.ambiguous
-            for product in self.state.tree.products
-            if product.labels.is_ambiguous
-        )
-
-        n_products_per_ambiguous_label = Counter(ambiguous_labels)
-        if self.allowed_labels:
-            for label in self.allowed_labels:
-                if label not in n_products_per_ambiguous_label:
-                    n_products_per_ambiguous_label[label] = 0
-        return {
-            label: n_products
-            for label, n_products in n_products_per_ambiguous_label.most_common()
-        }
-
-    @property
-    def n_products_per_good_label(self):
-        n_products_per_good_label = Counter(
-            product.labels.good_label
-            for product in self.state.tree.products
-            if product.labels.is_good
-        )
-        if self.allowed_labels:
-            for label in self.allowed_labels:
-                if label not in n_products_per_good_label:
-                    n_products_per_good_label[label] = 0
-        return {
-            label: n_products
-            for label, n_products in n_products_per_good_label.most_common()
-        }
-
-    @property
-    def predicted_labels_stats(self):
-        return {
-            "n_good_labels": self.n_good_labels,
-            "n_unique_good_labels": len(
-                set(
-                    product.labels.good_label
-                    for product in self.state.tree.products
-                    if product.labels.is_good
-                )
-            ),
-            "n_missing_labels": self.n_missing_labels,
-            "n_to_reject_labels": self.n_to_reject_labels,
-            "n_to_skip_labels": self.n_to_skip_labels,
-            "n_ambiguous_labels": self.n_ambiguous_labels,
-            "n_requires_verification_labels": self.n_requires_verification_labels,
-            "n_requires_verification_missing_labels": self.n_required_verification_missing_labels,
-            "n_requires_verification_ambiguous_labels": self.n_requires_verification_ambiguous_labels,
-            "n_selected_for_verification_labels": self.n_selected_for_verification_labels,
-            "n_selected_for_verification_missing_labels": self.n_selected_for_verification_missing_labels,
-            "n_selected_for_verification_ambiguous_labels": self.n_selected_for_verification_ambiguous_labels,
-        }
-
-    @property
-    def n_selected_for_verification_ambiguous_labels(self):
-        return sum(
-            1
-            for product in self.state.tree.products
-            if product.labels.selected and product.labels.is_ambiguous
-        )
+    def stats(self) -> LabelStats:
+        if self._stats is None or not self._stats.is_current(self.state.compact_tree):
+            self._stats = LabelStats(
+                self.state.compact_tree,
+                self.allowed_labels,
+                self.config.allowed_provided_labels,
+            )
+        return self._stats
 
     @property
-    def n_selected_for_verification_missing_labels(self):
-        return sum(
-            1
-            for product in self.state.tree.products
-            if product.labels.selected and product.labels.is_missing
-        )
+    def n_good_labels(self):
+        return self.stats.n_good_labels
 
     @property
     def n_selected_for_verification_labels(self):
-        return sum(1 for product in self.state.tree.products if product.labels.selected)
-
-    @property
-    def n_requires_verification_ambiguous_labels(self):
-        return sum(
-            1
-            for product in self.state.tree.products
-            if product.labels.requires_verification() and product.labels.is_ambiguous
-        )
-
-    @property
-    def n_required_verification_missing_labels(self):
-        return sum(
-            1
-            for product in self.state.tree.products
-            if product.labels.requires_verification() and product.labels.is_missing
-        )
+        return self.stats.n_selected_for_verification_labels
 
     @property
     def n_requires_verification_labels(self):
-        return sum(
-            1
-            for product in self.state.tree.products
-            if product.labels.requires_verification()
-        )
-
-    @property
-    def n_ambiguous_labels(self):
-        return sum(
-            1 for product in self.state.tree.products if product.labels.is_ambiguous
-        )
-
-    @property
-    def n_missing_labels(self):
-        return sum(
-            1 for product in self.state.tree.products if product.labels.is_missing
-        )
-
-    @property
-    def n_to_reject_labels(self):
-        return sum(
-            1 for product in self.state.tree.products if product.labels.to_reject
-        )
-
-    @property
-    def n_to_skip_labels(self):
-        return sum(1 for product in self.state.tree.products if product.labels.to_skip)
-
-    @property
-    def n_good_labels(self):
-        return sum(1 for product in self.state.tree.products if product.labels.is_good)
+        return self.stats.n_requires_verification_labels
 
     @property
     def iteration_stats(self):
-        return {
-            "tree": self.tree_stats,
-            "manual_labels": self.manual_labels_stats,
-            "predicted_labels": self.predicted_labels_stats,
-            "progress.py": self.progress,
-        }
+        return self.stats.iteration_stats
 
-    @property
-    def n_manual_labels(self):
-        return sum(1 for product in self.state.tree.products if product.labels.manual)
-
-    @property
-    def progress(self):
-        return {
-            "manual": self.n_manual_labels,
-            "univocal": self.n_good_labels / self.n_products,
-            "ambiguous": self.n_ambiguous_labels / self.n_products,
-            "missing": self.n_missing_labels / self.n_products,
-            "allowed_labels": self.n_allowed_provided_labels_used
-            / self.n_allowed_provided_labels,
-        }
+    def update_labels(self, path: str):
+        self.state.update_labels(path, self.allowed_labels)
 
-    def predict_labels(self, n_sample: int):
-        self.predictor(self.state.tree, n_sample)
+    def predict_labels(
+        self,
+        n_sample: int,
+        sampler: Optional[str] = None,
+        within: Optional[Iterable[Category]] = None,
+    ):
+        """
+        :param sampler: name of a sampler from SAMPLERS, by default top-down sampling
+        :param within: categories whose subtrees products to verify are selected
+                       from, by default the whole tree
+        """
+        if sampler is not None and sampler not in SAMPLERS:
+            raise ValueError(
+                f"Unknown sampler {sampler}, expected one of {sorted(SAMPLERS)}"
+            )
+        state_path = os.path.join(self.dir, PREDICTOR_STATE_FILE)
+        digest = self.state.digest
+        if digest is not None and self.predictor.tree is None:
+            self.predictor.load_state(self.state.tree, state_path, digest)
+        changed = self.state.changed_products
+        self.predictor(
+            self.state.tree,
+            n_sample,
+            sampler=SAMPLERS[sampler] if sampler is not None else None,
+            changed=changed,
+            within=within,
+        )
+        if digest is not None:
+            self.predictor.save_state(state_path, digest)
+        self.state.changed_products = set()
         self.state.iteration += 1
 
 
@@ -1,31 +1,152 @@
-from dataclasses import dataclass
-from typing import Set, Optional
+from itertools import count
+from typing import Set, FrozenSet, Optional, Callable, Any, List, Dict, Iterable
 
-from anytree import NodeMixin, PreOrderIter
+from anytree import NodeMixin
+
+from tree_labeller.core.attributes import AttributesView, AttributeStore
+from tree_labeller.tree.compact import CompactTree
+from tree_labeller.tree.index import TreeIndex
+from tree_labeller.tree.utils import preorder
 
 TO_REJECT_LABEL = "!"
 TO_SKIP_LABEL = "?"
 START_TIME_FORMAT = "%Y%m%d%H%M%S"
+# Generations are unique across trees, so a cache made in one tree is never
+# taken as current after its node moves to another tree
+_GENERATIONS = count(1)
 ProductName = str
 ProductId = int
 Label = str
 
 
-@dataclass
+class LabelRegistry:
+    """
+    Interns labels as bits of an integer, so a set of labels becomes a mask.
+
+    Python integers are unbounded, so masks work for any number of labels.
+    """
+
+    def __init__(self, labels: Iterable[Label] = ()):
+        self._bits: Dict[Label, int] = {}
+        self._labels: List[Label] = []
+        # Bumped whenever labels using this registry change
+        self.generation = 0
+        for label in sorted(labels):
+            self.bit(label)
+
+    def bit(self, label: Label) -> int:
+        bit = self._bits.get(label)
+        if bit is None:
+            bit = 1 << len(self._labels)
+            self._bits[label] = bit
+            self._labels.append(label)
+        return bit
+
+    def __len__(self):
+        return len(self._labels)
+
+    def mask(self, labels: Iterable[Label]) -> int:
+        mask = 0
+        for label in labels:
+            mask |= self.bit(label)
+        return mask
+
+    def label(self, mask: int) -> Label:
+        """Returns the label of a single-bit mask."""
+        return self._labels[mask.bit_length() - 1]
+
+    def labels(self, mask: int) -> Set[Label]:
+        labels = set()
+        while mask:
+            bit = mask & -mask
+            labels.add(self.label(bit))
+            mask ^= bit
+        return labels
+
+
+def is_single_label(mask: int) -> bool:
+    return mask != 0 and mask & (mask - 1) == 0
+
+
+def is_multi_label(mask: int) -> bool:
+    return mask & (mask - 1) != 0
+
+
 class Labels:
-    """Describes labelling of a single node of a tree."""
+    """
+    Describes labelling of a single node of a tree.
+
+    Predicted labels are kept as a mask of bits interned in a registry and
+    turned into strings only when needed. Labels of a tree share the registry
+    of its root, standalone labels get a registry of their own. There is one Labels per node, so
+    attributes are kept in slots rather than in a dict.
+    """
+
+    __slots__ = ("manual", "predicted_mask", "selected", "registry")
+
+    def __init__(
+        self,
+        manual: Label = None,
+        predicted_mask: Optional[int] = None,
+        selected: bool = False,
+        registry: Optional[LabelRegistry] = None,
+    ):
+        if registry is None:
+            registry = LabelRegistry()
+        set_slot = object.__setattr__
+        set_slot(self, "manual", manual)
+        set_slot(self, "predicted_mask", predicted_mask)
+        set_slot(self, "selected", selected)
+        set_slot(self, "registry", registry)
+
+    def __setattr__(self, name, value):
+        # Labels of a tree share a registry, so statistics computed from them
+        # can tell if they are outdated without watching other trees
+        self.registry.generation += 1
+        if name == "registry":
+            value.generation += 1
+        super().__setattr__(name, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, Labels):
+            return NotImplemented
+        return (self.manual, self.predicted_mask, self.selected) == (
+            other.manual,
+            other.predicted_mask,
+            other.selected,
+        )
 
-    manual: Label = None
-    predicted: Set[Label] = None
-    selected: bool = False
+    # Labels are mutable
+    __hash__ = None
+
+    def __repr__(self):
+        return (
+            f"Labels(manual={self.manual!r}, predicted_mask={self.predicted_mask!r}, "
+            f"selected={self.selected!r})"
+        )
+
+    @property
+    def predicted(self) -> Optional[FrozenSet[Label]]:
+        """Read-only, assign a new set of labels to change it."""
+        if self.predicted_mask is None:
+            return None
+        return frozenset(self.registry.labels(self.predicted_mask))
+
+    @predicted.setter
+    def predicted(self, labels: Optional[Iterable[Label]]):
+        self.predicted_mask = None if labels is None else self.registry.mask(labels)
+
+    def set_predicted_mask(self, mask: int, registry: LabelRegistry):
+        self.registry = registry
+        self.predicted_mask = mask
 
     @property
     def is_ambiguous(self):
-        return self.predicted is not None and len(self.predicted) > 1
+        return self.predicted_mask is not None and is_multi_label(self.predicted_mask)
 
     @property
     def is_missing(self):
-        return not self.predicted
+        return not self.predicted_mask
 
     @property
     def to_skip(self):
@@ -37,37 +158,105 @@ class Labels:
 
     @property
     def is_good(self):
-        return self.predicted is not None and len(self.predicted) == 1
+        return self.predicted_mask is not None and is_single_label(self.predicted_mask)
 
     @property
     def good_label(self) -> Optional[str]:
-        return next(iter(self.predicted)) if self.is_good else None
+        return self.registry.label(self.predicted_mask) if self.is_good else None
 
     @property
-    def ambiguous(self) -> Set[str]:
-        return self.predicted if self.is_ambiguous else set()
+    def ambiguous(self) -> FrozenSet[str]:
+        return self.predicted if self.is_ambiguous else frozenset()
 
     def requires_verification(self):
         return self.is_missing or self.is_ambiguous
 
     @property
-    def to_verify(self):
-        if self.predicted:
+    def to_verify(self) -> FrozenSet[Label]:
+        if self.predicted_mask:
             return self.predicted
         if self.manual:
-            return {self.manual}
-        return {}
+            return frozenset((self.manual,))
+        return frozenset()
 
 
 class LabelableMixin:
+    __slots__ = ()
+
     @property
     def labels(self):
         if not hasattr(self, "_labels"):
-            self._labels = Labels()
+            root = self.root
+            registry = (
+                root.label_registry if isinstance(root, LabelableCategory) else None
+            )
+            self._labels = Labels(registry=registry)
         return self._labels
 
 
-class Category(NodeMixin):
+class TreeNode(NodeMixin):
+    """
+    Tree node that tracks changes of the tree structure.
+
+    Any parent/child link change bumps the generation of the trees involved,
+    which invalidates structural views cached with _cached() in these trees only.
+    """
+
+    # Nodes are many, so attributes are kept in slots, including links
+    # managed by NodeMixin. Any other attributes still go to __dict__.
+    __slots__ = (
+        "_NodeMixin__parent",
+        "_NodeMixin__children",
+        "_structure_cache",
+        "_generation",
+    )
+
+    @property
+    def root(self) -> "TreeNode":
+        # Same as NodeMixin.root, without going through the parent property,
+        # as roots are looked up for every cached view
+        node = self
+        parent = getattr(node, "_NodeMixin__parent", None)
+        while parent is not None:
+            node = parent
+            parent = getattr(node, "_NodeMixin__parent", None)
+        return node
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever the structure of the tree of this node changes."""
+        return getattr(self.root, "_generation", 0)
+
+    def _bump_generation(self):
+        # Kept on the root only
+        self.root._generation = next(_GENERATIONS)
+
+    def _post_attach(self, parent):
+        self._bump_generation()
+
+    def _post_detach(self, parent):
+        # Both the tree left behind and the detached subtree change
+        parent._bump_generation()
+        self._bump_generation()
+
+    def _cached(self, name: str, compute: Callable[[], Any]) -> Any:
+        generation, cache = getattr(self, "_structure_cache", (None, None))
+        current = self.generation
+        if generation != current:
+            cache = {}
+            self._structure_cache = (current, cache)
+        if name not in cache:
+            cache[name] = compute()
+        return cache[name]
+
+    def _is_cached(self, name: str) -> bool:
+        generation, cache = getattr(self, "_structure_cache", (None, None))
+        return generation == self.generation and name in cache
+
+
+class Category(TreeNode):
+    __slots__ = ("name", "id", "_attribute_store")
+
     def __init__(self, name: str, id: str, parent: "Category" = None):
         self.name = name
         self.id = id
@@ -76,9 +265,52 @@ class Category(NodeMixin):
     def __copy__(self):
         return Category(self.name, self.id)
 
+    def _post_attach(self, parent):
+        super()._post_attach(parent)
+        # Products of an attached subtree move to the attribute store of the new
+        # root, so that all products of a tree share a single store
+        if self.children:
+            store = parent.attribute_store
+            for node in preorder(self):
+                if isinstance(node, Product):
+                    node._move_attrs(store)
+        if hasattr(self, "_attribute_store"):
+            del self._attribute_store
+
+    def _post_detach(self, parent):
+        super()._post_detach(parent)
+        # Products of the subtree leave the store of the tree
+        if self.children:
+            store = self.attribute_store
+            for node in preorder(self):
+                if isinstance(node, Product):
+                    node._move_attrs(store)
+
+    def __setattr__(self, name, value):
+        if name == "name" and hasattr(self, "name"):
+            # Long names of this category and its descendants change too
+            self._bump_generation()
+        super().__setattr__(name, value)
+
     @property
-    def long_name(self):
-        return ">".join(n.name for n in self.path)
+    def long_name(self) -> str:
+        """Names of categories from the root down to this one, joined with ">"."""
+        root = self.root
+        return root._cached("long_names", root._long_names)[id(self)]
+
+    def _long_names(self) -> Dict[int, str]:
+        # Long names of all categories of the tree, in a single pass from the root
+        tree = self.compact_tree
+        names = [None] * len(tree)
+        long_names = {}
+        for i, node in enumerate(tree.nodes):
+            if isinstance(node, Category):
+                parent_name = names[tree.parent[i]] if i else None
+                names[i] = (
+                    node.name if parent_name is None else f"{parent_name}>{node.name}"
+                )
+                long_names[id(node)] = names[i]
+        return long_names
 
     def __str__(self):
         return self.long_name
@@ -90,23 +322,92 @@ class Category(NodeMixin):
         return hash(self.id)
 
     def add_product(self, product: "LabelableProduct"):
-        self.products.add(product)
+        product.parent = self
+
+    @property
+    def compact_tree(self) -> CompactTree:
+        """Compact tree of this subtree, rebuilt after the tree changes."""
+        return self._cached("compact_tree", lambda: CompactTree.from_root(self))
+
+    @property
+    def tree_index(self) -> TreeIndex:
+        """Ancestor queries over the whole tree, nodes are numbered as in root's compact_tree."""
+        root = self.root
+        return root._cached("tree_index", lambda: TreeIndex(root.compact_tree))
 
     @property
-    def products(self):
-        return [node for node in self.leaves if isinstance(node, Product)]
+    def attribute_store(self) -> AttributeStore:
+        """Attributes of products of the whole tree, kept at the root."""
+        root = self.root
+        if not hasattr(root, "_attribute_store"):
+            root._attribute_store = AttributeStore()
+        return root._attribute_store
 
     @property
-    def categories(self):
-        return [node for node in PreOrderIter(self.root) if isinstance(node, Category)]
+    def products(self) -> List["Product"]:
+        """Products in this subtree. Do not modify the returned list."""
+
+        return self._cached(
+            "products",
+            lambda: [
+                node
+                for node in preorder(self)
+                if isinstance(node, Product) and node.is_leaf
+            ],
+        )
+
+    @property
+    def categories(self) -> List["Category"]:
+        """Categories in the whole tree. Do not modify the returned list."""
+        root = self.root
+        return root._cached(
+            "categories",
+            lambda: [node for node in preorder(root) if isinstance(node, Category)],
+        )
 
     @property
     def n_products(self):
-        return len(self.products)
+        root = self.root
+        n_products = root._cached("n_products", root._count_products)
+        return n_products[id(self)]
+
+    def _count_products(self) -> Dict[int, int]:
+        # Subtree product counts of all categories in a single bottom-up pass
+        tree = self.compact_tree
+        counts = [0] * len(tree)
+        for i in range(len(tree) - 1, -1, -1):
+            node = tree.nodes[i]
+            if isinstance(node, Product) and tree.is_leaf(i):
+                counts[i] += 1
+            if i > 0:
+                counts[tree.parent[i]] += counts[i]
+        return {
+            id(node): count
+            for node, count in zip(tree.nodes, counts)
+            if isinstance(node, Category)
+        }
 
     @property
     def n_categories(self):
-        return len(self.products)
+        return len(self.categories)
+
+    def get_product(self, product_id) -> "Product":
+        """Finds a product in the whole tree by its id, either as int or str."""
+        root = self.root
+        products_by_id = root._cached(
+            "products_by_id",
+            lambda: {str(product.id): product for product in root.products},
+        )
+        return products_by_id[str(product_id)]
+
+    def get_category(self, category_id) -> "Category":
+        """Finds a category in the whole tree by its id, either as int or str."""
+        root = self.root
+        categories_by_id = root._cached(
+            "categories_by_id",
+            lambda: {str(category.id): category for category in root.categories},
+        )
+        return categories_by_id[str(category_id)]
 
     def __eq__(self, other):
         if not isinstance(other, Category):
@@ -118,19 +419,54 @@ class Category(NodeMixin):
 
 
 class LabelableCategory(Category, LabelableMixin):
+    __slots__ = ("_labels", "_label_registry")
+
     def __init__(self, name: str, id: str, parent: "LabelableCategory" = None):
         super().__init__(name, id, parent)
 
+    @property
+    def label_registry(self) -> LabelRegistry:
+        """Registry of labels of the whole tree, kept at the root."""
+        root = self.root
+        if not hasattr(root, "_label_registry"):
+            root._label_registry = LabelRegistry()
+        return root._label_registry
+
+
+class Product(TreeNode):
+    __slots__ = ("name", "id", "_attrs_store", "_attrs_row")
 
-class Product(NodeMixin):
     name: ProductName
     id: ProductId
 
     def __init__(self, name: ProductName, id: ProductId, category: Category, **attrs):
         self.name = name
         self.id = id
+        self._attrs_store = (
+            category.attribute_store if category is not None else AttributeStore()
+        )
+        self._attrs_row = self._attrs_store.add_row(attrs)
         self.parent = category
-        self.attrs = attrs
+
+    def _post_attach(self, parent):
+        super()._post_attach(parent)
+        self._move_attrs(parent.attribute_store)
+
+    def _post_detach(self, parent):
+        super()._post_detach(parent)
+        self._move_attrs(AttributeStore())
+
+    def _move_attrs(self, store: AttributeStore):
+        if self._attrs_store is not store:
+            attrs = dict(self.attrs)
+            self._attrs_store.remove_row(self._attrs_row)
+            self._attrs_row = store.add_row(attrs)
+            self._attrs_store = store
+
+    @property
+    def attrs(self) -> AttributesView:
+        """Read-only view of extra attributes, like brand."""
+        return self._attrs_store.row(self._attrs_row)
 
     @property
     def category(self):
@@ -165,6 +501,8 @@ class Product(NodeMixin):
 
 
 class LabelableProduct(Product, LabelableMixin):
+    __slots__ = ("_labels",)
+
     def __init__(
         self, name: ProductName, id: ProductId, category: LabelableCategory, **attrs
     ):
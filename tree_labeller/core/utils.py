@@ -1,16 +1,44 @@
 import logging
+from dataclasses import dataclass, field
+from typing import List
 
-from tree_labeller.core.types import Category
+from tree_labeller.core.types import Category, Product
 
 
-def remove_leaf_categories_without_product(tree: Category):
-    removed = True
-    n_removed = 0
-    while removed:
-        removed = False
-        for leaf in tree.leaves:
-            if isinstance(leaf, Category):
-                leaf.parent = None
-                removed = True
-                n_removed += 1
-    logging.debug(f"Removed {n_removed} categories without product.")
+@dataclass
+class PruningReport:
+    """Describes categories removed from a tree."""
+
+    # Roots of removed branches, detached from the tree
+    branches: List[Category] = field(default_factory=list)
+    n_categories: int = 0
+
+
+def remove_leaf_categories_without_product(tree: Category) -> PruningReport:
+    """
+    Removes categories without products in their subtrees, in a single pass.
+
+    Products are counted bottom-up over the compact tree, then topmost empty
+    categories are detached with their whole subtrees. The root is kept even if
+    the tree has no products.
+    """
+    compact_tree = tree.compact_tree
+    nodes, parent = compact_tree.nodes, compact_tree.parent
+    has_products = [False] * len(compact_tree)
+    for i in range(len(compact_tree) - 1, 0, -1):
+        if has_products[i] or isinstance(nodes[i], Product):
+            has_products[i] = True
+            has_products[parent[i]] = True
+
+    report = PruningReport()
+    for i in range(1, len(compact_tree)):
+        if has_products[i]:
+            continue
+        report.n_categories += 1
+        if parent[i] == 0 or has_products[parent[i]]:
+            report.branches.append(nodes[i])
+    for branch in report.branches:
+        branch.parent = None
+
+    logging.debug(f"Removed {report.n_categories} categories without product.")
+    return report
@@ -0,0 +1,48 @@
+import json
+import sys
+from typing import IO, Optional
+
+from tree_labeller.core.files import GZIP_SUFFIX, ZSTD_SUFFIX, open_compressed
+from tree_labeller.core.types import Category, Product
+from tree_labeller.parsers.jsonl import CATEGORY_KIND, PRODUCT_KIND, Record
+from tree_labeller.tree.utils import preorder
+
+SUFFIXES = (".jsonl", ".jsonl" + GZIP_SUFFIX, ".jsonl" + ZSTD_SUFFIX)
+
+
+def export_tree(tree: Category, path: Optional[str] = None):
+    assert tree != None
+
+    if path:
+        assert path.endswith(SUFFIXES), f"Expected a path ending with {SUFFIXES}"
+        out = open_compressed(path, "wt")
+    else:
+        out = sys.stdout
+    with out:
+        write_tree(tree, out)
+
+
+def write_tree(tree: Category, stream: IO[str]):
+    """Writes one line per node, in pre-order."""
+    for node in preorder(tree):
+        stream.write(json.dumps(_record(node), ensure_ascii=False))
+        stream.write("\n")
+
+
+def _record(node) -> Record:
+    parent = node.parent
+    is_product = isinstance(node, Product)
+    record = {
+        "id": node.id,
+        "parent": parent.id if parent is not None else None,
+        "kind": PRODUCT_KIND if is_product else CATEGORY_KIND,
+        "name": node.name,
+    }
+    if is_product:
+        attrs = dict(node.attrs)
+    else:
+        # Skip anytree links and cached state
+        attrs = {k: v for k, v in node.__dict__.items() if not k.startswith("_")}
+    if attrs:
+        record["attrs"] = attrs
+    return record
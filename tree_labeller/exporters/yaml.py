@@ -1,30 +1,129 @@
+"""
+Writes a tree to YAML node by node.
+
+Instead of building a nested dict of the whole tree and dumping it, YAML events
+are emitted while the tree is traversed, with an explicit stack, so no copy of
+the tree is built and trees of any depth can be exported. The C (libyaml)
+emitter is used when available, so the layout of the text may differ from what
+``yaml.dump`` of the nested dict would give; the file loads back to an
+equivalent tree. It can be compressed with gzip (.yaml.gz) or zstd (.yaml.zst),
+which YamlTreeParser reads back as well.
+"""
 import sys
-from typing import Optional, Union, Dict
+from typing import IO, Any, Iterator, Optional
 
 import yaml
-from anytree.exporter import DictExporter
+from yaml.events import (
+    DocumentEndEvent,
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+)
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
 
-from tree_labeller.core.types import Category
+from tree_labeller.core.files import GZIP_SUFFIX, ZSTD_SUFFIX, open_compressed
+from tree_labeller.core.types import Category, Product
+from tree_labeller.parsers.yaml import CHILDREN_KEY
 
-# FIXME This is ugly, perhaps we should change implementation of Product or introduce to_dict there
-def custom(key_values) -> Dict:
-    d = {}
-    for k, v in key_values:
-        if k == "attrs":
-            d = {**d, **v}
-        else:
-            d[k] = v
-    return d
+try:
+    from yaml import CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper as Dumper
+
+SUFFIXES = (".yaml", ".yaml" + GZIP_SUFFIX, ".yaml" + ZSTD_SUFFIX)
 
 
 def export_tree(tree: Category, path: Optional[str] = None):
     assert tree != None
-    dct = DictExporter(dictcls=custom).export(tree)
 
     if path:
-        assert path.endswith(".yaml")
-        out = open(path, "w")
+        assert path.endswith(SUFFIXES), f"Expected a path ending with {SUFFIXES}"
+        out = open_compressed(path, "wt")
     else:
         out = sys.stdout
     with out:
-        yaml.dump(dct, stream=out, default_flow_style=False, sort_keys=False)
+        write_tree(tree, out)
+
+
+def write_tree(tree: Category, stream: IO[str], dumper_cls=Dumper):
+    dumper = dumper_cls(stream, default_flow_style=False, sort_keys=False)
+    try:
+        dumper.open()
+        dumper.emit(DocumentStartEvent(explicit=False))
+        for event in _tree_events(tree, dumper):
+            dumper.emit(event)
+        dumper.emit(DocumentEndEvent(explicit=False))
+        dumper.close()
+    finally:
+        dumper.dispose()
+
+
+def _tree_events(tree: Category, dumper) -> Iterator:
+    # Children still to be written, for each node on the current path
+    stack = [iter((tree,))]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            if stack:
+                # Ends children of a category, and the category itself
+                yield SequenceEndEvent()
+                yield MappingEndEvent()
+            continue
+
+        yield MappingStartEvent(None, None, True, flow_style=False)
+        for key, value in _iter_attr_values(node):
+            yield from _value_events(key, dumper)
+            yield from _value_events(value, dumper)
+        if node.children:
+            yield from _value_events(CHILDREN_KEY, dumper)
+            yield SequenceStartEvent(None, None, True, flow_style=False)
+            stack.append(iter(node.children))
+        else:
+            yield MappingEndEvent()
+
+
+def _iter_attr_values(node) -> Iterator:
+    yield "name", node.name
+    yield "id", node.id
+    if isinstance(node, Product):
+        yield from node.attrs.items()
+    else:
+        # Reading __dict__ creates one, which is fine for categories as they are
+        # few. Extra attributes of products are all in the attribute store.
+        for k, v in node.__dict__.items():
+            # Skip anytree links and cached state
+            if not k.startswith("_"):
+                yield k, v
+
+
+def _value_events(value: Any, dumper) -> Iterator:
+    yield from _node_events(dumper.represent_data(value), dumper)
+    dumper.represented_objects = {}
+
+
+def _node_events(node, dumper) -> Iterator:
+    """Events of a represented value, as yaml's serializer would give them."""
+    if isinstance(node, ScalarNode):
+        implicit = (
+            node.tag == dumper.resolve(ScalarNode, node.value, (True, False)),
+            node.tag == dumper.resolve(ScalarNode, node.value, (False, True)),
+        )
+        yield ScalarEvent(None, node.tag, implicit, node.value, style=node.style)
+    elif isinstance(node, SequenceNode):
+        implicit = node.tag == dumper.resolve(SequenceNode, node.value, True)
+        yield SequenceStartEvent(None, node.tag, implicit, flow_style=node.flow_style)
+        for item in node.value:
+            yield from _node_events(item, dumper)
+        yield SequenceEndEvent()
+    else:
+        assert isinstance(node, MappingNode)
+        implicit = node.tag == dumper.resolve(MappingNode, node.value, True)
+        yield MappingStartEvent(None, node.tag, implicit, flow_style=node.flow_style)
+        for key, item in node.value:
+            yield from _node_events(key, dumper)
+            yield from _node_events(item, dumper)
+        yield MappingEndEvent()
@@ -4,12 +4,10 @@ import logging
 import fire
 
 from tree_labeller.exporters.yaml import export_tree
-from tree_labeller.parsers.frisco import FriscoTreeParser
+from tree_labeller.parsers.frisco import TREE_URL, FriscoTreeParser
 
 logging.basicConfig(level=logging.DEBUG)
 
-TREE_URL = "https://commerce.frisco.pl/api/v1/integration/feeds/public?language=pl"
-
 
 def fetch():
     parser = FriscoTreeParser()
@@ -20,9 +20,11 @@ random.seed(42)
 def label(
     dir: str,
     sample: int = 100,
+    sampler: str = "top_down",
+    columnar: bool = False,
 ):
     task = LabellingTask.from_dir(dir)
-    task.predict_labels(sample)
+    task.predict_labels(sample, sampler)
 
     tracker = ProgressTracker(task)
     print("\nHere is the labelling progress.py made so far:\n")
@@ -40,7 +42,7 @@ def label(
     )
     charts.print_predicted_labels_coverage()
 
-    path = task.try_save_good_predicted_labels()
+    path = task.try_save_good_predicted_labels(columnar=columnar)
     if path:
         print(
             f"\nI have saved {task.n_good_labels} product labels to {path}.\n\n"
@@ -48,13 +50,13 @@ def label(
             f"(don't forget to skip rejected products).\n"
         )
 
-    path = task.try_save_mapping()
+    path = task.try_save_mapping(columnar=columnar)
     if path:
         print(
             f"\nI have saved mapping from tree categories to labels in:\n" f"{path}.\n"
         )
 
-    path = task.try_save_labels_to_verify()
+    path = task.try_save_labels_to_verify(columnar=columnar)
     if path:
         print(
             f"\nI have selected {task.n_selected_for_verification_labels} out of "
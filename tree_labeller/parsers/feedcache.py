@@ -0,0 +1,140 @@
+"""
+Content-addressed cache of downloaded feeds.
+
+Feeds are stored under the SHA-256 digest of their content, next to snapshots of
+trees parsed from them, so an unchanged feed is neither stored twice nor parsed
+again. For every URL, the digest of its latest content is kept together with its
+ETag and Last-Modified headers, which are sent back on the next fetch, so the
+server can answer with 304 Not Modified instead of the whole feed. URLs other than
+HTTP(S) ones are opened with fsspec and read in full on every fetch.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+import fsspec as fs
+
+INDEX_FILE = "index.json"
+FEEDS_DIR = "feeds"
+SNAPSHOTS_DIR = "snapshots"
+CHUNK_SIZE = 1 << 20
+
+
+class FeedCache:
+    def __init__(self, cache_dir: str, timeout: float = 60.0):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+
+    def fetch(self, url: str) -> Tuple[str, str]:
+        """Returns the path to a cached copy of the feed and its digest."""
+        index = self._load_index()
+        entry = index.get(url)
+        if entry is not None and not os.path.exists(self.feed_path(entry["digest"])):
+            entry = None
+
+        try:
+            response = self._download(url, entry)
+        except OSError as ex:
+            if entry is None:
+                raise
+            logging.warning(f"Using cached {url}, could not refresh it: {ex}")
+            return self.feed_path(entry["digest"]), entry["digest"]
+        if response is None:
+            logging.info(f"Cached {url} is up to date.")
+            return self.feed_path(entry["digest"]), entry["digest"]
+
+        digest, headers = response
+        index[url] = {"digest": digest, **headers}
+        self._save_index(index)
+        if entry is not None and entry["digest"] != digest:
+            self._remove_unused(entry["digest"], index)
+        return self.feed_path(digest), digest
+
+    def feed_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, FEEDS_DIR, digest)
+
+    def snapshot_path(self, digest: str, variant: str = "") -> str:
+        """Path to a snapshot of a tree parsed from the feed, one per parser setup."""
+        name = f"{digest}-{variant}" if variant else digest
+        return os.path.join(self.cache_dir, SNAPSHOTS_DIR, f"{name}.snapshot")
+
+    def _download(
+        self, url: str, entry: Optional[Dict]
+    ) -> Optional[Tuple[str, Dict[str, str]]]:
+        """
+        Stores the feed in the cache and returns its digest and validators,
+        or None if the cached copy is still valid.
+        """
+        if not url.startswith(("http://", "https://")):
+            with fs.open(url, "rb") as f:
+                return self._store(f), {}
+
+        request = urllib.request.Request(url)
+        if entry is not None:
+            if entry.get("etag"):
+                request.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.add_header("If-Modified-Since", entry["last_modified"])
+        logging.info(f"Downloading {url}...")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                digest = self._store(response)
+                headers = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+        except urllib.error.HTTPError as ex:
+            if ex.code == 304 and entry is not None:
+                return None
+            raise
+        return digest, {k: v for k, v in headers.items() if v}
+
+    def _store(self, f) -> str:
+        feeds_dir = os.path.join(self.cache_dir, FEEDS_DIR)
+        os.makedirs(feeds_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=feeds_dir, delete=False) as out:
+            try:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    out.write(chunk)
+            except BaseException:
+                os.unlink(out.name)
+                raise
+        os.replace(out.name, self.feed_path(digest.hexdigest()))
+        return digest.hexdigest()
+
+    def _remove_unused(self, digest: str, index: Dict):
+        if any(entry["digest"] == digest for entry in index.values()):
+            return
+        os.remove(self.feed_path(digest))
+        snapshots_dir = os.path.join(self.cache_dir, SNAPSHOTS_DIR)
+        if os.path.isdir(snapshots_dir):
+            for name in os.listdir(snapshots_dir):
+                if name.startswith(digest):
+                    os.remove(os.path.join(snapshots_dir, name))
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _load_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as ex:
+            logging.warning(f"Ignoring corrupted feed cache index: {ex}")
+            return {}
+
+    def _save_index(self, index: Dict[str, Dict]):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._index_path()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, self._index_path())
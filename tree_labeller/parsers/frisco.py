@@ -1,95 +1,263 @@
 """
 Prepares training data from frisco
 """
+import hashlib
 import json
 import logging
-from typing import Dict, Any, Literal
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import IO, Dict, Any, Iterable, Iterator, List, Literal, Optional, Tuple
 
-import fsspec as fs
 from tqdm import tqdm
 
+from tree_labeller.core.snapshot import load_snapshot, save_snapshot
 from tree_labeller.core.types import Category, Product
 from tree_labeller.core.utils import remove_leaf_categories_without_product
+from tree_labeller.parsers.feedcache import FeedCache
+from tree_labeller.parsers.jsonstream import iter_array_items, open_text
 from tree_labeller.parsers.treeparser import TreeParser
-from tree_labeller.tree.utils import internals
 
 Json = Dict[str, Any]
+# Category id, product id, product name and other attributes of a product
+ProductRecord = Tuple[int, Any, str, Dict[str, Any]]
 
 LANGUAGE_CODE = Literal["pl", "en"]
-CACHE_OPTIONS = {
-    "cache_storage": "./tmp/frisco",
-    "cache_check": False,
-    "expiry_time": False,
-}
+CACHE_DIR = "./tmp/frisco"
+TREE_URL = "https://commerce.frisco.pl/api/v1/integration/feeds/public?language=pl"
+# Products sent to a worker at once
+CHUNK_SIZE = 2000
+
+
+class FriscoFieldMapping:
+    """
+    Turns a product of the feed into a ProductRecord, or None if it has no category.
+
+    Other feeds or fields can be handled by passing a different mapping to the parser.
+    With workers it has to be picklable, e.g. an instance of a module level class.
+    """
+
+    def __init__(self, lang: LANGUAGE_CODE = "pl"):
+        self.lang = lang
+
+    def __call__(self, product: Json) -> Optional[ProductRecord]:
+        if not (
+            "primaryCategory" in product and "parentId" in product["primaryCategory"]
+        ):
+            return None
+        brand = product["brand"]
+        subbrand = product.get("subbrand")
+        if subbrand:
+            brand = f"{brand} {subbrand}"
+        return (
+            int(product["primaryCategory"]["parentId"]),
+            product["id"],
+            product["name"][self.lang].strip(),
+            {"brand": brand},
+        )
 
 
 class FriscoTreeParser(TreeParser):
     def __init__(
-        self, root_category_name: str = "categories", lang: LANGUAGE_CODE = "pl"
+        self,
+        root_category_name: str = "categories",
+        lang: LANGUAGE_CODE = "pl",
+        skip_empty_categories: bool = True,
+        streaming: bool = True,
+        n_workers: int = 0,
+        chunk_size: int = CHUNK_SIZE,
+        field_mapping: Optional[FriscoFieldMapping] = None,
+        cache: Optional[FeedCache] = None,
     ):
         self.root_category_name = root_category_name
         self.lang = lang
+        # Only categories with products, and their ancestors, are attached to the tree
+        self.skip_empty_categories = skip_empty_categories
+        # Reads the feed incrementally instead of decoding it as a whole
+        self.streaming = streaming
+        # With more than one worker, products of a streamed feed are decoded and
+        # mapped to records in a process pool. The main process only finds where
+        # products start and end, and links nodes.
+        assert streaming or n_workers <= 1, "Workers need a streamed feed"
+        self.n_workers = n_workers
+        self.chunk_size = chunk_size
+        self.field_mapping = field_mapping or FriscoFieldMapping(lang)
+        # Feeds are refreshed on every parse, but parsed again only when changed
+        self.cache = cache or FeedCache(CACHE_DIR)
 
     def parse_tree(self, urlpath: str) -> Category:
-        logging.info(f"Downloading Frisco products dump form {urlpath}...")
-        with fs.open(
-            "filecache::" + urlpath,
-            filecache=CACHE_OPTIONS,
-        ) as f:
-            tree = self._parse_content(f.read())
-            remove_leaf_categories_without_product(tree)
+        logging.info(f"Fetching Frisco products dump form {urlpath}...")
+        feed_path, digest = self.cache.fetch(urlpath)
+        snapshot_path = self.cache.snapshot_path(digest, self._snapshot_variant())
+        tree = load_snapshot(snapshot_path, digest, Category, Product)
+        if tree is not None:
             return tree
 
+        with open(feed_path, "rb") as f:
+            if self.streaming:
+                tree = self._parse_stream(f)
+            else:
+                tree = self._parse_content(open_text(f).read())
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        save_snapshot(tree, snapshot_path, digest)
+        return tree
+
+    def _snapshot_variant(self) -> str:
+        """Identifies options which change the parsed tree."""
+        mapping = self.field_mapping
+        options = (
+            self.root_category_name,
+            self.lang,
+            self.skip_empty_categories,
+            f"{type(mapping).__module__}.{type(mapping).__qualname__}",
+            sorted(getattr(mapping, "__dict__", {}).items()),
+        )
+        return hashlib.sha256(repr(options).encode("utf-8")).hexdigest()[:16]
+
     def _parse_content(self, jsonString: str) -> Category:
         jsonString = json.loads(jsonString)
-        tree = self._parse_categories(jsonString)
-        self._attach_products(tree, jsonString)
-        return tree
+        root = Category(self.root_category_name, id=0)
+        categories = self._parse_categories(jsonString)
+        records = list(self._map_products(jsonString["products"]))
+        used_ids = {record[0] for record in records}
+        for category, _ in categories.values():
+            if not self.skip_empty_categories or category.id in used_ids:
+                self._attach_category(root, categories, category)
+        for record in tqdm(records, desc="Attaching products"):
+            self._attach_product(categories, record)
+        return root
+
+    def _parse_stream(self, f: IO[bytes]) -> Category:
+        """
+        Builds the tree while reading the feed, products are attached as they arrive.
+
+        Only products listed before categories in the feed are kept aside until
+        categories are read. Empty categories are pruned at the end, which keeps
+        the order of categories the same as of _parse_content.
+        """
+        root = Category(self.root_category_name, id=0)
+        categories = {}
+        pending_products = []
+        categories_read = False
+
+        def attach_categories():
+            for category, _ in categories.values():
+                self._attach_category(root, categories, category)
+            for record in pending_products:
+                self._attach_product(categories, record)
+            pending_products.clear()
+
+        def products():
+            items = iter_array_items(
+                open_text(f),
+                ("categories", "products"),
+                # Workers decode products themselves
+                raw_keys=("products",) if self._pooled else (),
+            )
+            for key, item in items:
+                if key == "categories":
+                    for category, parent_id in self._iter_categories(item):
+                        categories[category.id] = (category, parent_id)
+                else:
+                    yield item
 
-    def _parse_categories(self, content: Json) -> Category:
-        def parse_one(category: Json):
+        records = self._map_products(products())
+        for record in tqdm(records, desc="Parsing feed"):
+            if categories and not categories_read:
+                # Categories come in a single array, so all of them are known by now
+                attach_categories()
+                categories_read = True
+            if categories_read:
+                self._attach_product(categories, record)
+            else:
+                pending_products.append(record)
+        if not categories_read:
+            attach_categories()
+
+        if self.skip_empty_categories:
+            remove_leaf_categories_without_product(root)
+        return root
+
+    def _parse_categories(self, content: Json) -> Dict[int, Tuple[Category, Any]]:
+        """Returns categories, not attached yet, with ids of their parents by id."""
+        indexed_nodes = {}
+        for category in tqdm(content["categories"], desc="Parsing categories"):
+            for node, parent_id in self._iter_categories(category):
+                indexed_nodes[node.id] = (node, parent_id)
+        return indexed_nodes
+
+    def _iter_categories(self, category: Json) -> Iterator[Tuple[Category, Any]]:
+        stack = [category]
+        while stack:
+            category = stack.pop()
             name = category["name"][self.lang]
             parent_path = category["parentPath"].split(",")
             id = int(parent_path[0])
             parent_id = int(parent_path[1]) if len(parent_path) > 1 else None
             yield Category(name, id=id), parent_id
-            if "children" in category:
-                for child_json in category["children"]:
-                    yield from parse_one(child_json)
+            stack.extend(reversed(category.get("children", [])))
 
-        indexed_nodes = {}
-        for category in content["categories"]:
-            for node, parent_id in parse_one(category):
-                indexed_nodes[node.id] = (node, parent_id)
+    def _attach_category(self, root: Category, categories, category: Category):
+        """Attaches the category, and its ancestors not attached yet, to the tree."""
+        while category.parent is None:
+            _, parent_id = categories[category.id]
+            parent, _ = categories.get(parent_id, (root, None))
+            category.parent = parent
+            if parent is root:
+                break
+            category = parent
 
-        root = Category(self.root_category_name, id=0)
-        for node, parent_id in tqdm(indexed_nodes.values(), desc="Parsing categories"):
-            parent, _ = indexed_nodes.get(parent_id, (root, None))
-            node.parent = parent
+    @property
+    def _pooled(self) -> bool:
+        return self.n_workers > 1
 
-        return root
+    def _map_products(self, products: Iterable[Any]) -> Iterator[ProductRecord]:
+        """
+        Maps products to records, in order, skipping products without a category.
 
-    def _attach_products(self, tree: Category, content: Json):
-        categories_by_id = {
-            int(category.id): category
-            for category in tqdm(internals(tree), desc="Indexing categories")
-        }
-        for product in tqdm(content["products"], desc="Parsing products"):
-            if not (
-                "primaryCategory" in product
-                and "parentId" in product["primaryCategory"]
-            ):
-                continue
-
-            category_id = int(product["primaryCategory"]["parentId"])
-            brand = product["brand"]
-            subbrand = product.get("subbrand")
-            if subbrand:
-                brand = f"{brand} {subbrand}"
-
-            Product(
-                id=product["id"],
-                name=product["name"][self.lang].strip(),
-                brand=brand,
-                category=categories_by_id[int(category_id)],
-            )
+        In a pool, products are JSON texts which workers decode.
+        """
+        if not self._pooled:
+            records = map(self.field_mapping, products)
+            return (record for record in records if record is not None)
+        map_chunk = partial(_map_chunk, self.field_mapping)
+        chunks = _chunks(products, self.chunk_size)
+        return (
+            record
+            for records in _map_in_pool(map_chunk, chunks, self.n_workers)
+            for record in records
+        )
+
+    def _attach_product(self, categories, record: ProductRecord):
+        category_id, id, name, attrs = record
+        category, _ = categories[category_id]
+        Product(name, id=id, category=category, **attrs)
+
+
+def _map_chunk(field_mapping, products: List[str]) -> List[ProductRecord]:
+    """Decodes and maps products in a worker, only records are sent back."""
+    records = map(field_mapping, map(json.loads, products))
+    return [record for record in records if record is not None]
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _map_in_pool(function, chunks: Iterator, n_workers: int) -> Iterator:
+    """Like pool.map(), but reads only a few chunks ahead of the results."""
+    with ProcessPoolExecutor(n_workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(function, chunk))
+            if len(pending) >= 2 * n_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,102 @@
+"""
+Flat tree format, a JSON Lines file with one node per line.
+
+Each line is an object with the id of the node, the id of its parent category
+(null for the root), its kind, its name and optional attributes:
+
+    {"id": 0, "parent": null, "kind": "category", "name": "categories"}
+    {"id": 11, "parent": 0, "kind": "category", "name": "Drinks"}
+    {"id": 111, "parent": 11, "kind": "product", "name": "Juice", "attrs": {"brand": "Tymbark"}}
+
+Unlike a nested YAML document, lines can be read one at a time, split into
+chunks or across processes, and appended to. Exported files list nodes in
+pre-order, but nodes may come in any order: a node whose parent has not been
+read yet waits for it. Ids of categories have to be unique.
+"""
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from tree_labeller.core.files import open_compressed
+from tree_labeller.core.types import LabelableCategory, LabelableProduct
+from tree_labeller.core.utils import remove_leaf_categories_without_product
+from tree_labeller.parsers.treeparser import TreeParser
+
+CATEGORY_KIND = "category"
+PRODUCT_KIND = "product"
+
+Record = Dict[str, Any]
+
+
+class JsonlTreeParser(TreeParser):
+    def __init__(self, skip_empty_categories: bool = False):
+        self.skip_empty_categories = skip_empty_categories
+
+    def parse_tree(self, path: str) -> LabelableCategory:
+        with open_compressed(path) as input:
+            return self.load(input)
+
+    def load(self, lines: Iterable[str]) -> Optional[LabelableCategory]:
+        """Builds a tree from lines, e.g. of several chained files."""
+        root = None
+        categories: Dict[Any, LabelableCategory] = {}
+        # Records waiting for their parent categories, by parent ids
+        waiting: Dict[Any, List[Record]] = defaultdict(list)
+
+        for record in iter_records(lines):
+            parent_id = record.get("parent")
+            if parent_id is None:
+                assert root is None, f"Second root: {record}"
+                root = self._add(record, None, categories, waiting)
+            elif parent_id in categories:
+                self._add(record, categories[parent_id], categories, waiting)
+            else:
+                waiting[parent_id].append(record)
+
+        if waiting:
+            raise ValueError(f"Unknown parent categories: {sorted(map(str, waiting))}")
+        if root is not None and self.skip_empty_categories:
+            remove_leaf_categories_without_product(root)
+        return root
+
+    def _add(
+        self,
+        record: Record,
+        parent: Optional[LabelableCategory],
+        categories: Dict[Any, LabelableCategory],
+        waiting: Dict[Any, List[Record]],
+    ):
+        """Adds a node, and then nodes which waited for it."""
+        first = None
+        stack = [(record, parent)]
+        while stack:
+            record, parent = stack.pop()
+            node = _create_node(record, parent)
+            if first is None:
+                first = node
+            if record["kind"] == CATEGORY_KIND:
+                # Children are found by ids of their categories
+                assert record["id"] not in categories, f"Second category: {record}"
+                categories[record["id"]] = node
+                stack.extend((r, node) for r in waiting.pop(record["id"], ()))
+        return first
+
+
+def iter_records(lines: Iterable[str]) -> Iterable[Record]:
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _create_node(record: Record, parent: Optional[LabelableCategory]):
+    kind, attrs = record["kind"], record.get("attrs") or {}
+    if kind == PRODUCT_KIND:
+        assert parent is not None, f"Product without category: {record}"
+        return LabelableProduct(
+            record["name"], id=record["id"], category=parent, **attrs
+        )
+    assert kind == CATEGORY_KIND, f"Unknown kind of node: {record}"
+    category = LabelableCategory(record["name"], id=record["id"], parent=parent)
+    for key, value in attrs.items():
+        setattr(category, key, value)
+    return category
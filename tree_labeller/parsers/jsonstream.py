@@ -0,0 +1,213 @@
+"""
+Incremental reading of large JSON documents.
+
+A document is read in chunks and items of selected top-level arrays are decoded
+one at a time with ``json.JSONDecoder.raw_decode``, so neither the whole text nor
+the whole decoded document is kept in memory. Values under other keys are not
+decoded at all, only scanned for their end. Items can also be returned as their
+JSON text, undecoded, e.g. to be decoded in other processes. Gzip-compressed
+input is detected by its magic bytes.
+"""
+import gzip
+import io
+import json
+import re
+from typing import IO, Any, Iterable, Iterator, Optional, Tuple
+
+GZIP_MAGIC = b"\x1f\x8b"
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+# Characters which may follow a complete value
+DELIMITERS = WHITESPACE + ",:]}"
+# Decoding errors this close to the end of the buffer may come from a cut value
+CUT_MARGIN = 6
+
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*"'
+_PLAIN = r'[^\[\]{}"]*'
+_FLAT_CONTENT = f"{_PLAIN}(?:{_STRING}{_PLAIN})*"
+# Text up to the next bracket which is not a part of a complete array or object
+# without nested ones, or up to a string which does not end in the buffer. Flat
+# values are skipped as a whole, so only the outer brackets of an item are counted.
+_NON_STRUCTURAL = re.compile(
+    rf"{_PLAIN}(?:(?:{_STRING}|\{{{_FLAT_CONTENT}\}}|\[{_FLAT_CONTENT}\]){_PLAIN})*",
+    re.DOTALL,
+)
+_STRING_CONTENT = re.compile(r'(?:[^"\\]|\\.)*', re.DOTALL)
+
+
+def open_text(f: IO[bytes]) -> IO[str]:
+    """Wraps a binary file, decompressing it if it's gzipped."""
+    if not hasattr(f, "peek"):
+        f = io.BufferedReader(f)
+    if f.peek(len(GZIP_MAGIC))[: len(GZIP_MAGIC)] == GZIP_MAGIC:
+        f = gzip.GzipFile(fileobj=f)
+    return io.TextIOWrapper(f, encoding="utf-8")
+
+
+def iter_array_items(
+    f: IO[str], keys: Iterable[str], raw_keys: Iterable[str] = ()
+) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields (key, item) for items of arrays under given keys of a top-level object,
+    in the order of the document. Values under other keys are skipped.
+
+    :param raw_keys: keys, also among keys, whose items are yielded as JSON text
+    """
+    return _Reader(f).iter_array_items(set(keys), set(raw_keys))
+
+
+class _Reader:
+    def __init__(self, f: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        # Start of a value whose text is being read, kept when the buffer is refilled
+        self.mark: Optional[int] = None
+
+    def iter_array_items(self, keys, raw_keys=frozenset()) -> Iterator[Tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key in keys and self._peek() == "[":
+                self.pos += 1
+                if self._peek() == "]":
+                    self.pos += 1
+                else:
+                    read = self._raw_value if key in raw_keys else self._value
+                    while True:
+                        yield key, read()
+                        if self._separator("]"):
+                            break
+            else:
+                self._skip()
+            if self._separator("}"):
+                return
+
+    def _fill(self, size: int = 0) -> bool:
+        """Reads the next chunk, returns False at the end of the input."""
+        if self.eof:
+            return False
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        keep = self.pos if self.mark is None else self.mark
+        self.buffer = self.buffer[keep:] + chunk
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark = 0
+        return True
+
+    def _peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"Expected {char!r} at {self._context()}")
+        self.pos += 1
+
+    def _separator(self, closing: str) -> bool:
+        """Consumes a comma or a closing bracket, returns True for the latter."""
+        char = self._peek()
+        self.pos += 1
+        if char == closing:
+            return True
+        if char != ",":
+            raise ValueError(f"Expected ',' or {closing!r} at {self._context()}")
+        return False
+
+    def _value(self) -> Any:
+        self._peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as ex:
+                # The value might be cut by the end of the buffer. It's decoded
+                # again from its start, so chunks grow to keep that linear.
+                if _may_be_cut(ex, self.buffer) and self._fill(size):
+                    size *= 2
+                    continue
+                raise
+            # A number might continue in the next chunk
+            complete = end < len(self.buffer) and self.buffer[end] in DELIMITERS
+            if complete or not self._fill():
+                self.pos = end
+                return value
+
+    def _raw_value(self) -> str:
+        """Consumes a value and returns its text, without decoding it."""
+        self._peek()
+        self.mark = self.pos
+        try:
+            self._skip()
+            return self.buffer[self.mark : self.pos]
+        finally:
+            self.mark = None
+
+    def _skip(self):
+        """Consumes a value without decoding it, only strings and brackets are tracked."""
+        if self._peek() not in "[{":
+            self._value()
+            return
+        # The opening bracket is counted first, so that a flat value is not
+        # matched together with text after it
+        depth = 1
+        buffer, pos = self.buffer, self.pos + 1
+        while True:
+            pos = _NON_STRUCTURAL.match(buffer, pos).end()
+            if pos < len(buffer):
+                char = buffer[pos]
+                pos += 1
+                if char == '"':
+                    pos = _STRING_CONTENT.match(buffer, pos).end()
+                    if pos < len(buffer) and buffer[pos] == '"':
+                        pos += 1
+                        continue
+                    # The string, or an escape in it, continues in the next chunk
+                    pos = self._skip_string(pos)
+                    buffer = self.buffer
+                    continue
+                depth += 1 if char in "[{" else -1
+                if depth == 0:
+                    self.pos = pos
+                    return
+                continue
+            self.pos = pos
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+            buffer, pos = self.buffer, self.pos
+
+    def _skip_string(self, pos: int) -> int:
+        """Skips the rest of a string spanning chunks, returns a position after it."""
+        while True:
+            self.pos = pos
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON input")
+            pos = _STRING_CONTENT.match(self.buffer, self.pos).end()
+            if pos < len(self.buffer) and self.buffer[pos] == '"':
+                return pos + 1
+
+    def _context(self) -> str:
+        return repr(self.buffer[self.pos : self.pos + 20])
+
+
+def _may_be_cut(ex: json.JSONDecodeError, buffer: str) -> bool:
+    # Errors of an unterminated string point at its start
+    return ex.pos >= len(buffer) - CUT_MARGIN or ex.msg.startswith(
+        "Unterminated string"
+    )
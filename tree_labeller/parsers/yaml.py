@@ -1,34 +1,230 @@
+from typing import IO, Any, List, Optional
+
 import yaml
+from yaml.events import (
+    AliasEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+)
 
+from tree_labeller.core.files import open_compressed
 from tree_labeller.core.types import LabelableCategory, LabelableProduct
 from tree_labeller.parsers.treeparser import TreeParser
 
+try:
+    from yaml import CSafeLoader as Loader
+except ImportError:
+    from yaml import SafeLoader as Loader
+
+CHILDREN_KEY = "children"
+CATEGORY_KEYS = ("name", "id")
+
 
 class YamlTreeParser(TreeParser):
+    def __init__(self, skip_empty_categories: bool = False):
+        self.skip_empty_categories = skip_empty_categories
+
     def parse_tree(self, path: str) -> LabelableCategory:
-        with open(path) as input:
-            dct = yaml.full_load(input)
-        return CustomDictImporter().import_(dct)
-
-
-class CustomDictImporter(object):
-    def import_(self, data):
-        """Import tree from `data`."""
-        return self.__import(data)
-
-    def __import(self, data, parent=None):
-        assert isinstance(data, dict)
-        assert "parent" not in data
-        attrs = dict(data)
-        children = attrs.pop("children", [])
-        if children:
-            node = LabelableCategory(parent=parent, **attrs)
+        with open_compressed(path) as input:
+            return StreamingTreeLoader(self.skip_empty_categories).load(input)
+
+
+class StreamingTreeLoader:
+    """
+    Builds a tree straight from YAML parser events.
+
+    Unlike loading the whole document with ``yaml.full_load`` and importing the
+    resulting dict, nodes are created as soon as the parser reaches them, so the
+    intermediate dict is never materialized. Nesting is tracked with an explicit
+    stack, so trees of any depth can be loaded. The C (libyaml) parser is used
+    when available.
+
+    With skip_empty_categories, a category is attached to its parent only once
+    it gets its first product, so branches without products never become a part
+    of the tree and there is nothing to prune afterwards.
+    """
+
+    def __init__(self, skip_empty_categories: bool = False):
+        self.skip_empty_categories = skip_empty_categories
+
+    def load(self, stream: IO) -> Optional[LabelableCategory]:
+        loader = Loader(stream)
+        try:
+            return self._build(loader)
+        finally:
+            loader.dispose()
+
+    def _build(self, loader) -> Optional[LabelableCategory]:
+        root = None
+        stack: List[Any] = []
+        anchors = {}
+
+        def add_value(value: Any):
+            if stack and not isinstance(stack[-1], _ChildrenFrame):
+                stack[-1].add(value)
+
+        while loader.check_event():
+            event = loader.get_event()
+            top = stack[-1] if stack else None
+
+            if isinstance(event, MappingStartEvent):
+                if top is None or isinstance(top, _ChildrenFrame):
+                    parent = top.owner if top else None
+                    if parent is not None:
+                        parent.ensure_category()
+                    stack.append(_NodeFrame(parent, self.skip_empty_categories))
+                else:
+                    stack.append(_ValueFrame({}, event.anchor))
+
+            elif isinstance(event, MappingEndEvent):
+                frame = stack.pop()
+                if isinstance(frame, _NodeFrame):
+                    node = frame.finish()
+                    if not stack:
+                        root = node
+                else:
+                    frame.end(anchors)
+                    add_value(frame.value)
+
+            elif isinstance(event, SequenceStartEvent):
+                if isinstance(top, _NodeFrame) and top.key == CHILDREN_KEY:
+                    top.key, top.has_key = None, False
+                    stack.append(_ChildrenFrame(top))
+                else:
+                    stack.append(_ValueFrame([], event.anchor))
+
+            elif isinstance(event, SequenceEndEvent):
+                frame = stack.pop()
+                if isinstance(frame, _ValueFrame):
+                    frame.end(anchors)
+                    add_value(frame.value)
+
+            elif isinstance(event, ScalarEvent):
+                value = _construct_scalar(loader, event)
+                if event.anchor is not None:
+                    anchors[event.anchor] = value
+                if isinstance(top, _ChildrenFrame):
+                    raise yaml.YAMLError(
+                        f"Expected a mapping in children list, got: {value!r}"
+                    )
+                add_value(value)
+
+            elif isinstance(event, AliasEvent):
+                if event.anchor not in anchors:
+                    raise yaml.YAMLError(f"Unsupported alias: {event.anchor}")
+                add_value(anchors[event.anchor])
+
+        return root
+
+
+class _NodeFrame:
+    """A YAML mapping describing a single tree node."""
+
+    def __init__(self, parent: Optional["_NodeFrame"], skip_empty: bool = False):
+        self.parent = parent
+        self.skip_empty = skip_empty
+        self.attrs = {}
+        self.key = None
+        self.has_key = False
+        self.category = None
+
+    def add(self, value: Any):
+        if not self.has_key:
+            self.key = value
+            self.has_key = True
+            return
+        key, self.key, self.has_key = self.key, None, False
+        if key == CHILDREN_KEY:
+            # Empty or null list of children, the node is a leaf
+            return
+        if self.category is not None:
+            # Attributes that come after children of an already created category,
+            # only those a category could have been created with
+            if key not in CATEGORY_KEYS:
+                raise TypeError(f"Unexpected category attribute: {key!r}")
+            setattr(self.category, key, value)
+        else:
+            self.attrs[key] = value
+
+    def ensure_category(self) -> LabelableCategory:
+        if self.category is None:
+            # Name and id might follow the children in a document
+            attrs = {"name": None, "id": None, **self.attrs}
+            parent = self.parent_category if not self.skip_empty else None
+            self.category = LabelableCategory(parent=parent, **attrs)
+            self.attrs = None
+        return self.category
+
+    @property
+    def parent_category(self) -> Optional[LabelableCategory]:
+        return self.parent.category if self.parent is not None else None
+
+    def attach(self):
+        """Attaches the category, and its ancestors waiting for products, to the tree."""
+        frame = self
+        while frame.parent is not None and frame.category.parent is None:
+            frame.category.parent = frame.parent.category
+            frame = frame.parent
+
+    def finish(self):
+        if self.category is not None:
+            return self.category
+        if self.skip_empty and self.parent is not None and _is_product(self.attrs):
+            # Attach first, so that the product lands in the tree's attribute store
+            self.parent.attach()
+        try:
+            return LabelableProduct(category=self.parent_category, **self.attrs)
+        except TypeError:
+            # Some leaves might be not products but categories without products
+            return self.parent_category
+
+
+def _is_product(attrs) -> bool:
+    return "name" in attrs and "id" in attrs
+
+
+class _ChildrenFrame:
+    """A YAML sequence of children of a tree node."""
+
+    def __init__(self, owner: _NodeFrame):
+        self.owner = owner
+
+
+class _ValueFrame:
+    """A YAML collection used as a value of a node attribute."""
+
+    def __init__(self, value, anchor: Optional[str]):
+        self.value = value
+        self.anchor = anchor
+        self.key = None
+        self.has_key = False
+
+    def add(self, value: Any):
+        if isinstance(self.value, list):
+            self.value.append(value)
+        elif not self.has_key:
+            self.key = value
+            self.has_key = True
         else:
-            try:
-                node = LabelableProduct(category=parent, **attrs)
-            except TypeError:
-                # Some leaves might be not products but categories without products
-                return parent
-        for child in children:
-            self.__import(child, parent=node)
-        return node
+            self.value[self.key] = value
+            self.key, self.has_key = None, False
+
+    def end(self, anchors):
+        if self.anchor is not None:
+            anchors[self.anchor] = self.value
+
+
+def _construct_scalar(loader, event: ScalarEvent) -> Any:
+    tag = event.tag
+    if tag is None or tag == "!":
+        tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+    node = yaml.ScalarNode(tag, event.value, event.start_mark, event.end_mark)
+    # Call constructors directly, construct_object() would keep every
+    # constructed scalar until the end of the document.
+    constructor = loader.yaml_constructors.get(tag)
+    if constructor is None:
+        constructor = loader.yaml_constructors[None]
+    return constructor(loader, node)
@@ -1,37 +1,10 @@
-from typing import TypeVar, Set
+from typing import List
 
-from anytree import NodeMixin, SymlinkNode, PreOrderIter
+from tree_labeller.core.types import is_multi_label
+from tree_labeller.tree.compact import CompactTree
 
-from tree_labeller.tree.utils import internals
 
-Color = TypeVar("Color")
-
-
-class ColorableNode(NodeMixin):
-    def __init__(
-        self,
-        target=None,
-        parent=None,
-        colors: Set[Color] = None,
-    ):
-        self.target = target
-        self.parent = parent
-        self.colors = colors if colors is not None else set()
-
-    def add_color(self, color: Color):
-        self.colors.add(color)
-
-    def is_multicolor(self):
-        return len(self.colors) > 1
-
-    def is_colorless(self):
-        return len(self.colors) == 0
-
-    def requires_verification(self):
-        return self.is_colorless() or self.is_multicolor()
-
-
-def color_tree(root: NodeMixin):
+def color_compact_tree(tree: CompactTree, masks: List[int]):
     """
     Given a tree with some leaves colored, the goal is to color remaining nodes the tree.
 
@@ -42,43 +15,28 @@ def color_tree(root: NodeMixin):
 
     The algorithm is roughly based on.
     https://cs.stackexchange.com/questions/134042/finding-largest-disjoint-subtrees-spanning-nodes
-    """
 
-    assert all(internal.is_colorless() for internal in internals(root))
-    assert any(leaf.colors for leaf in root.leaves)
-    assert not any(leaf.is_multicolor() for leaf in root.leaves)
+    Colors of every node are merged into its parent exactly once going
+    bottom-up and then inherited by colorless nodes going top-down, so the
+    cost is linear in the number of nodes and no recursion is needed.
 
-    def color_from_children(node: ColorableNode):
-        if not node.parent:
-            return
-        node.parent.colors.update(node.colors)
-        color_from_children(node.parent)
-
-    def color_from_parent(node: ColorableNode):
-        # TODO Maybe too much recurrence for deep and breadth trees
-        for child in node.children:
-            if not child.colors:
-                child.colors = node.colors
-            color_from_parent(child)
-
-    for leaf in root.leaves:
-        if leaf.colors:
-            color_from_children(leaf)
-
-    color_from_parent(root)
-
-
-def select_subtree_requiring_verification(root: ColorableNode) -> SymlinkNode:
-    mapping = {}
-
-    def create_link(node: NodeMixin, new_parent: SymlinkNode = None):
-        link = SymlinkNode(target=node, parent=new_parent)
-        mapping[node] = link
-        return link
-
-    for node in PreOrderIter(root):
-        if node.is_multicolor() or node.is_colorless():
-            new_parent = mapping.get(node.parent)
-            create_link(node, new_parent)
-
-    return mapping.get(root)
+    :param tree: compact tree to color
+    :param masks: colors of every node of the tree indexed by node number, as
+                  bit masks of a LabelRegistry; only leaves can be colored
+                  initially; updated in place
+    """
+    leaves = tree.leaves()
+    assert all(not masks[i] for i in range(len(tree)) if not tree.is_leaf(i))
+    assert any(masks[i] for i in leaves)
+    assert not any(is_multi_label(masks[i]) for i in leaves)
+
+    parent = tree.parent
+    # Children are numbered after their parents, so going backwards visits
+    # every subtree before its root.
+    for i in range(len(tree) - 1, 0, -1):
+        if masks[i]:
+            masks[parent[i]] |= masks[i]
+
+    for i in range(1, len(tree)):
+        if not masks[i]:
+            masks[i] = masks[parent[i]]
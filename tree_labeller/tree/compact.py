@@ -0,0 +1,179 @@
+"""
+Array-backed representation of a tree.
+
+Nodes are numbered in pre-order, so the root is node 0 and every node has a
+greater number than its parent. Structure is kept in flat integer arrays:
+
+- ``parent`` and ``depth`` of every node,
+- ``first_child`` and ``next_sibling`` links (-1 when missing),
+- children in CSR form: children of node ``i`` are
+  ``child_index[child_offsets[i]:child_offsets[i + 1]]``,
+- optionally, ranges of leaves of every node, see ``leaf_ranges``.
+
+Original node objects are kept in ``nodes`` only to map results back, all
+traversals are loops over indices.
+"""
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from anytree import NodeMixin
+
+NO_NODE = -1
+# 32-bit signed indices are plenty for any tree that fits in memory
+INDEX_TYPECODE = "i"
+
+
+class CompactTree:
+    def __init__(self, nodes: List[NodeMixin], parent: Sequence[int]):
+        n = len(nodes)
+        assert len(parent) == n
+        self.nodes = nodes
+        self.parent = array(INDEX_TYPECODE, parent)
+        self.depth = array(INDEX_TYPECODE, [0]) * n
+        self.first_child = array(INDEX_TYPECODE, [NO_NODE]) * n
+        self.next_sibling = array(INDEX_TYPECODE, [NO_NODE]) * n
+        self.child_offsets = array(INDEX_TYPECODE, [0]) * (n + 1)
+        self.origin: Optional[array] = None
+        self._leaf_ranges: Optional[Tuple[array, array, array]] = None
+        self._cache: Dict[Any, Any] = {}
+
+        for i in range(n - 1, 0, -1):
+            p = self.parent[i]
+            assert 0 <= p < i, "Nodes must be numbered in pre-order"
+            self.next_sibling[i] = self.first_child[p]
+            self.first_child[p] = i
+            self.child_offsets[p + 1] += 1
+
+        for i in range(1, n):
+            self.depth[i] = self.depth[self.parent[i]] + 1
+
+        for i in range(n):
+            self.child_offsets[i + 1] += self.child_offsets[i]
+
+        self.child_index = array(INDEX_TYPECODE, [0]) * max(n - 1, 0)
+        fill = array(INDEX_TYPECODE, self.child_offsets[:n])
+        for i in range(1, n):
+            p = self.parent[i]
+            self.child_index[fill[p]] = i
+            fill[p] += 1
+
+    @classmethod
+    def from_root(
+        cls, root: NodeMixin, exclude: Callable[[NodeMixin], bool] = None
+    ) -> "CompactTree":
+        """
+        Builds a compact tree from an anytree root.
+
+        :param exclude: optional predicate, excluded nodes are skipped
+                        together with their subtrees
+        """
+        nodes = []
+        parent = array(INDEX_TYPECODE)
+        stack = [(root, NO_NODE)]
+        while stack:
+            node, p = stack.pop()
+            if exclude is not None and exclude(node):
+                continue
+            i = len(nodes)
+            nodes.append(node)
+            parent.append(p)
+            stack.extend((child, i) for child in reversed(node.children))
+        return cls(nodes, parent)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def children(self, i: int) -> array:
+        return self.child_index[self.child_offsets[i] : self.child_offsets[i + 1]]
+
+    def n_children(self, i: int) -> int:
+        return self.child_offsets[i + 1] - self.child_offsets[i]
+
+    def is_leaf(self, i: int) -> bool:
+        return self.child_offsets[i] == self.child_offsets[i + 1]
+
+    def leaves(self) -> List[int]:
+        offsets = self.child_offsets
+        return [i for i in range(len(self)) if offsets[i] == offsets[i + 1]]
+
+    def descendants(self, i: int) -> List[int]:
+        """Returns node i and all its descendants in pre-order."""
+        found = []
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            found.append(j)
+            stack.extend(reversed(self.children(j)))
+        return found
+
+    def subtree_leaves(self, i: int) -> Sequence[int]:
+        leaves, start, end = self.leaf_ranges()
+        return leaves[start[i] : end[i]]
+
+    def leaf_counts(self) -> array:
+        """Returns the number of leaves in the subtree of every node."""
+        counts = array(INDEX_TYPECODE, [0]) * len(self)
+        for i in range(len(self) - 1, -1, -1):
+            if self.is_leaf(i):
+                counts[i] = 1
+            if i > 0:
+                counts[self.parent[i]] += counts[i]
+        return counts
+
+    def leaf_ranges(self) -> Tuple[array, array, array]:
+        """
+        Returns leaves in pre-order together with ranges of leaves of every node.
+
+        Leaves of a subtree come one after another in pre-order, so leaves of
+        node i are ``leaves[start[i]:end[i]]``. Computed once and cached.
+        """
+        if self._leaf_ranges is None:
+            leaves = array(INDEX_TYPECODE, self.leaves())
+            start = array(INDEX_TYPECODE, [0]) * len(self)
+            n_leaves = 0
+            for i in range(len(self)):
+                start[i] = n_leaves
+                n_leaves += self.is_leaf(i)
+            counts = self.leaf_counts()
+            end = array(INDEX_TYPECODE, (s + c for s, c in zip(start, counts)))
+            self._leaf_ranges = leaves, start, end
+        return self._leaf_ranges
+
+    def cached(self, key: Any, compute: Callable[[], Any]) -> Any:
+        """Returns a value derived from the tree, computed once per tree."""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def subset(self, keep: Callable[[int], bool]) -> "CompactTree":
+        """
+        Returns a tree of nodes for which keep(i) is true and that are connected
+        to the root through kept nodes only.
+
+        ``origin`` of the returned tree maps its nodes back to indices in this tree.
+        """
+        mapping = array(INDEX_TYPECODE, [NO_NODE]) * len(self)
+        nodes = []
+        parent = array(INDEX_TYPECODE)
+        origin = array(INDEX_TYPECODE)
+        for i in range(len(self)):
+            p = self.parent[i]
+            if p == NO_NODE:
+                new_parent = NO_NODE
+            else:
+                new_parent = mapping[p]
+                if new_parent == NO_NODE:
+                    continue
+            if not keep(i):
+                continue
+            mapping[i] = len(nodes)
+            nodes.append(self.nodes[i])
+            parent.append(new_parent)
+            origin.append(i)
+        tree = CompactTree(nodes, parent)
+        tree.origin = origin
+        return tree
+
+
+def as_compact(tree: Union[NodeMixin, CompactTree]) -> CompactTree:
+    return tree if isinstance(tree, CompactTree) else CompactTree.from_root(tree)
@@ -0,0 +1,70 @@
+"""
+Ancestor queries over a compact tree.
+
+Ancestors are found with binary lifting: ``up[k][i]`` is the ancestor of node ``i``
+2^k levels above it, so an ancestor at any depth is reached in O(log depth) steps.
+As nodes are numbered in pre-order, the subtree of node ``i`` spans nodes from ``i``
+to ``end[i] - 1``, which answers whether a node is an ancestor of another in O(1).
+"""
+from array import array
+from typing import List
+
+from tree_labeller.tree.compact import INDEX_TYPECODE, NO_NODE, CompactTree
+
+
+class TreeIndex:
+    def __init__(self, tree: CompactTree):
+        n = len(tree)
+        self.tree = tree
+        self.depth = tree.depth
+
+        self.end = array(INDEX_TYPECODE, range(1, n + 1))
+        for i in range(n - 1, 0, -1):
+            p = tree.parent[i]
+            self.end[p] = max(self.end[p], self.end[i])
+
+        max_depth = max(self.depth, default=0)
+        self.up: List[array] = [tree.parent]
+        for _ in range(max(max_depth.bit_length() - 1, 0)):
+            previous = self.up[-1]
+            self.up.append(
+                array(
+                    INDEX_TYPECODE,
+                    (NO_NODE if a == NO_NODE else previous[a] for a in previous),
+                )
+            )
+
+    def is_ancestor(self, a: int, i: int) -> bool:
+        """Tells if a is i or an ancestor of i."""
+        return a <= i < self.end[a]
+
+    def ancestor_at_depth(self, i: int, depth: int) -> int:
+        assert 0 <= depth <= self.depth[i]
+        steps = self.depth[i] - depth
+        k = 0
+        while steps:
+            if steps & 1:
+                i = self.up[k][i]
+            steps >>= 1
+            k += 1
+        return i
+
+    def lca(self, u: int, v: int) -> int:
+        if self.depth[u] > self.depth[v]:
+            u, v = v, u
+        v = self.ancestor_at_depth(v, self.depth[u])
+        if u == v:
+            return u
+        for k in range(len(self.up) - 1, -1, -1):
+            if self.up[k][u] != self.up[k][v]:
+                u, v = self.up[k][u], self.up[k][v]
+        return self.tree.parent[u]
+
+    def path(self, i: int) -> List[int]:
+        """Returns nodes from the root down to node i."""
+        path = []
+        while i != NO_NODE:
+            path.append(i)
+            i = self.tree.parent[i]
+        path.reverse()
+        return path
@@ -1,2 +1,9 @@
 from .distant_leaves import select_distant_leaves
+from .k_center import select_k_center
 from .top_down import select_top_down
+
+SAMPLERS = {
+    "top_down": select_top_down,
+    "distant_leaves": select_distant_leaves,
+    "k_center": select_k_center,
+}
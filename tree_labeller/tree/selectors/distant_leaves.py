@@ -1,101 +1,116 @@
+from array import array
 from collections import defaultdict
-from functools import lru_cache
+from typing import Iterable, Tuple, Union
 
-from anytree import NodeMixin, PostOrderIter, PreOrderIter, SymlinkNode, AnyNode
+from anytree import NodeMixin
 from tqdm import tqdm
 
+from tree_labeller.tree.compact import INDEX_TYPECODE, NO_NODE, CompactTree, as_compact
 
-# TODO Use Node instead of AnyNode
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
-def select_distant_leaves(root: NodeMixin, n: int):
+def select_distant_leaves(root: Union[NodeMixin, CompactTree], n: int):
     """
     Find n leaves at that farthest apart in a given arbitrary tree.
 
     Uses a dynamic programming algorithm described in [1].
 
-    :param root: root of a tree
+    :param root: root of a tree or a compact tree
     :param n: number of leaves to find
     :return: a set of leaves and a sum of distances between them
 
     [1]: https://cs.stackexchange.com/questions/134068/finding-n-farthest-leaves-in-a-tree
     """
-    binary_tree = _to_binary_tree(root)
-    leaves, total_distance = _select_distant_leaves_binary_tree(binary_tree, n)
-    leaves = {leaf.target for leaf in leaves}
+    binary_tree = ImplicitBinaryTree(as_compact(root))
+    if np is not None:
+        select = _select_distant_leaves_binary_tree_vectorized
+    else:
+        select = _select_distant_leaves_binary_tree
+    leaves, total_distance = select(binary_tree, n)
     return leaves
 
 
-class BlankNode(AnyNode):
-    pass
+def depth_weight(depth: int) -> float:
+    """Weight of an edge to a node at a given depth."""
+    # Promote nodes that represent main categories in the taxonomy
+    # We don't want to get 10 nodes that are far away from all other nodes
+    # but live in the same very deep subtree, e.g.,
+    # we don't want to get 10 types of orange juice
+    return 1000 / ((depth + 1) ** 20)
 
 
-def _to_binary_tree(root: NodeMixin):
+class ImplicitBinaryTree:
     """
-    Converts arbitrary tree to a binary tree.
+    Binary tree view of an arbitrary compact tree, without copying it.
 
-    Children from the original tree are encoded as a left child in binary tree and
-    "edges" to left children have weight 1. Remaining "edges" (those to right children)
-    have 0 weight. Technically, we encode weight of an edge as attribute of a target
-    node of the edge.
-
-    :param root:
-            root of an arbitrary tree
-    :return:
-            a root of a new binary_tree
+    The first child of a node is its left child, while the remaining children
+    hang off a chain of blank nodes, the right child of a node. Edges to blank
+    nodes have 0 weight. Node i of the compact tree is node i of the view, the
+    blank node holding i and its following siblings is node n + i.
+    Children are computed from first_child/next_sibling arrays on demand.
     """
-    mapping = {}
 
-    def create_link(node: NodeMixin, new_parent: SymlinkNode = None):
-        link = SymlinkNode(target=node, parent=new_parent)
-        mapping[node] = link
-        return link
+    def __init__(self, tree: CompactTree):
+        self.tree = tree
+        n = len(tree)
+        # Depths in the compact tree are relative to its root
+        self.depth_offset = getattr(tree.nodes[0], "depth", 0) if n else 0
+        self.n_leaves = array(INDEX_TYPECODE, tree.leaf_counts()) * 2
+        for c in range(n - 1, 0, -1):
+            sibling = tree.next_sibling[c]
+            self.n_leaves[n + c] = self.n_leaves[c] + (
+                self.n_leaves[n + sibling] if sibling != NO_NODE else 0
+            )
+        self.root = 0
+
+    def __len__(self):
+        return 2 * len(self.tree)
 
-    create_link(root)
-    for parent in PreOrderIter(root):
-        # TODO interesujace, bo iteroojemy tu i po nizej po dzieciach
-        #      czy to niepowoduje buga?
-        new_parent = mapping[parent]
-        children = parent.children
-        if children:
-            create_link(children[0], new_parent)
-        for child in children[1:]:
-            new_parent = BlankNode(parent=new_parent)
-            create_link(child, new_parent)
+    def children(self, b: int) -> Tuple[int, ...]:
+        n = len(self.tree)
+        c = self.tree.first_child[b] if b < n else b - n
+        if c == NO_NODE:
+            return ()
+        sibling = self.tree.next_sibling[c]
+        return (c,) if sibling == NO_NODE else (c, n + sibling)
 
-    return mapping[root]
+    def weight(self, b: int) -> float:
+        if b >= len(self.tree):
+            return 0.0
+        return depth_weight(self.depth_offset + self.tree.depth[b])
 
+    def postorder(self) -> Iterable[int]:
+        tree = self.tree
+        n = len(tree)
+        for i in range(n - 1, -1, -1):
+            yield i
+            # Blank nodes are needed only for children other than the first
+            if i > 0 and tree.first_child[tree.parent[i]] != i:
+                yield n + i
 
-@lru_cache(maxsize=None)
-def _count_leaves(node):
-    return len(node.leaves)
+    def node(self, b: int) -> NodeMixin:
+        return self.tree.nodes[b]
 
 
-def _select_distant_leaves_binary_tree(root: NodeMixin, n: int):
+def _select_distant_leaves_binary_tree(tree: ImplicitBinaryTree, n: int):
     """
     Find n leaves at that farthest apart in a given binary tree.
 
-    :param root: root of a binary tree
+    :param tree: a binary tree view
     :param n: number of leaves to find
     :return: a set of leaves and a sum of distances between them
     """
+    weight = tree.weight
+    n_leaves = tree.n_leaves
+    root = tree.root
 
-    def weight(node: NodeMixin) -> float:
-        if isinstance(node, SymlinkNode):
-            # Get weight of node from the original tree, not the binary one
-            node = node.target
-        if isinstance(node, BlankNode):
-            # This is intermediary node inserted during conversation to binary tree
-            return 0.0
-        # Promote nodes that represent main categories in the taxonomy
-        # We don't want to get 10 nodes that are far away from all other nodes
-        # but live in the same very deep subtree, e.g.,
-        # we don't want to get 10 types of orange juice
-        return 1000 / ((node.depth + 1) ** 20)
-
-    assert n <= _count_leaves(
-        root
-    ), f"Cannot find {n} leaves out of {_count_leaves(root)} available"
+    assert (
+        n <= n_leaves[root]
+    ), f"Cannot find {n} leaves out of {n_leaves[root]} available"
 
     best_distances = defaultdict(
         lambda: defaultdict(lambda: defaultdict(lambda: defaultdict))
@@ -105,34 +120,35 @@ def _select_distant_leaves_binary_tree(root: NodeMixin, n: int):
     )
 
     for node in tqdm(
-        PostOrderIter(root),
-        total=len(root.descendants) + 1,
+        tree.postorder(),
+        total=len(tree),
         desc="Calculating distances",
     ):
-        subtree_leaves = min(_count_leaves(node), n)
-        remaining_leaves = _count_leaves(root) - _count_leaves(node)
+        children = tree.children(node)
+        subtree_leaves = min(n_leaves[node], n)
+        remaining_leaves = n_leaves[root] - n_leaves[node]
         min_leaves = max(0, subtree_leaves - remaining_leaves)
         for j in range(min_leaves, subtree_leaves + 1):
             k = n - j
-            if node.is_leaf:
+            if not children:
                 best_distances[node][j][k] = 0
                 if j == 0:
                     selected_leaves[node][j][k] = set()
                 else:
                     selected_leaves[node][j][k] = {node}
-            elif len(node.children) == 1:
-                child = node.children[0]
+            elif len(children) == 1:
+                child = children[0]
                 best_distances[node][j][k] = best_distances[child][j][
                     k
                 ] + j * k * weight(node)
                 selected_leaves[node][j][k] = selected_leaves[child][j][k]
             else:
-                left = node.children[0]
-                right = node.children[1]
+                left = children[0]
+                right = children[1]
                 distances = {}
                 for j1 in range(j + 1):
                     j2 = j - j1
-                    if j1 > _count_leaves(left) or j2 > _count_leaves(right) or j2 < 0:
+                    if j1 > n_leaves[left] or j2 > n_leaves[right] or j2 < 0:
                         continue  # TODO Perhaps there is a better way to handle that
                     distance = (
                         best_distances[left][j1][k + j2]
@@ -154,4 +170,87 @@ def _select_distant_leaves_binary_tree(root: NodeMixin, n: int):
                     | selected_leaves[right][best_j2][k + best_j1]
                 )
 
-    return selected_leaves[root][n][0], best_distances[root][n][0]
+    leaves = {tree.node(leaf) for leaf in selected_leaves[root][n][0]}
+    return leaves, best_distances[root][n][0]
+
+
+def _select_distant_leaves_binary_tree_vectorized(tree: ImplicitBinaryTree, n: int):
+    """
+    Same as _select_distant_leaves_binary_tree but with tables kept in arrays.
+
+    As the number of leaves outside of a subtree is always n minus leaves
+    selected in the subtree, every node needs a single array of best distances
+    indexed by the number of leaves selected in its subtree, bounded by the
+    subtree size. Instead of sets of selected leaves, binary nodes keep how many
+    leaves were taken from the left child, so leaves are found by a single pass
+    from the root once all tables are filled.
+
+    :param tree: a binary tree view
+    :param n: number of leaves to find
+    :return: a set of leaves and a sum of distances between them
+    """
+    n_leaves = tree.n_leaves
+    total = n_leaves[tree.root]
+    assert n <= total, f"Cannot find {n} leaves out of {total} available"
+
+    best_distances = [None] * len(tree)
+    best_left = [None] * len(tree)
+
+    for i in tqdm(
+        tree.postorder(),
+        total=len(tree),
+        desc="Calculating distances",
+    ):
+        children = tree.children(i)
+        subtree_leaves = min(n_leaves[i], n)
+        min_leaves = max(0, subtree_leaves - (total - n_leaves[i]))
+        j = np.arange(subtree_leaves + 1)
+        if not children:
+            distances = np.zeros(subtree_leaves + 1)
+        elif len(children) == 1:
+            child = children[0]
+            distances = best_distances[child] + j * (n - j) * tree.weight(i)
+            best_distances[child] = None
+        else:
+            left, right = children
+            left_distances, right_distances = (
+                best_distances[left],
+                best_distances[right],
+            )
+            j1 = np.arange(len(left_distances))
+            j2 = np.arange(len(right_distances))
+            pair_distances = (
+                left_distances[:, None]
+                + right_distances[None, :]
+                + np.outer(j1, j2) * (tree.weight(left) + tree.weight(right))
+            )
+            # Rearrange distances so that row j holds all splits of j leaves
+            # into j1 from the left and j - j1 from the right child
+            by_total = np.full((len(j1) + len(j2) - 1, len(j1)), -np.inf)
+            by_total[np.add.outer(j1, j2), j1[:, None]] = pair_distances
+            by_total = by_total[: subtree_leaves + 1]
+            by_total += (j * (n - j) * tree.weight(i))[:, None]
+            # The first best split is taken, like in the reference implementation
+            best_left[i] = by_total.argmax(axis=1)
+            distances = by_total[j, best_left[i]]
+            best_distances[left] = best_distances[right] = None
+        distances[:min_leaves] = -np.inf
+        best_distances[i] = distances
+
+    leaves = set()
+    stack = [(tree.root, n)]
+    while stack:
+        i, j = stack.pop()
+        children = tree.children(i)
+        if not children:
+            if j:
+                leaves.add(tree.node(i))
+        elif len(children) == 1:
+            stack.append((children[0], j))
+        else:
+            left, right = children
+            j1 = int(best_left[i][j])
+            stack.append((left, j1))
+            stack.append((right, j - j1))
+
+    return leaves, best_distances[tree.root][n]
@@ -0,0 +1,133 @@
+"""
+Selects k leaves far apart from each other with a greedy farthest-point (k-center) heuristic.
+
+Leaves are selected one by one, every time the leaf farthest from leaves selected so far is taken.
+Distances are the same depth-weighted tree distances as in the exact selector,
+see select_distant_leaves.
+
+The distance between leaves u and s is D(u) + D(s) - 2 * D(lca(u, s)), where D(x) is the weighted
+distance from the root to x. Thus, for every category a, it's enough to remember the selected leaf
+closest to a in a's subtree and the distance from u to all selected leaves is the minimum over
+ancestors a of u, as one of them is the LCA. Products of the same category are at the same distance
+from everything outside of the category, so they are treated as a single candidate. Distances only
+shrink as more leaves are selected, so candidates are kept in a heap and re-evaluated lazily.
+
+Walking the ancestors costs O(depth) per evaluation. While few leaves are selected, it's cheaper
+to take the minimum over selected leaves s directly, finding lca(u, s) with a TreeIndex in
+O(log depth), which pays off for deep trees. Both give the same value.
+"""
+
+import heapq
+import math
+import random
+from collections import defaultdict
+from typing import List, Set, Union
+
+from anytree import NodeMixin
+
+from tree_labeller.tree.compact import NO_NODE, CompactTree, as_compact
+from tree_labeller.tree.index import TreeIndex
+from tree_labeller.tree.selectors.distant_leaves import depth_weight
+
+# Shallower trees don't pay back building the index
+MIN_INDEXED_DEPTH = 64
+# Cost of a lca query per level of the index, in steps of walking the ancestors
+LCA_STEPS = 4
+
+
+def select_k_center(tree: Union[NodeMixin, CompactTree], k: int) -> Set[NodeMixin]:
+    """
+    k is max sample size, the actual sample size might be smaller
+    """
+    tree = as_compact(tree)
+    if len(tree) == 1:
+        return {tree.nodes[0]} if k > 0 else set()
+
+    parent = tree.parent
+    depth_offset = getattr(tree.nodes[0], "depth", 0)
+    root_distance = _root_distances(tree, depth_offset)
+
+    products_per_category = defaultdict(list)
+    for leaf in tree.leaves():
+        products_per_category[parent[leaf]].append(leaf)
+    k = min(k, sum(len(products) for products in products_per_category.values()))
+
+    # The closest selected leaf in a subtree of a node, relative to the node
+    nearest = [math.inf] * len(tree)
+    selected_leaves = []
+    index = None
+
+    def distance(category: int) -> float:
+        nonlocal index
+        product_distance = root_distance[category] + depth_weight(
+            depth_offset + tree.depth[category] + 1
+        )
+        best = math.inf
+        depth = tree.depth[category]
+        if (
+            depth >= MIN_INDEXED_DEPTH
+            and len(selected_leaves) * LCA_STEPS * depth.bit_length() < depth
+        ):
+            if index is None:
+                index = TreeIndex(tree)
+            for leaf in selected_leaves:
+                lca = index.lca(category, leaf)
+                relative = root_distance[leaf] - root_distance[lca]
+                best = min(best, product_distance - root_distance[lca] + relative)
+            return best
+        ancestor = category
+        # Nodes above are at least as far as the distance to them
+        while ancestor != NO_NODE and product_distance - root_distance[ancestor] < best:
+            best = min(
+                best, product_distance - root_distance[ancestor] + nearest[ancestor]
+            )
+            ancestor = parent[ancestor]
+        return best
+
+    categories = list(products_per_category)
+    random.shuffle(categories)
+    heap = [(-math.inf, order, c) for order, c in enumerate(categories)]
+    heapq.heapify(heap)
+
+    selected = set()
+    while len(selected) < k:
+        _, order, category = heapq.heappop(heap)
+        current = distance(category)
+        if heap and current < -heap[0][0]:
+            # Somebody else might be farther now
+            heapq.heappush(heap, (-current, order, category))
+            continue
+
+        products = products_per_category[category]
+        product = _pop_random(products)
+        selected.add(tree.nodes[product])
+        selected_leaves.append(product)
+
+        ancestor = category
+        while ancestor != NO_NODE:
+            relative = root_distance[product] - root_distance[ancestor]
+            if relative >= nearest[ancestor]:
+                # Ancestors above already have a selected leaf as close
+                break
+            nearest[ancestor] = relative
+            ancestor = parent[ancestor]
+
+        if products:
+            heapq.heappush(heap, (-distance(category), order, category))
+
+    return selected
+
+
+def _root_distances(tree: CompactTree, depth_offset: int = 0) -> List[float]:
+    distances = [0.0] * len(tree)
+    for i in range(1, len(tree)):
+        distances[i] = distances[tree.parent[i]] + depth_weight(
+            depth_offset + tree.depth[i]
+        )
+    return distances
+
+
+def _pop_random(items: List[int]) -> int:
+    i = random.randrange(len(items))
+    items[i], items[-1] = items[-1], items[i]
+    return items.pop()
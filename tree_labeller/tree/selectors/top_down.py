@@ -9,66 +9,105 @@ If the budget permits choosing more than one product from a root category, then
 
 Subcategories are selected in a specific way. For each root category, 1st subcategory is selected, then 2nd subcategory, and so on as long as there is still a budget. This way selected subcategories will represent as many root categories as the budget permits.
 
-Finally, for each selected category a random product is drawn.
+Finally, for each selected category a random product is drawn. Products of a category
+form a contiguous range of leaves in pre-order, so drawing one does not walk the category.
+
+Levels of categories and ranges of products are computed once per compact tree,
+so repeated selections from the same tree do not walk its products again.
 """
 
 import random
 from collections import defaultdict
 from itertools import zip_longest
-from typing import Set, Generator
+from typing import Dict, Generator, Iterable, List, Set, Union
+
+from anytree import NodeMixin
 
-from anytree import NodeMixin, LevelOrderGroupIter, PreOrderIter, SymlinkNode
+from tree_labeller.tree.compact import CompactTree, as_compact
 
 
-def select_top_down(tree: NodeMixin, k: int) -> Set[NodeMixin]:
+def select_top_down(tree: Union[NodeMixin, CompactTree], k: int) -> Set[NodeMixin]:
     """
     k is max sample size, the actual sample size might be smaller
     """
-    categories_only = _view_without_leaves(tree)
-    k = min(len(categories_only.leaves), k)
-    selected_categories = _select_categories(categories_only, k)
-    selected_categories = {c.target for c in selected_categories}
-    return _select_products(selected_categories)
+    tree = as_compact(tree)
+    # Products are leaves, while we only want Categories/Inner Nodes
+    levels = _category_levels(tree, inner_only=True)
+    k = min(levels.n_bottom, k)
+    selected_categories = _select_categories(tree, k, inner_only=True)
+    return _select_products(tree, selected_categories)
 
 
-def _select_products(categories: Set[NodeMixin]) -> Set[NodeMixin]:
+def _select_products(tree: CompactTree, categories: Iterable[int]) -> Set[NodeMixin]:
+    # Products of a category are a contiguous range of leaves in pre-order
+    leaves, start, end = tree.leaf_ranges()
     selected_products = set()
     for category in categories:
-        product = random.choice(category.leaves)
-        selected_products.add(product)
+        product = leaves[random.randrange(start[category], end[category])]
+        selected_products.add(tree.nodes[product])
     return selected_products
 
 
-def _select_categories(tree: NodeMixin, k: int) -> Set[NodeMixin]:
-    assert len(tree.leaves) >= k
+def _select_categories(tree: CompactTree, k: int, inner_only: bool = False) -> Set[int]:
+    """
+    Selects k categories, by default all nodes of the tree are categories.
+    """
+    assert k == 0 or _category_levels(tree, inner_only).n_bottom >= k
     selected_categories = set()
-    for category in _iterate(tree):
-        selected_categories.discard(category.parent)
+    if k == 0:
+        return selected_categories
+    for category in _iterate(tree, inner_only=inner_only):
+        selected_categories.discard(tree.parent[category])
         selected_categories.add(category)
         if len(selected_categories) == k:
             break
     return selected_categories
 
 
-def _iterate(tree: NodeMixin, shuffle: bool = True) -> Generator[NodeMixin, None, None]:
-    for children in LevelOrderGroupIter(tree):
+class _CategoryLevels:
+    """
+    Categories grouped by depth, in pre-order.
+
+    Depends only on the tree, so it's computed once per compact tree and
+    every selection only shuffles the levels it visits.
+    """
+
+    def __init__(self, tree: CompactTree, inner_only: bool):
+        levels: Dict[int, List[int]] = defaultdict(list)
+        has_subcategories = bytearray(len(tree))
+        for i in range(len(tree)):
+            if inner_only and tree.is_leaf(i):
+                continue
+            levels[tree.depth[i]].append(i)
+            if i > 0:
+                has_subcategories[tree.parent[i]] = True
+        self.levels: List[List[int]] = [levels[depth] for depth in sorted(levels)]
+        # Categories without subcategories, the most that can be selected
+        self.n_bottom = sum(
+            1 for level in self.levels for i in level if not has_subcategories[i]
+        )
+
+
+def _category_levels(tree: CompactTree, inner_only: bool) -> _CategoryLevels:
+    return tree.cached(
+        ("top_down", inner_only), lambda: _CategoryLevels(tree, inner_only)
+    )
+
+
+def _iterate(
+    tree: CompactTree, shuffle: bool = True, inner_only: bool = False
+) -> Generator[int, None, None]:
+    """
+    Yields categories level by level. Within a level, children of different
+    parents are interleaved, so that as many parents as possible are covered.
+    Parents come in order of their first child in the shuffled level.
+    """
+    for children in _category_levels(tree, inner_only).levels:
         if shuffle:
             children = list(children)
             random.shuffle(children)
         children_per_parent = defaultdict(list)
         for child in children:
-            children_per_parent[child.parent].append(child)
+            children_per_parent[tree.parent[child]].append(child)
         for selected in zip_longest(*children_per_parent.values()):
-            yield from (node for node in selected if node != None)
-
-
-def _view_without_leaves(tree: NodeMixin) -> SymlinkNode:
-    mapping = {}
-    for node in PreOrderIter(tree):
-        if node.is_leaf:  # Product, while we only want Categories/Inner Nodes
-            continue
-        mapped_parent = None if node.is_root else mapping[node.parent]
-        mapped_node = SymlinkNode(target=node, parent=mapped_parent)
-        mapping[node] = mapped_node
-
-    return mapping[tree]
+            yield from (node for node in selected if node is not None)
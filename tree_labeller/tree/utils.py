@@ -1,5 +1,14 @@
-from anytree import NodeMixin, PreOrderIter
+from anytree import NodeMixin
 
 
 def internals(root: NodeMixin):
-    return (node for node in PreOrderIter(root) if not node.is_leaf)
+    return (node for node in preorder(root) if not node.is_leaf)
+
+
+def preorder(root: NodeMixin):
+    """Iterates over nodes in pre-order without recursion, so deep trees are fine."""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node.children))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+import logging
+import os
+import random
+
+import fire
+
+from tree_labeller.core.diff import apply_diff, diff_trees
+from tree_labeller.core.formats import get_tree_exporter, get_tree_parser
+from tree_labeller.core.snapshot import SNAPSHOT_FILE, file_digest, save_snapshot
+from tree_labeller.core.task import LabellingTask
+from tree_labeller.parsers.frisco import TREE_URL, FriscoTreeParser
+from tree_labeller.parsers.treeparser import TreeParser
+
+logging.basicConfig(level=logging.INFO)
+
+# Make behaviour of sampling reproducible
+random.seed(42)
+
+URL_PREFIXES = ("http://", "https://")
+
+
+def get_source_parser(source: str) -> TreeParser:
+    """Feeds are fetched from URLs, other sources are tree files in any known format."""
+    if source.startswith(URL_PREFIXES):
+        return FriscoTreeParser()
+    # Like a tree of a task, see parse_tree() in snapshot
+    return get_tree_parser(source, skip_empty_categories=True)
+
+
+def update_task(
+    dir: str,
+    source: str = TREE_URL,
+    sample: int = 100,
+    sampler: str = "top_down",
+):
+    """
+    Updates the tree of a task with changes of a refetched feed or a tree file.
+
+    Products and categories are matched by ids, so manual labels of products
+    which are still in the tree carry over. Labels are then predicted again and
+    products to verify are selected only from subtrees affected by the changes.
+    """
+    task = LabellingTask.from_dir(dir)
+    tree = task.state.tree
+    new_tree = get_source_parser(source).parse_tree(source)
+
+    diff = diff_trees(tree, new_tree)
+    if not diff:
+        print("The tree is up to date.")
+        return
+    affected = apply_diff(tree, diff)
+    tree_path = task.config.tree_path
+    get_tree_exporter(tree_path)(tree, tree_path)
+    task.state.digest = file_digest(tree_path)
+    save_snapshot(tree, os.path.join(task.dir, SNAPSHOT_FILE), task.state.digest)
+
+    print(", ".join(f"{n} {change}" for change, n in diff.summary().items()) + ".")
+    print(f"Changes affected {len(affected)} categories:")
+    for name in sorted(category.long_name for category in affected):
+        print(f"  {name}")
+
+    task.predict_labels(sample, sampler, within=affected)
+    path = task.try_save_labels_to_verify()
+    if path:
+        print(
+            f"\nI have selected {task.n_selected_for_verification_labels} product "
+            f"labels to verify in the affected categories.\n\n"
+            f"Please review them in {path} and repeat prediction.\n"
+        )
+
+
+def cli():
+    fire.Fire(update_task)
+
+
+if __name__ == "__main__":
+    cli()